@@ -8,7 +8,7 @@ setup(
     description="Generate twitter database, calculate features and classify user",
     license="MIT",
     packages=find_packages(),
-    python_requires=">=3.7",
+    python_requires=">=3.8",
     include_package_data=True,
     install_requires=[
         "requests>=2.24.0",
@@ -20,8 +20,17 @@ setup(
         "plotly>=4.9.0",
         "matplotlib>=3.3.0",
     ],
+    extras_require={
+        "parquet": ["pyarrow>=7.0.0"],
+        "async": ["aiohttp>=3.7.0"]
+    },
     entry_points={
         'console_scripts': ["twitter-bot-generate=twitter_bot_type_classification.generate_db:main",
-                            "twitter-bot-features=twitter_bot_type_classification.calc_features:main"]
+                            "twitter-bot-features=twitter_bot_type_classification.calc_features:main",
+                            "twitter-bot-optimize-db=twitter_bot_type_classification.optimize_db:main",
+                            "twitter-bot-convert-db=twitter_bot_type_classification.convert_db:main",
+                            "twitter-bot-tokenizer-parity=twitter_bot_type_classification.tokenizer_parity:main",
+                            "twitter-bot-resolve-urls=twitter_bot_type_classification.resolve_urls:main",
+                            "twitter-bot-dedup-csv=twitter_bot_type_classification.dedup_csv:main"]
     }
 )
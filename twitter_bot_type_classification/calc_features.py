@@ -1,9 +1,10 @@
 import argparse
 import os
 import textwrap
+from functools import partial
 
-from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, SqliteTweetDB, SqliteUserDB
-from twitter_bot_type_classification.features.calculation import FeatureCalculator
+from twitter_bot_type_classification.features.tokenizer import PUNKT_PATH_ENV, TOKENIZERS, DEFAULT_TOKENIZER, \
+    set_tokenizer
 
 
 def main():
@@ -67,8 +68,37 @@ def main():
                         required=False, default=os.cpu_count())
     parser.add_argument("--csv", action="store_true",
                         help="The provided input files are csv files. Default is sqlite database", default=False)
+    parser.add_argument("--parquet", action="store_true",
+                        help="The provided inputs are parquet dataset directories. Default is sqlite database",
+                        default=False)
     parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the csv input file",
                         default=False)
+    parser.add_argument("--feature-store",
+                        help="Sqlite file to store the calculated tweet features. Already stored tweet features are "
+                             "reused, so only the features of new tweets are calculated", default=None)
+    parser.add_argument("--range-worker", action="store_true",
+                        help="Each worker reads the users and tweets of user id ranges from the database itself and "
+                             "returns the features through shared memory. Only for sqlite and parquet inputs",
+                        default=False)
+    parser.add_argument("--range-size", type=int, help="Number of users of each range of the range worker",
+                        default=1000)
+    parser.add_argument("--shard-size", type=int,
+                        help="Write the features every SHARD_SIZE users as shard files with a manifest into the output "
+                             "directory FILE instead of one npz file at the end", default=None)
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run, the users of the already written shards of the output "
+                             "directory FILE are skipped. Requires --shard-size", default=False)
+    parser.add_argument("--punkt-path",
+                        help="nltk data directory which contains the punkt sentence tokenizer model, the model is not "
+                             "downloaded. Default are the nltk data directories", default=None)
+    parser.add_argument("--tokenizer", choices=list(TOKENIZERS),
+                        help="Tokenizer of the text features. nltk is exact, fast is a faster regex tokenizer which "
+                             "approximates nltk and does not need the punkt model. Default is nltk",
+                        default=DEFAULT_TOKENIZER)
+    parser.add_argument("--url-cache",
+                        help="Sqlite url cache file of twitter-bot-resolve-urls. The short urls are only expanded with "
+                             "this cache and no requests are sent, the other urls are not expanded. Without a cache no "
+                             "url is expanded", default=None)
 
     args = parser.parse_args()
 
@@ -78,21 +108,70 @@ def main():
     if not args.users and not args.tweets:
         parser.error("ERROR: No user or tweets file provided.")
 
+    if args.csv and args.parquet:
+        parser.error("ERROR: The input files can't be csv files and parquet datasets at the same time.")
+
     if args.limit < -1:
         parser.error("ERROR: The tweet limit is not valid. Have to be greater or equal -1.")
 
+    if args.range_worker and args.csv:
+        parser.error("ERROR: The range worker can't read csv files.")
+
+    if args.range_size < 1:
+        parser.error("ERROR: The range size has to be greater than 0.")
+
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error("ERROR: The shard size has to be greater than 0.")
+
+    if args.resume and args.shard_size is None:
+        parser.error("ERROR: Only a sharded output can be resumed, provide a shard size.")
+
+    if args.punkt_path is not None:
+        # the environment variable is inherited by the worker processes
+        os.environ[PUNKT_PATH_ENV] = args.punkt_path
+
+    set_tokenizer(args.tokenizer)
+
+    # the database and feature modules import numpy and pyarrow, they are only imported after the arguments are valid
+    from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, SqliteTweetDB, SqliteUserDB
+    from twitter_bot_type_classification.dataset.parquet import ParquetTweetDB, ParquetUserDB, TWEET_FEATURE_COLUMNS
+    from twitter_bot_type_classification.features.calculation import FeatureCalculator
+    from twitter_bot_type_classification.features.urls import set_url_cache
+
+    # the url cache is configured with environment variables, which are inherited by the worker processes. The
+    # features only read the cache and send no requests.
+    set_url_cache(args.url_cache)
+
+    feature_calculator = FeatureCalculator()
+
+    if args.range_worker:
+        if args.parquet:
+            user_db_factory = partial(ParquetUserDB, args.users)
+            tweet_db_factory = partial(ParquetTweetDB, args.tweets, columns=TWEET_FEATURE_COLUMNS)
+        else:
+            user_db_factory = partial(SqliteUserDB, args.users)
+            tweet_db_factory = partial(SqliteTweetDB, args.tweets)
+
+        feature_calculator.calc_features_by_range(user_db_factory, tweet_db_factory, args.file, n_worker=args.worker,
+                                                  range_size=args.range_size, feature_store=args.feature_store,
+                                                  shard_size=args.shard_size, resume=args.resume)
+        return
+
     # Currently user and tweet db have to be provided.
     # On the task list is the independent calculation of the tweet and user features.
     if args.csv:
         tweet_db = None if args.tweets is None else CsvTweetDB(args.tweets, skip_header=args.skip_header)
         user_db = None if args.users is None else CsvUserDB(args.users, skip_header=args.skip_header)
+    elif args.parquet:
+        tweet_db = None if args.tweets is None else ParquetTweetDB(args.tweets, columns=TWEET_FEATURE_COLUMNS)
+        user_db = None if args.users is None else ParquetUserDB(args.users)
     else:
         tweet_db = None if args.tweets is None else SqliteTweetDB(args.tweets)
         user_db = None if args.users is None else SqliteUserDB(args.users)
 
-    feature_calculator = FeatureCalculator()
-
-    feature_calculator.calc_features(user_db, tweet_db, args.file, limit=args.limit, n_worker=args.worker)
+    feature_calculator.calc_features(user_db, tweet_db, args.file, limit=args.limit, n_worker=args.worker,
+                                     feature_store=args.feature_store, shard_size=args.shard_size,
+                                     resume=args.resume)
 
 
 if __name__ == "__main__":
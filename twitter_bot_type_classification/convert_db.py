@@ -0,0 +1,50 @@
+import argparse
+import textwrap
+
+from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, SqliteTweetDB, SqliteUserDB
+from twitter_bot_type_classification.dataset.parquet import ParquetTweetDB, ParquetUserDB, convert_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert sqlite or csv tweet and user data into parquet datasets.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=textwrap.dedent("""\
+                                     License:
+                                        MIT - Copyright (c) 2020 Marvin Heptner
+                                     """))
+
+    parser.add_argument("-u", "--users", help="Input file of user data")
+    parser.add_argument("-t", "--tweets", help="Input file of tweet data")
+    parser.add_argument("--users-out", help="Output directory of the user parquet dataset")
+    parser.add_argument("--tweets-out", help="Output directory of the tweet parquet dataset")
+    parser.add_argument("-b", "--batch-size", type=int, help="Number of rows written at once. Default value is 100000",
+                        default=100000)
+    parser.add_argument("--csv", action="store_true",
+                        help="The provided input files are csv files. Default is sqlite database", default=False)
+    parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the csv input file",
+                        default=False)
+
+    args = parser.parse_args()
+
+    if not args.users and not args.tweets:
+        parser.error("ERROR: No user or tweets file provided.")
+
+    if (args.users is None) != (args.users_out is None) or (args.tweets is None) != (args.tweets_out is None):
+        parser.error("ERROR: Each input file needs an output directory.")
+
+    if args.batch_size < 1:
+        parser.error("ERROR: The batch size has to be greater or equal 1.")
+
+    if args.users is not None:
+        user_db = CsvUserDB(args.users, skip_header=args.skip_header) if args.csv else SqliteUserDB(args.users)
+        n = convert_db(user_db, ParquetUserDB(args.users_out), batch_size=args.batch_size)
+        print("Converted {} users".format(n))
+
+    if args.tweets is not None:
+        tweet_db = CsvTweetDB(args.tweets, skip_header=args.skip_header) if args.csv else SqliteTweetDB(args.tweets)
+        n = convert_db(tweet_db, ParquetTweetDB(args.tweets_out), batch_size=args.batch_size)
+        print("Converted {} tweets".format(n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tweepy.models import Status, User
+
+from twitter_bot_type_classification.dataset.db import BufferedWriter, DEFAULT_WRITE_BATCH_SIZE, \
+    DEFAULT_FLUSH_INTERVAL
+from twitter_bot_type_classification.dataset.generation import DBType, TimelinePaginator, create_lookup_payloads, \
+    create_timeline_payloads, open_db, parse_tweet, parse_user
+from twitter_bot_type_classification.dataset.jobs import open_job_queue
+from twitter_bot_type_classification.features.urls import get_url_resolver
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+API_URL = "https://api.twitter.com/1.1/"
+
+OAUTH_TOKEN_URL = "https://api.twitter.com/oauth2/token"
+
+# length of the Twitter API rate limit windows in seconds
+RATE_LIMIT_WINDOW = 15 * 60
+
+# requests per rate limit window of the endpoints with application only authentication
+ENDPOINT_LIMITS = {
+    "statuses/user_timeline": 1500,
+    "users/lookup": 300
+}
+
+# maximum number of users of one lookup request
+LOOKUP_SIZE = 100
+
+# the user does not exist anymore, is protected or suspended, or none of the looked up users exist
+NOT_AVAILABLE_STATUS = {401, 403, 404}
+
+if aiohttp is not None:
+    NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+else:
+    NETWORK_ERRORS = (asyncio.TimeoutError, OSError)
+
+
+def _check_aiohttp():
+    if aiohttp is None:
+        raise ImportError("The async fetch engine requires aiohttp. Install it with: pip install aiohttp")
+
+
+def request_bearer_token(consumer_key, consumer_secret):
+    """
+    Request the bearer token of the application only authentication
+
+    :param consumer_key: Twitter API app key
+    :param consumer_secret: Twitter API app secret
+
+    :return: bearer token string
+    """
+    response = requests.post(OAUTH_TOKEN_URL, auth=(consumer_key, consumer_secret),
+                             data={"grant_type": "client_credentials"}, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+
+    if data.get("token_type") != "bearer":
+        raise ValueError("Expected the token type bearer, but got {}".format(data.get("token_type")))
+
+    return data["access_token"]
+
+
+class RateLimitWindow:
+    """
+    Requests left in the current rate limit window of an endpoint. The requests are counted before they are sent and
+    the count is corrected with the rate limit headers of the responses, so the quota is used without running into
+    the rate limit.
+
+    :param limit: number of requests per window
+    :param window: length of the window in seconds
+    :param clock: function which returns the current unix time
+    """
+
+    def __init__(self, limit, window=RATE_LIMIT_WINDOW, clock=time.time):
+        assert limit > 0
+        assert window > 0
+
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.remaining = limit
+        # unix time of the start of the next window, None until the first request of a window
+        self.reset = None
+
+    def get_remaining(self):
+        """
+        :return: number of requests left in the current window
+        """
+        if self.reset is None:
+            if self.remaining == 0:
+                # a response without a reset time used up the window, the next window starts after a full window
+                self.reset = self.clock() + self.window
+        elif self.clock() >= self.reset:
+            self.remaining = self.limit
+            self.reset = None
+
+        return self.remaining
+
+    def get_wait_time(self):
+        """
+        :return: seconds until a request is left
+        """
+        if self.get_remaining() > 0:
+            return 0
+
+        return max(self.reset - self.clock(), 0)
+
+    def try_acquire(self):
+        """
+        Count a request if one is left in the current window
+
+        :return: True if the request can be sent
+        """
+        if self.get_remaining() == 0:
+            return False
+
+        self.remaining -= 1
+        if self.reset is None:
+            self.reset = self.clock() + self.window
+
+        return True
+
+    async def acquire(self):
+        """
+        Wait until a request is left in the current or the next window and count it
+        """
+        while not self.try_acquire():
+            await asyncio.sleep(self.get_wait_time())
+
+    def update(self, headers):
+        """
+        Correct the window with the rate limit headers of a response
+
+        :param headers: mapping of the response headers
+        """
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+
+        if reset is not None:
+            reset = int(reset)
+            if reset <= self.clock():
+                # the response is of a window which has already ended
+                return
+            if self.reset is not None and reset > self.reset:
+                # the response is of a newer window than the counted one
+                self.remaining = self.limit
+            self.reset = reset
+
+        if remaining is not None:
+            # requests which are still in flight are not included in the header value
+            self.remaining = min(self.remaining, int(remaining))
+
+    def exhaust(self, headers):
+        """
+        No requests are left until the end of the window, for example after a response with the status 429
+
+        :param headers: mapping of the response headers
+        """
+        reset = headers.get("x-rate-limit-reset")
+        self.remaining = 0
+        self.reset = int(reset) if reset is not None else self.clock() + self.window
+
+
+class CredentialPool:
+    """
+    Rate limit windows of each endpoint for several credentials. Each request is sent with the credential which has
+    the most requests left, or if all are used up with the credential whose window resets first. With N credentials
+    about N times the requests of one credential are sent in each window.
+
+    :param bearer_tokens: list of the bearer tokens of the credentials
+    :param limits: dict of the endpoints to their number of requests per window
+    :param window: length of the windows in seconds
+    :param clock: function which returns the current unix time
+    """
+
+    def __init__(self, bearer_tokens, limits=ENDPOINT_LIMITS, window=RATE_LIMIT_WINDOW, clock=time.time):
+        assert len(bearer_tokens) > 0
+
+        self.bearer_tokens = list(bearer_tokens)
+        self.windows = {token: {endpoint: RateLimitWindow(limit, window=window, clock=clock)
+                                for endpoint, limit in limits.items()}
+                        for token in self.bearer_tokens}
+
+    async def acquire(self, endpoint):
+        """
+        Wait until a credential has a request left for the endpoint and count it
+
+        :param endpoint: endpoint path, a key of the limits
+
+        :return: bearer token of the credential which sends the request
+        """
+        while True:
+            windows = [(token, self.windows[token][endpoint]) for token in self.bearer_tokens]
+
+            token, window = max(windows, key=lambda w: w[1].get_remaining())
+            if window.try_acquire():
+                return token
+
+            await asyncio.sleep(min(w.get_wait_time() for _, w in windows))
+
+    def update(self, token, endpoint, headers):
+        self.windows[token][endpoint].update(headers)
+
+    def exhaust(self, token, endpoint, headers):
+        self.windows[token][endpoint].exhaust(headers)
+
+
+class AsyncDatasetGenerator:
+    """
+    Fetch users and tweets with many concurrent requests in one process and save them in batches into the dataset.
+    The requests of each endpoint and credential are limited by the rate limit windows of the CredentialPool instead
+    of sleeping in the API client.
+
+    :param bearer_tokens: bearer token or list of bearer tokens of the application only authentication
+    :param concurrency: maximum number of requests at the same time
+    :param batch_size: number of users or tweets which are saved together in one transaction
+    :param flush_interval: maximum seconds fetched users or tweets wait before they are saved
+    :param keep_history: save a snapshot of the volatile columns of each fetched user or tweet in the sqlite database
+    :param retries: number of retries of a request after a network or server error
+    :param timeout: seconds until a request is cancelled
+    :param session_factory: function which creates the http client session, by default an aiohttp session
+    """
+
+    def __init__(self, bearer_tokens, concurrency=64, batch_size=DEFAULT_WRITE_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, keep_history=False, retries=5, timeout=60,
+                 session_factory=None):
+        assert bearer_tokens is not None
+        assert concurrency > 0
+        assert batch_size > 0
+        assert flush_interval > 0
+        assert retries >= 0
+        assert timeout > 0
+
+        if isinstance(bearer_tokens, str):
+            bearer_tokens = [bearer_tokens]
+
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_history = keep_history
+        self.retries = retries
+        self.timeout = timeout
+        self.session_factory = self.__create_session__ if session_factory is None else session_factory
+        self.credentials = CredentialPool(bearer_tokens)
+
+    def __create_session__(self):
+        _check_aiohttp()
+
+        # the authorization header is set for each request, because the credential can change
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def request(self, session, endpoint, params):
+        """
+        Send a GET request to an endpoint of the Twitter API with the credential which can send it first. Rate limited
+        requests are sent again, network and server errors are retried. A ConnectionError is raised when all retries
+        failed, a ValueError for other client errors.
+
+        :param session: http client session
+        :param endpoint: endpoint path, a key of ENDPOINT_LIMITS
+        :param params: dict of the query parameters
+
+        :return: parsed json response or None if the requested data is not available
+        """
+        params = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in params.items()}
+        retries = self.retries
+
+        while True:
+            token = await self.credentials.acquire(endpoint)
+
+            try:
+                async with session.get(API_URL + endpoint + ".json", params=params,
+                                       headers={"Authorization": "Bearer " + token}) as response:
+                    if response.status == 429:
+                        self.credentials.exhaust(token, endpoint, response.headers)
+                        continue
+
+                    self.credentials.update(token, endpoint, response.headers)
+
+                    if response.status in NOT_AVAILABLE_STATUS:
+                        return None
+                    if response.status < 500:
+                        if response.status >= 400:
+                            raise ValueError("Request to {} failed with status {}: {}".format(
+                                endpoint, response.status, await response.text()))
+                        return await response.json()
+
+                    error = "status {}".format(response.status)
+            except NETWORK_ERRORS as e:
+                error = repr(e)
+
+            if retries == 0:
+                raise ConnectionError("Request to {} failed with {}, max number of retries reached".format(endpoint,
+                                                                                                         error))
+
+            wait_time = min(2 ** (self.retries - retries), 60)
+            retries -= 1
+            await asyncio.sleep(wait_time)
+
+    async def fetch_tweets_for_user(self, session, user=None, limit=200, is_username=False, since_id=None,
+                                    paginator=None):
+        """
+        Page through the user timeline with a TimelinePaginator like the TweetDatasetGenerator
+
+        :param since_id: only fetch the tweets with a higher id, None to fetch the timeline up to the limit
+        :param paginator: TimelinePaginator of a resumed job which continues where it stopped, by default a new
+                          paginator of the other arguments
+
+        :return: list of the tweet json objects of the user timeline, newest first
+        """
+        if paginator is None:
+            paginator = TimelinePaginator(user, limit, is_username, since_id)
+
+        tweets = []
+
+        while not paginator.finished:
+            params = paginator.get_params()
+            try:
+                page = await self.request(session, "statuses/user_timeline", params)
+            except (ValueError, ConnectionError) as e:
+                # the paginator is not finished, so a resumed job continues below the fetched tweets
+                print("\nError while loading tweets from {}: {}".format(paginator.user, e))
+                break
+
+            if page is None:
+                # the user does not exist anymore or is protected
+                paginator.finished = True
+                break
+
+            page = page[:params["count"]]
+            paginator.advance([t["id"] for t in page])
+            tweets.extend(page)
+
+        return tweets
+
+    async def fetch_users(self, session, users_to_fetch, is_username=False):
+        """
+        :return: list of the user json objects, at most LOOKUP_SIZE users are requested together
+        """
+        users = []
+
+        for idx in range(0, len(users_to_fetch), LOOKUP_SIZE):
+            ids = ",".join(str(u) for u in users_to_fetch[idx:idx + LOOKUP_SIZE])
+            page = await self.request(session, "users/lookup", {"screen_name" if is_username else "user_id": ids})
+            if page:
+                users.extend(page)
+
+        return users
+
+    async def __fetch_tweet_rows__(self, session, paginator):
+        tweets = await self.fetch_tweets_for_user(session, paginator=paginator)
+
+        # a timeline which was not fetched up to the limit is fetched again when the job is resumed
+        return [parse_tweet(Status.parse(None, t)) for t in tweets], paginator.get_state(), not paginator.finished
+
+    async def __fetch_user_rows__(self, session, users_to_fetch, is_username):
+        users = [User.parse(None, u) for u in await self.fetch_users(session, users_to_fetch, is_username=is_username)]
+
+        # the url resolver blocks, so the profile urls are resolved in a thread
+        expanded_urls = await asyncio.get_running_loop().run_in_executor(
+            None, get_url_resolver().resolve_many, [u.url for u in users if u.url is not None])
+
+        return [parse_user(u, expanded_urls) for u in users], None, False
+
+    async def __run__(self, jobs, fetch_rows, create_db, total_results, job_queue=None):
+        """
+        Run the jobs with self.concurrency workers and save the rows in batches. The rows are saved and the jobs are
+        finished in one writer thread, so the blocking database writes don't stop the requests of the event loop.
+
+        :param jobs: list of tuples of the job id, the arguments of fetch_rows and the expected number of rows
+        :param fetch_rows: coroutine function which gets the session and the job arguments and returns a tuple of the
+                           dataset rows, the new payload of the job or None to keep it and True if the job failed
+        :param create_db: function which opens the UserDB or TweetDB object, it is called in the writer thread
+        :param total_results: expected number of all rows
+        :param job_queue: JobQueue of the jobs, the jobs are finished after their rows were saved
+        """
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        loop = asyncio.get_running_loop()
+        # one thread, so the batches are written one after another in the order they were added
+        write_executor = ThreadPoolExecutor(max_workers=1)
+
+        writer = await loop.run_in_executor(write_executor, lambda: BufferedWriter(create_db(), self.batch_size,
+                                                                                   self.flush_interval))
+        progress = {"saved": 0, "not_available": 0, "total": total_results}
+        finished_jobs = []
+
+        def finish_jobs():
+            if job_queue is not None and len(writer) == 0 and len(finished_jobs) > 0:
+                job_queue.finish_many(finished_jobs)
+                finished_jobs.clear()
+
+        def save(results, finished_job):
+            written = writer.add_many(results)
+            finished_jobs.append(finished_job)
+            finish_jobs()
+            return written
+
+        def flush():
+            written = writer.flush()
+            finish_jobs()
+            return written
+
+        def print_progress():
+            print("\rNot available: {} Saved: {}/{}".format(progress["not_available"], progress["saved"],
+                                                            progress["total"]), end="", flush=True)
+
+        async def worker(session):
+            while not queue.empty():
+                job_id, args, expected_result_length = queue.get_nowait()
+                try:
+                    results, payload, failed = await fetch_rows(session, *args)
+                except (ValueError, ConnectionError) as e:
+                    # the job is fetched again when the run is resumed
+                    print("\nError while executing job {}: {}".format(job_id, e))
+                    results, payload, failed = [], None, True
+
+                diff = expected_result_length - len(results)
+                if diff > 0:
+                    progress["not_available"] += diff
+                    # subtract the not available from total count
+                    progress["total"] -= diff
+
+                written = await loop.run_in_executor(write_executor, save, results, (job_id, payload, failed))
+                if written > 0:
+                    progress["saved"] += written
+                    print_progress()
+
+        session = self.session_factory()
+        try:
+            await asyncio.gather(*(worker(session) for _ in range(min(self.concurrency, len(jobs)))))
+        finally:
+            await session.close()
+            progress["saved"] += await loop.run_in_executor(write_executor, flush)
+            write_executor.shutdown()
+            print_progress()
+
+        print("\nAll tasks finished")
+
+    def get_tweets_of_users(self, users, filename=None, limit=200, is_username=False, sqlite=True,
+                            incremental=False, resume=False):
+        """
+        :param incremental: only fetch the tweets which are newer than the newest saved tweet of each user, requires
+                            a sqlite database and user ids
+        :param resume: continue the unfinished jobs of a previous run with the same output file instead of fetching
+                       all users
+        """
+        assert filename is not None
+        assert limit > -2 and limit != 0
+        assert not incremental or (sqlite and not is_username)
+
+        job_queue = open_job_queue(filename, lambda: create_timeline_payloads(filename, users, limit, is_username,
+                                                                              incremental), resume)
+
+        jobs = []
+        for job_id, payload in job_queue.start():
+            paginator = TimelinePaginator.from_state(payload)
+            jobs.append((job_id, (paginator,), paginator.get_remaining()))
+
+        asyncio.run(self.__run__(jobs, self.__fetch_tweet_rows__,
+                                 lambda: open_db(filename, DBType.TWEET, sqlite, self.keep_history),
+                                 limit * len(jobs), job_queue))
+        job_queue.close()
+
+    def get_users(self, users, filename=None, is_username=False, sqlite=True, resume=False):
+        """
+        :param resume: continue the unfinished jobs of a previous run with the same output file instead of fetching
+                       all users
+        """
+        assert filename is not None
+
+        job_queue = open_job_queue(filename, lambda: create_lookup_payloads(users, is_username), resume)
+
+        jobs = [(job_id, (payload["users"], payload["is_username"]), len(payload["users"]))
+                for job_id, payload in job_queue.start()]
+
+        asyncio.run(self.__run__(jobs, self.__fetch_user_rows__,
+                                 lambda: open_db(filename, DBType.USER, sqlite, self.keep_history),
+                                 sum(n for _, _, n in jobs), job_queue))
+        job_queue.close()
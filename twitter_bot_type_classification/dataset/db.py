@@ -1,13 +1,19 @@
 import ast
 import csv
-import linecache
-import sqlite3
+import mmap
+import os
+import struct
+import time
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from datetime import datetime
 from io import StringIO
+from itertools import groupby
+from operator import itemgetter
 
-from tweepy import Status, User
+import numpy as np
+from twitter_bot_type_classification.dataset import schema
+from twitter_bot_type_classification.dataset.records import TweetRecord, UserRecord, PlaceRecord, \
+    EmbeddedTweetRecord
 
 USER_HEADER = [
     "id",
@@ -62,6 +68,34 @@ TWITTER_DATE_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
 
 DATE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# columns which change between two fetches of the same tweet or user, the other columns are kept when a row is
+# fetched again
+TWEET_VOLATILE_COLUMNS = ["retweet_count", "favorite_count", "fetch_date"]
+USER_VOLATILE_COLUMNS = ["followers_count", "friends_count", "listed_count", "favourites_count", "statuses_count",
+                         "fetch_date"]
+
+
+def _upsert_statement(table, header, volatile_columns):
+    return "INSERT INTO {} VALUES({}) ON CONFLICT(id) DO UPDATE SET {}".format(
+        table, ", ".join("?" * len(header)), ", ".join("{0} = excluded.{0}".format(c) for c in volatile_columns))
+
+
+# the statements are always the same text, so sqlite3 reuses the prepared statements of its cache
+TWEET_UPSERT = _upsert_statement("tweet", TWEET_HEADER, TWEET_VOLATILE_COLUMNS)
+USER_UPSERT = _upsert_statement("user", USER_HEADER, USER_VOLATILE_COLUMNS)
+
+# a snapshot of the same row and fetch date is only saved once
+TWEET_HISTORY_INSERT = "INSERT OR IGNORE INTO tweet_history VALUES(?, {})".format(
+    ", ".join("?" * len(TWEET_VOLATILE_COLUMNS)))
+USER_HISTORY_INSERT = "INSERT OR IGNORE INTO user_history VALUES(?, {})".format(
+    ", ".join("?" * len(USER_VOLATILE_COLUMNS)))
+
+# sqlite limits the number of host parameters of a statement
+MAX_QUERY_PARAMETERS = 900
+
+DEFAULT_WRITE_BATCH_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 5
+
 
 class UserDB(ABC):
 
@@ -81,34 +115,46 @@ class UserDB(ABC):
     def get_all_user(self):
         pass
 
+    def get_user_ids(self):
+        """
+        :return: list of all user ids in ascending order
+        """
+        raise NotImplementedError
+
+    def get_users_in_range(self, start_id, end_id):
+        """
+        :param start_id: smallest user id of the range
+        :param end_id: user id after the end of the range
+
+        :return: list of the users with start_id <= id < end_id in ascending id order
+        """
+        raise NotImplementedError
+
     @staticmethod
     def parse_user(row, file_encoding="utf-8", text_encoding="unicode_escape", list_separator=";"):
-        user_dic = {
-            "id": int(row[0]),
-            "name": row[1].encode(file_encoding).decode(text_encoding),
-            "screen_name": row[2],
-            "location": row[3],
-            "url": None if row[4] == "" or row[4] is None else row[4],
-            "description": row[6].encode(file_encoding).decode(text_encoding),
-            "protected": True if row[7] == "True" else False,
-            "verified": True if row[8] == "True" else False,
-            "followers_count": int(row[9]),
-            "friends_count": int(row[10]),
-            "listed_count": int(row[11]),
-            "favourites_count": int(row[12]),
-            "statuses_count": int(row[13]),
-            "created_at": datetime.strptime(row[14], DATE_TIME_FORMAT).strftime(TWITTER_DATE_TIME_FORMAT),
-            "profile_image_url_https": row[15],
-            "default_profile": True if row[16] == "True" else False,
-            "default_profile_image": True if row[17] == "True" else False,
-            "withheld_in_countries": None if row[18] == "" or row[18] is None else row[18].split(list_separator),
-            # the following attributes are only present in dataset, the normal tweepy Status object does not
-            # contain these attributes
-            "expanded_url": None if row[5] == "" else row[5],
-            "fetch_date": datetime.strptime(row[19], DATE_TIME_FORMAT)
-        }
-
-        return User.parse(api=None, json=user_dic)
+        return UserRecord(
+            id=int(row[0]),
+            name=row[1].encode(file_encoding).decode(text_encoding),
+            screen_name=row[2],
+            location=row[3],
+            url=None if row[4] == "" or row[4] is None else row[4],
+            # the following attribute is only present in dataset, the normal tweepy User object does not contain it
+            expanded_url=None if row[5] == "" else row[5],
+            description=row[6].encode(file_encoding).decode(text_encoding),
+            protected=row[7] == "True",
+            verified=row[8] == "True",
+            followers_count=int(row[9]),
+            friends_count=int(row[10]),
+            listed_count=int(row[11]),
+            favourites_count=int(row[12]),
+            statuses_count=int(row[13]),
+            created_at=datetime.strptime(row[14], DATE_TIME_FORMAT),
+            profile_image_url_https=row[15],
+            default_profile=row[16] == "True",
+            default_profile_image=row[17] == "True",
+            withheld_in_countries=None if row[18] == "" or row[18] is None else row[18].split(list_separator),
+            fetch_date=datetime.strptime(row[19], DATE_TIME_FORMAT)
+        )
 
 
 class TweetDB(ABC):
@@ -126,15 +172,13 @@ class TweetDB(ABC):
         pass
 
     @abstractmethod
-    def get_tweets_grouped_by_user(self):
+    def get_tweets_grouped_by_user(self, user_id_range=None):
         pass
 
     @staticmethod
     def parse_tweet(row, file_encoding="utf-8", text_encoding="unicode_escape", list_separator=";"):
         urls_dict = ast.literal_eval(row[17])
-        urls = []
-        for url, expanded_url in urls_dict.items():
-            urls.append({"url": url, "expanded_url": expanded_url})
+        urls = [{"url": url, "expanded_url": expanded_url} for url, expanded_url in urls_dict.items()]
 
         coordinates = None
         if row[4] != "" and row[4] is not None:
@@ -144,165 +188,382 @@ class TweetDB(ABC):
                     "coordinates": [float(coords[0]), float(coords[1])]
                 }
 
-        tweet_dic = {
-            "id": int(row[0]),
-            "user_id": int(row[1]),
-            "created_at": datetime.strptime(row[2], DATE_TIME_FORMAT).strftime(TWITTER_DATE_TIME_FORMAT),
-            "text": row[3].encode(file_encoding).decode(text_encoding),
-            "coordinates": coordinates,
-            "place": None if row[5] == "" or row[5] is None else {
-                "country_code": row[5],
-                "name": row[6]
-            },
-            "in_reply_to_status_id": None if row[7] == "" or row[7] is None else int(row[7]),
-            "in_reply_to_user_id": None if row[8] == "" or row[8] is None else int(row[8]),
-            "quoted_status_id": None if row[9] == "" or row[9] is None else int(row[9]),
-            "retweet_count": int(row[12]),
-            "favorite_count": int(row[13]),
-            "lang": row[14],
-            "withheld_copyright": True if row[15] == "True" else False,
-            "withheld_in_countries": None if row[16] == "" or row[16] is None else row[16].split(list_separator),
-            "entities": {
+        return TweetRecord(
+            id=int(row[0]),
+            user_id=int(row[1]),
+            created_at=datetime.strptime(row[2], DATE_TIME_FORMAT),
+            text=row[3].encode(file_encoding).decode(text_encoding),
+            coordinates=coordinates,
+            place=None if row[5] == "" or row[5] is None else PlaceRecord(row[5], row[6]),
+            in_reply_to_status_id=None if row[7] == "" or row[7] is None else int(row[7]),
+            in_reply_to_user_id=None if row[8] == "" or row[8] is None else int(row[8]),
+            quoted_status_id=None if row[9] == "" or row[9] is None else int(row[9]),
+            quoted_status=None if row[10] == "" or row[10] is None else EmbeddedTweetRecord(
+                text=row[10].encode(file_encoding).decode(text_encoding)),
+            retweeted_status=None if row[11] == "" or row[11] is None else EmbeddedTweetRecord(id=int(row[11])),
+            retweet_count=int(row[12]),
+            favorite_count=int(row[13]),
+            lang=row[14],
+            withheld_copyright=row[15] == "True",
+            withheld_in_countries=None if row[16] == "" or row[16] is None else row[16].split(list_separator),
+            entities={
                 "urls": urls
             },
-            "source": row[21],
             # the following attributes are only present in dataset, the normal tweepy Status object does not
             # contains these attributes
-            "videos": int(row[18]),  # the number of videos included in the tweet
-            "photos": int(row[19]),  # the number of photos included in the tweet
-            "gifs": int(row[20]),  # the number of gifs included in the tweet
-            "fetch_date": datetime.strptime(row[22], DATE_TIME_FORMAT),
-            # the date when the tweet was fetched
-        }
+            videos=int(row[18]),  # the number of videos included in the tweet
+            photos=int(row[19]),  # the number of photos included in the tweet
+            gifs=int(row[20]),  # the number of gifs included in the tweet
+            source=row[21],
+            fetch_date=datetime.strptime(row[22], DATE_TIME_FORMAT)  # the date when the tweet was fetched
+        )
 
-        if row[10] != "" and row[10] is not None:
-            tweet_dic["quoted_status"] = {
-                "text": row[10].encode(file_encoding).decode(text_encoding)
-            }
 
-        if row[11] != "" and row[11] is not None:
-            tweet_dic["retweeted_status"] = {
-                "id": int(row[11])
-            }
+class SqliteTweetDB(TweetDB):
+    """
+    :param filename: path of the sqlite database
+    :param keep_history: save a snapshot of the volatile columns of each added tweet in the tweet_history table
+    """
 
-        return Status.parse(api=None, json=tweet_dic)
+    # positions of the id and the volatile columns in a tweet row
+    history_columns = [0] + [TWEET_HEADER.index(c) for c in TWEET_VOLATILE_COLUMNS]
 
+    def __init__(self, filename, keep_history=False):
+        self.conn = schema.connect(filename)
+        self.keep_history = keep_history
 
-class SqliteTweetDB(TweetDB):
+        if not schema.table_exists(self.conn, "tweet"):
+            print("New sqlite tweets db created")
 
-    def __init__(self, filename):
-        self.conn = sqlite3.connect(filename)
+        schema.migrate(self.conn, schema.TWEET_MIGRATIONS)
 
-        c = self.conn.cursor()
+    def get_tweets_grouped_by_user(self, user_id_range=None):
+        """
+        Iterate once over all tweets ordered by the user id
 
-        if not c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tweet'").fetchone():
-            print("New sqlite tweets db created")
-            c.execute("""CREATE TABLE tweet (
-                            "id" INTEGER PRIMARY KEY,
-                            "user_id" INTEGER,
-                            "created_at" TEXT,
-                            "text" TEXT,
-                            "coordinates" TEXT,
-                            "country_code" TEXT,
-                            "place_name" TEXT,
-                            "in_reply_to_status_id" INTEGER,
-                            "in_reply_to_user_id" INTEGER,
-                            "quoted_status_id" INTEGER,
-                            "quoted_status_text" TEXT,
-                            "retweeted_status_id" INTEGER,
-                            "retweet_count" INTEGER,
-                            "favorite_count" INTEGER,
-                            "lang" TEXT,
-                            "withheld_copyright" INTEGER,
-                            "withheld_in_countries" TEXT,
-                            "urls" INTEGER,
-                            "videos" INTEGER,
-                            "photos" INTEGER,
-                            "gifs" INTEGER,
-                            "source" TEXT,
-                            "fetch_date" TEXT
-                        )
-                    """)
-
-    def get_tweets_grouped_by_user(self):
+        :param user_id_range: optional (start_id, end_id) tuple to only iterate over the tweets of the users with
+                              start_id <= user id < end_id
+
+        :return: generator of (user_id, tweets) tuples in ascending user id order, the tweets of each user are
+                 sorted from newest to oldest
+        """
         c = self.conn.cursor()
-        c.execute("SELECT * FROM tweet WHERE user_id IN (SELECT user_id FROM tweet GROUP BY user_id)")
-        return c
+        if user_id_range is None:
+            c.execute("SELECT * FROM tweet ORDER BY user_id, id DESC")
+        else:
+            c.execute("SELECT * FROM tweet WHERE user_id >= ? AND user_id < ? ORDER BY user_id, id DESC",
+                      user_id_range)
+
+        for user_id, rows in groupby(c, key=itemgetter(1)):
+            yield user_id, [self.parse_tweet(t) for t in rows]
+
+    def iter_rows(self):
+        return self.conn.cursor().execute("SELECT * FROM tweet")
 
     def get_tweets_for_user(self, user_id):
         c = self.conn.cursor()
         c.execute("SELECT * FROM tweet WHERE user_id == ? ORDER BY id DESC", (user_id,))
         return [self.parse_tweet(t) for t in list(c)]
 
-    def add(self, tweet):
+    def get_max_tweet_ids(self, user_ids):
+        """
+        Look up the newest saved tweet of each user with the user id index
+
+        :param user_ids: list of user ids
+
+        :return: dict of user id to the highest saved tweet id, users without saved tweets are not included
+        """
+        user_ids = [int(u) for u in user_ids]
+        max_ids = {}
+
         c = self.conn.cursor()
-        c.execute("INSERT INTO tweet VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                  tweet)
-        self.conn.commit()
+        for i in range(0, len(user_ids), MAX_QUERY_PARAMETERS):
+            chunk = user_ids[i:i + MAX_QUERY_PARAMETERS]
+            c.execute("SELECT user_id, max(id) FROM tweet WHERE user_id IN ({}) GROUP BY user_id".format(
+                ",".join("?" * len(chunk))), chunk)
+            max_ids.update(c.fetchall())
+
+        return max_ids
+
+    def add(self, tweet):
+        self.add_many([tweet])
 
     def add_many(self, tweets):
+        """
+        Insert the tweets, a tweet which is already saved only gets the values of the TWEET_VOLATILE_COLUMNS
+
+        :param tweets: list of tweet rows
+        """
+        # one transaction for all tweets, it is rolled back if one of them can't be inserted
+        with self.conn:
+            self.conn.executemany(TWEET_UPSERT, tweets)
+            if self.keep_history:
+                self.conn.executemany(TWEET_HISTORY_INSERT, [[t[i] for i in self.history_columns] for t in tweets])
+
+    def get_history(self, tweet_id):
+        """
+        :param tweet_id: id of the tweet
+
+        :return: list of tuples of the id and the TWEET_VOLATILE_COLUMNS of each saved fetch ordered by the fetch date
+        """
         c = self.conn.cursor()
-        c.executemany("INSERT INTO tweet VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                      tweets)
-        self.conn.commit()
+        return c.execute("SELECT * FROM tweet_history WHERE id = ? ORDER BY fetch_date", (tweet_id,)).fetchall()
 
 
 class SqliteUserDB(UserDB):
+    """
+    :param filename: path of the sqlite database
+    :param keep_history: save a snapshot of the volatile columns of each added user in the user_history table
+    """
 
-    def __init__(self, filename):
-        self.conn = sqlite3.connect(filename)
+    # positions of the id and the volatile columns in a user row
+    history_columns = [0] + [USER_HEADER.index(c) for c in USER_VOLATILE_COLUMNS]
 
-        c = self.conn.cursor()
-        if not c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user'").fetchone():
+    def __init__(self, filename, keep_history=False):
+        self.conn = schema.connect(filename)
+        self.keep_history = keep_history
+
+        if not schema.table_exists(self.conn, "user"):
             print("New sqlite users db created")
-            c.execute("""CREATE TABLE user (
-                            "id" INTEGER PRIMARY KEY,
-                            "name" TEXT,
-                            "screen_name" TEXT,
-                            "location" TEXT,
-                            "url" TEXT,
-                            "expanded_url" TEXT,
-                            "description" TEXT,
-                            "protected" INTEGER,
-                            "verified" INTEGER,
-                            "followers_count" INTEGER,
-                            "friends_count" INTEGER,
-                            "listed_count" INTEGER,
-                            "favourites_count" INTEGER,
-                            "statuses_count" INTEGER,
-                            "created_at" TEXT,
-                            "profile_image_url_https" TEXT,
-                            "default_profile" INTEGER,
-                            "default_profile_image" INTEGER,
-                            "withheld_in_countries" TEXT,
-                            "fetch_date" TEXT
-                          )
-                        """)
-            self.conn.commit()
+
+        schema.migrate(self.conn, schema.USER_MIGRATIONS)
 
     def get_user(self, user_id):
         c = self.conn.cursor()
         return c.execute("SELECT * FROM user WHERE id = ?", user_id).fetchone()[0]
 
+    def iter_rows(self):
+        return self.conn.cursor().execute("SELECT * FROM user")
+
     def get_total_number_of_users(self):
         c = self.conn.cursor()
         return c.execute("SELECT count(*) FROM user").fetchone()[0]
 
     def get_all_user(self):
         c = self.conn.cursor()
-        c.execute("SELECT * FROM user")
+        c.execute("SELECT * FROM user ORDER BY id")
 
         return [self.parse_user(u) for u in c.fetchall()]
 
-    def add(self, user):
+    def get_user_ids(self):
+        c = self.conn.cursor()
+        return [r[0] for r in c.execute("SELECT id FROM user ORDER BY id")]
+
+    def get_users_in_range(self, start_id, end_id):
         c = self.conn.cursor()
-        c.execute("INSERT INTO user VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", user)
-        self.conn.commit()
+        c.execute("SELECT * FROM user WHERE id >= ? AND id < ? ORDER BY id", (start_id, end_id))
+
+        return [self.parse_user(u) for u in c.fetchall()]
+
+    def add(self, user):
+        self.add_many([user])
 
     def add_many(self, users):
+        """
+        Insert the users, a user who is already saved only gets the values of the USER_VOLATILE_COLUMNS
+
+        :param users: list of user rows
+        """
+        # one transaction for all users, it is rolled back if one of them can't be inserted
+        with self.conn:
+            self.conn.executemany(USER_UPSERT, users)
+            if self.keep_history:
+                self.conn.executemany(USER_HISTORY_INSERT, [[u[i] for i in self.history_columns] for u in users])
+
+    def get_history(self, user_id):
+        """
+        :param user_id: id of the user
+
+        :return: list of tuples of the id and the USER_VOLATILE_COLUMNS of each saved fetch ordered by the fetch date
+        """
         c = self.conn.cursor()
-        c.executemany("INSERT INTO user VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", users)
-        self.conn.commit()
+        return c.execute("SELECT * FROM user_history WHERE id = ? ORDER BY fetch_date", (user_id,)).fetchall()
+
+
+class BufferedWriter:
+    """
+    Collect the rows of many small results and write them in groups with one add_many call, which is one transaction
+    of the sqlite databases and one append of the csv files. A group is written when batch_size rows are buffered or
+    the oldest buffered row waits longer than flush_interval seconds.
+
+    :param db: UserDB or TweetDB object
+    :param batch_size: number of rows which are written together
+    :param flush_interval: maximum seconds a row stays in the buffer, None to only write full batches
+    :param clock: function which returns the current time in seconds
+    """
+
+    def __init__(self, db, batch_size=DEFAULT_WRITE_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 clock=time.monotonic):
+        assert db is not None
+        assert batch_size > 0
+        assert flush_interval is None or flush_interval > 0
+
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.rows = []
+        self.first_added = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_many(self, rows):
+        """
+        :param rows: list of rows for the add_many method of the db
+
+        :return: number of rows written to the db
+        """
+        if len(rows) > 0:
+            if len(self.rows) == 0:
+                self.first_added = self.clock()
+            self.rows.extend(rows)
+
+        if len(self.rows) >= self.batch_size or self.is_due():
+            return self.flush()
+        return 0
+
+    def is_due(self):
+        """
+        :return: True if the buffered rows have to be written because the flush interval has passed
+        """
+        return len(self.rows) > 0 and self.flush_interval is not None \
+            and self.clock() - self.first_added >= self.flush_interval
+
+    def flush(self):
+        """
+        Write all buffered rows
+
+        :return: number of rows written to the db
+        """
+        written = len(self.rows)
+        if written > 0:
+            self.db.add_many(self.rows)
+            self.rows = []
+        self.first_added = None
+
+        return written
+
+
+CSV_INDEX_SUFFIX = ".idx"
+
+# magic, format version, size and modification time in ns of the indexed csv file
+CSV_INDEX_HEADER = struct.Struct("<4sI2q")
+CSV_INDEX_MAGIC = b"TBCI"
+CSV_INDEX_VERSION = 1
+
+# one entry for each csv record sorted by the user id, records of the same user are in file order
+CSV_INDEX_DTYPE = np.dtype([("user_id", "<i8"), ("offset", "<i8"), ("length", "<i8")])
+
+
+def iter_csv_records(f, quotechar="\""):
+    """
+    Split a binary csv file into records, quoted fields can contain line breaks
+
+    :param f: csv file opened in binary mode
+    :param quotechar: quote char of the csv file
+
+    :return: generator of (byte offset, record bytes) tuples
+    """
+    quote = quotechar.encode("ascii")
+
+    offset = 0
+    record = b""
+    quotes = 0
+    for line in f:
+        record += line
+        quotes += line.count(quote)
+        # the record is complete if all quoted fields are closed, escaped quotes are always doubled
+        if quotes % 2 == 0:
+            yield offset, record
+            offset += len(record)
+            record = b""
+            quotes = 0
+
+    if record:
+        yield offset, record
+
+
+def build_csv_index(filename, index_filename, delimiter=",", quotechar="\"", quoting=csv.QUOTE_MINIMAL,
+                    encoding="UTF-8", skip_header=False):
+    """
+    Create the byte offset index of a tweet csv file
+
+    :param filename: tweet csv file
+    :param index_filename: output file of the index
+
+    :return: numpy structured array of the index entries
+    """
+    stat = os.stat(filename)
+
+    user_ids = []
+    offsets = []
+    lengths = []
+
+    with open(filename, "rb") as f:
+        records = iter_csv_records(f, quotechar)
+
+        if skip_header:
+            next(records, None)
+
+        for offset, record in records:
+            reader = csv.reader(StringIO(record.decode(encoding), newline=""), delimiter=delimiter,
+                                quotechar=quotechar, quoting=quoting)
+            row = next(reader, None)
+            if row is None or len(row) < 2:
+                continue
+            try:
+                user_id = int(row[1])
+            except ValueError:
+                # header line
+                continue
+
+            user_ids.append(user_id)
+            offsets.append(offset)
+            lengths.append(len(record))
+
+    index = np.empty(len(user_ids), dtype=CSV_INDEX_DTYPE)
+    index["user_id"] = user_ids
+    index["offset"] = offsets
+    index["length"] = lengths
+    index = index[np.argsort(index["user_id"], kind="stable")]
+
+    tmp_filename = index_filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(CSV_INDEX_HEADER.pack(CSV_INDEX_MAGIC, CSV_INDEX_VERSION, stat.st_size, stat.st_mtime_ns))
+        f.write(index.tobytes())
+    os.replace(tmp_filename, index_filename)
+
+    return index
+
+
+def read_csv_index(index_filename, csv_stat):
+    """
+    Memory map the byte offset index of a tweet csv file
+
+    :param index_filename: file of the index
+    :param csv_stat: os.stat result of the indexed csv file
+
+    :return: numpy structured array of the index entries or None if the index is missing or outdated
+    """
+    try:
+        with open(index_filename, "rb") as f:
+            header = f.read(CSV_INDEX_HEADER.size)
+    except FileNotFoundError:
+        return None
+
+    if len(header) != CSV_INDEX_HEADER.size:
+        return None
+
+    magic, version, size, mtime_ns = CSV_INDEX_HEADER.unpack(header)
+    if magic != CSV_INDEX_MAGIC or version != CSV_INDEX_VERSION or size != csv_stat.st_size \
+            or mtime_ns != csv_stat.st_mtime_ns:
+        return None
+
+    if os.path.getsize(index_filename) == CSV_INDEX_HEADER.size:
+        return np.empty(0, dtype=CSV_INDEX_DTYPE)
+
+    return np.memmap(index_filename, dtype=CSV_INDEX_DTYPE, mode="r", offset=CSV_INDEX_HEADER.size)
 
 
 class CsvDB:
@@ -317,7 +578,7 @@ class CsvDB:
         self.skip_header = skip_header
 
     def add(self, user):
-        with open(self.filename, "a", encoding=self.encoding) as f:
+        with open(self.filename, "a", encoding=self.encoding, newline="") as f:
             writer = csv.writer(f, delimiter=self.delimiter, quotechar=self.quotechar, quoting=self.quoting)
             if f.tell() == 0:
                 self.__write_header__(writer)
@@ -325,13 +586,24 @@ class CsvDB:
             writer.writerow(user)
 
     def add_many(self, users):
-        with open(self.filename, "a", encoding=self.encoding) as f:
+        with open(self.filename, "a", encoding=self.encoding, newline="") as f:
             writer = csv.writer(f, delimiter=self.delimiter, quotechar=self.quotechar, quoting=self.quoting)
             if f.tell() == 0:
                 self.__write_header__(writer)
 
             writer.writerows(users)
 
+    def iter_rows(self):
+        with open(self.filename, "r", encoding=self.encoding, newline="") as f:
+            reader = csv.reader(f, delimiter=self.delimiter, quotechar=self.quotechar,
+                                quoting=self.quoting)
+
+            if self.skip_header:
+                next(reader)
+
+            for r in reader:
+                yield r
+
     @abstractmethod
     def __write_header__(self, writer):
         pass
@@ -346,44 +618,77 @@ class CsvTweetDB(CsvDB, TweetDB):
 
         self.fast_read = fast_read
 
-        # create a previously calculated index for reading big csv file
+        self.index_filename = filename + CSV_INDEX_SUFFIX
+        self.tweet_user_id_index = None
+        self.mm = None
+
+        # load or create the index for reading big csv files
         if fast_read:
-            self.tweet_user_id_index = defaultdict(list)
+            self.__load_index__()
 
-            with open(self.filename, "r", encoding=self.encoding) as f:
-                reader = csv.reader(f, delimiter=self.delimiter, quotechar=self.quotechar,
-                                    quoting=self.quoting)
+    def __write_header__(self, writer):
+        writer.writerow(TWEET_HEADER)
 
-                if self.skip_header:
-                    next(reader)
+    def add(self, tweet):
+        self.__close_index__()
+        super().add(tweet)
 
-                for i, r in enumerate(reader):
-                    self.tweet_user_id_index[r[1]].append(i)
+    def add_many(self, tweets):
+        self.__close_index__()
+        super().add_many(tweets)
+
+    def __close_index__(self):
+        # the index and the memory map are not valid anymore after the csv file was changed
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = None
+        self.tweet_user_id_index = None
+
+    def __load_index__(self):
+        """
+        Load the byte offset index of the csv file. The index is saved next to the csv file and is rebuilt when the
+        size or modification time of the csv file changed.
+        """
+        if self.tweet_user_id_index is not None:
+            return
+
+        stat = os.stat(self.filename)
+
+        self.tweet_user_id_index = read_csv_index(self.index_filename, stat)
+        if self.tweet_user_id_index is None:
+            self.tweet_user_id_index = build_csv_index(self.filename, self.index_filename, self.delimiter,
+                                                       self.quotechar, self.quoting, self.encoding, self.skip_header)
+
+        if stat.st_size > 0:
+            with open(self.filename, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __read_indexed_rows__(self, entries):
+        rows = []
+        for offset, length in zip(entries["offset"], entries["length"]):
+            record = self.mm[offset:offset + length].decode(self.encoding)
+            reader = csv.reader(StringIO(record, newline=""), delimiter=self.delimiter, quotechar=self.quotechar,
+                                quoting=self.quoting)
+            rows.append(next(reader))
 
-    def __write_header__(self, writer):
-        writer.writerow(TWEET_HEADER)
+        return rows
 
     def get_tweets_for_user(self, user_id):
         tweets = []
 
         if self.fast_read:
-            tweets_idx = self.tweet_user_id_index.get(user_id, None)
-            if tweets_idx is not None:
-                string_tweets = []
-                for i in tweets_idx:
-                    string_tweets.append(linecache.getline(self.filename, i))
+            self.__load_index__()
 
-                for t in string_tweets:
-                    reader = csv.reader(StringIO(t), delimiter=self.delimiter, quotechar=self.quotechar,
-                                        quoting=self.quoting)
-                    tweets.append(self.parse_tweet(next(reader)))
+            user_ids = self.tweet_user_id_index["user_id"]
+            start = np.searchsorted(user_ids, int(user_id), side="left")
+            end = np.searchsorted(user_ids, int(user_id), side="right")
 
-            else:
-                print("Warning: no tweets for user if found")
+            if start == end:
+                print("Warning: no tweets for user {} found".format(user_id))
 
-            return tweets
+            return [self.parse_tweet(r) for r in self.__read_indexed_rows__(self.tweet_user_id_index[start:end])]
         else:
-            with open(self.filename, "r", encoding=self.encoding) as f:
+            with open(self.filename, "r", encoding=self.encoding, newline="") as f:
                 reader = csv.reader(f, delimiter=self.delimiter, quotechar=self.quotechar,
                                     quoting=self.quoting)
 
@@ -396,9 +701,30 @@ class CsvTweetDB(CsvDB, TweetDB):
 
         return tweets
 
-    def get_tweets_grouped_by_user(self):
+    def get_tweets_grouped_by_user(self, user_id_range=None):
         # TODO: add option to get tweets without user id (helpful when there is no user db)
-        raise NotImplementedError
+        if not self.fast_read or user_id_range is not None:
+            raise NotImplementedError
+
+        self.__load_index__()
+
+        return self.__iter_index_groups__()
+
+    def __iter_index_groups__(self):
+        index = self.tweet_user_id_index
+        user_ids = index["user_id"]
+
+        if len(index) == 0:
+            return
+
+        # start positions of the groups of each user id in the sorted index
+        group_starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+        group_ends = np.r_[group_starts[1:], len(index)]
+
+        for start, end in zip(group_starts, group_ends):
+            tweets = [self.parse_tweet(r) for r in self.__read_indexed_rows__(index[start:end])]
+            tweets.sort(key=lambda t: t.id, reverse=True)
+            yield int(user_ids[start]), tweets
 
 
 class CsvUserDB(CsvDB, UserDB):
@@ -412,7 +738,7 @@ class CsvUserDB(CsvDB, UserDB):
 
     def get_user(self, user_id):
         users = []
-        with open(self.filename, "r", encoding=self.encoding) as f:
+        with open(self.filename, "r", encoding=self.encoding, newline="") as f:
             reader = csv.reader(f, delimiter=self.delimiter, quotechar=self.quotechar,
                                 quoting=self.quoting)
 
@@ -427,7 +753,7 @@ class CsvUserDB(CsvDB, UserDB):
 
     def get_all_user(self):
         users = []
-        with open(self.filename, "r", encoding=self.encoding) as f:
+        with open(self.filename, "r", encoding=self.encoding, newline="") as f:
             reader = csv.reader(f, delimiter=self.delimiter, quotechar=self.quotechar,
                                 quoting=self.quoting)
 
@@ -438,3 +764,30 @@ class CsvUserDB(CsvDB, UserDB):
                 users.append(self.parse_user(r))
 
         return users
+
+
+def deduplicate_csv(input_db, output_db, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Copy the rows of a csv dataset with only the last fetched row of each id, for example of a csv file which was
+    appended by several fetch runs
+
+    :param input_db: CsvTweetDB or CsvUserDB object of the input file
+    :param output_db: CsvTweetDB or CsvUserDB object the rows are added to
+    :param batch_size: number of rows which are written together
+
+    :return: tuple of the number of read and written rows
+    """
+    # the rows are read twice, so only the position of the last row of each id has to be kept in memory
+    last_positions = {}
+    n_rows = 0
+    for i, r in enumerate(input_db.iter_rows()):
+        last_positions[r[0]] = i
+        n_rows += 1
+
+    writer = BufferedWriter(output_db, batch_size, flush_interval=None)
+    for i, r in enumerate(input_db.iter_rows()):
+        if last_positions[r[0]] == i:
+            writer.add_many([r])
+    writer.flush()
+
+    return n_rows, len(last_positions)
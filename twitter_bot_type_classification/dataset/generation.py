@@ -1,21 +1,26 @@
 import os
+import queue
 import time
 from abc import ABC
 from datetime import datetime
 from enum import Enum
 from multiprocessing import Queue, Process, Lock
 
-import requests
 import tweepy
 
-from twitter_bot_type_classification.dataset.db import SqliteTweetDB, CsvTweetDB, SqliteUserDB, CsvUserDB
-from twitter_bot_type_classification.features.utils import URL_SCHEME
+from twitter_bot_type_classification.dataset.db import SqliteTweetDB, CsvTweetDB, SqliteUserDB, CsvUserDB, \
+    BufferedWriter, DEFAULT_WRITE_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+from twitter_bot_type_classification.dataset.jobs import JobQueue, JobState, open_job_queue
+from twitter_bot_type_classification.features.urls import get_url_resolver
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 NETWORK_CONNECTION_DOWN_ERROR_SUBSTRINGS = ["NewConnectionError",
                                             "Failed to establish a new connection: [Errno -2] Name or service not known"]
 ENCODING = "UTF-8"
 
+# maximum number of tweets of one user timeline request
+TIMELINE_PAGE_SIZE = 200
+
 
 class FetchWorker(Process):
 
@@ -38,34 +43,69 @@ class FetchWorker(Process):
 
 class SaveWorker(Process):
 
-    def __init__(self, task_q, db, fetch_worker_count, total_results, std_out_lock):
+    def __init__(self, task_q, db, fetch_worker_count, total_results, std_out_lock,
+                 batch_size=DEFAULT_WRITE_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, jobs_filename=None):
+        """
+        :param jobs_filename: JobQueue file in which the jobs of the saved tasks are finished, None without job queue
+        """
         self.task_q = task_q
         self.db = db
         self.fetch_worker_count = fetch_worker_count
         self.total_results = total_results
         self.std_out_lock = std_out_lock
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.jobs_filename = jobs_filename
+        self.jobs = None
+        self.finished_jobs = []
         super(SaveWorker, self).__init__()
 
+    def __finish_jobs__(self, writer):
+        # the jobs are finished after all their results were written
+        if self.jobs is not None and len(writer) == 0 and len(self.finished_jobs) > 0:
+            self.jobs.finish_many(self.finished_jobs)
+            self.finished_jobs = []
+
     def run(self):
         results_saved = 0
         not_available = 0
 
+        writer = BufferedWriter(self.db, self.batch_size, self.flush_interval)
+
+        # the sqlite connection of the job queue is opened in the process of the worker
+        if self.jobs_filename is not None:
+            self.jobs = JobQueue(self.jobs_filename)
+
         while True:
-            task = self.task_q.get()
+            try:
+                # wake up to write the buffered results if no task finishes within the flush interval
+                task = self.task_q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                results_saved += writer.flush()
+                self.__finish_jobs__(writer)
+                continue
+
             if task is None:
                 self.fetch_worker_count -= 1
                 if self.fetch_worker_count == 0:
+                    results_saved += writer.flush()
+                    self.__finish_jobs__(writer)
                     self.std_out_lock.acquire()
+                    print("\rNot available: {} Saved: {}/{}".format(not_available, results_saved, self.total_results),
+                          end="", flush=True)
                     print("\nAll tasks finished")
                     self.std_out_lock.release()
+                    if self.jobs is not None:
+                        self.jobs.close()
                     break
             else:
                 results = task.get_result()
 
-                if len(results) > 0:
-                    self.db.add_many(results)
+                if task.job_id is not None:
+                    self.finished_jobs.append((task.job_id, task.get_state(), task.failed))
 
-                results_saved += len(results)
+                results_saved += writer.add_many(results)
+                self.__finish_jobs__(writer)
 
                 diff = task.expected_result_length - len(results)
                 if diff > 0:
@@ -81,52 +121,238 @@ class SaveWorker(Process):
 
 class FetchTask:
     result = None
+    failed = False
 
-    def __init__(self, func, args, expected_result_length):
+    def __init__(self, func, args, expected_result_length, job_id=None):
+        """
+        :param job_id: id of the job of the task in the JobQueue, None if the task is not part of a job queue
+        """
         self.func = func
         self.args = args
         self.expected_result_length = expected_result_length
+        self.job_id = job_id
 
     def execute(self):
-        self.result = self.func(**self.args)
+        try:
+            self.result = self.func(**self.args)
+        except tweepy.error.TweepError as error:
+            print("Error while executing fetch task: {}".format(error))
+            self.result = []
+            self.failed = True
+            return
+
+        # a timeline which was not fetched up to the limit is fetched again when the job is resumed
+        paginator = self.args.get("paginator")
+        self.failed = paginator is not None and not paginator.finished
 
     def get_result(self):
         return self.result
 
+    def get_state(self):
+        """
+        :return: state of the paginator of the task or None if the task has no paginator
+        """
+        paginator = self.args.get("paginator")
+        return None if paginator is None else paginator.get_state()
+
+
+class TimelinePaginator:
+    """
+    Page through a user timeline from the newest to the oldest tweet with max_id. The position in the timeline and the
+    number of fetched tweets are kept in the paginator, so a retry after an error or a restarted task continues below
+    the oldest fetched tweet instead of fetching the same tweets again.
+
+    :param user: user id or username
+    :param limit: maximum number of tweets, -1 for all available tweets
+    :param is_username: the user is a username
+    :param since_id: only fetch the tweets with a higher id, None to fetch the timeline up to the limit
+    :param tweet_mode: tweet mode of the requests
+    """
+
+    def __init__(self, user, limit=200, is_username=False, since_id=None, tweet_mode="extended"):
+        assert user is not None
+        assert limit > -2 and limit != 0
+
+        self.user = user
+        self.limit = limit
+        self.is_username = is_username
+        self.since_id = since_id
+        self.tweet_mode = tweet_mode
+
+        # highest id of the next page, one less than the oldest fetched tweet
+        self.max_id = None
+        self.fetched = 0
+        self.finished = False
+
+    def get_state(self):
+        """
+        :return: json serializable dict of the arguments and the position of the paginator
+        """
+        return {"user": self.user, "limit": self.limit, "is_username": self.is_username, "since_id": self.since_id,
+                "tweet_mode": self.tweet_mode, "max_id": self.max_id, "fetched": self.fetched,
+                "finished": self.finished}
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        :param state: dict returned by get_state
+
+        :return: TimelinePaginator which continues at the position of the state
+        """
+        paginator = cls(state["user"], state["limit"], state["is_username"], state["since_id"], state["tweet_mode"])
+        paginator.max_id = state["max_id"]
+        paginator.fetched = state["fetched"]
+        paginator.finished = state["finished"]
+
+        return paginator
+
+    def get_remaining(self):
+        """
+        :return: number of tweets which are still to fetch, -1 if all available tweets are fetched
+        """
+        return -1 if self.limit == -1 else self.limit - self.fetched
+
+    def get_params(self):
+        """
+        :return: dict of the parameters of the user_timeline request of the next page
+        """
+        remaining = self.get_remaining()
+        count = TIMELINE_PAGE_SIZE if remaining == -1 else min(TIMELINE_PAGE_SIZE, remaining)
+
+        params = {"screen_name" if self.is_username else "user_id": self.user, "count": count, "trim_user": True,
+                  "tweet_mode": self.tweet_mode}
+        if self.max_id is not None:
+            params["max_id"] = self.max_id
+        if self.since_id is not None:
+            params["since_id"] = self.since_id
+
+        return params
+
+    def advance(self, tweet_ids):
+        """
+        Move on below the tweets of a page which was requested with the parameters of get_params
+
+        :param tweet_ids: list of the tweet ids of the page, newest first
+        """
+        if len(tweet_ids) == 0:
+            self.finished = True
+            return
+
+        self.max_id = tweet_ids[-1] - 1
+        self.fetched += len(tweet_ids)
+        self.finished = self.get_remaining() == 0
+
+    def next_page(self, api):
+        """
+        Request the next page, the paginator only moves on if the request succeeded
+
+        :param api: tweepy API object
+
+        :return: list of the tweepy status objects of the page, empty if the timeline is finished
+        """
+        if self.finished:
+            return []
+
+        params = self.get_params()
+        page = list(api.user_timeline(**params))[:params["count"]]
+        self.advance([t.id for t in page])
+
+        return page
+
 
 class DBType(Enum):
     USER = 0
     TWEET = 1
 
 
+def open_db(filename, db_type, sqlite=True, keep_history=False):
+    """
+    :param filename: output file of the dataset
+    :param db_type: DBType of the dataset
+    :param sqlite: sqlite database if True, otherwise csv file
+    :param keep_history: save a snapshot of the volatile columns of each fetch, only supported by sqlite databases
+
+    :return: UserDB or TweetDB object
+    """
+    assert sqlite or not keep_history
+
+    if sqlite:
+        if db_type is DBType.USER:
+            return SqliteUserDB(filename, keep_history)
+        return SqliteTweetDB(filename, keep_history)
+
+    if db_type is DBType.USER:
+        return CsvUserDB(filename)
+    return CsvTweetDB(filename)
+
+
+def load_since_ids(filename, users):
+    """
+    :param filename: sqlite tweet database
+    :param users: list of user ids
+
+    :return: dict of user id to the id of the newest saved tweet of the user, only newer tweets have to be fetched
+    """
+    tweet_db = SqliteTweetDB(filename)
+    since_ids = tweet_db.get_max_tweet_ids(users)
+    tweet_db.conn.close()
+
+    return since_ids
+
+
+def create_timeline_payloads(filename, users, limit, is_username=False, incremental=False):
+    """
+    :return: generator of the job payloads of the user timelines, the state of a new TimelinePaginator of each user
+    """
+    since_ids = load_since_ids(filename, users) if incremental else {}
+
+    return (TimelinePaginator(u, limit, is_username, since_ids.get(int(u)) if incremental else None).get_state()
+            for u in users)
+
+
+def create_lookup_payloads(users, is_username=False):
+    """
+    :return: list of the job payloads of the user lookups with up to 100 users each
+    """
+    return [{"users": users[idx:idx + 100], "is_username": is_username} for idx in range(0, len(users), 100)]
+
+
 class DatasetGenerator(ABC):
     save_worker = None
 
-    def __init__(self, api, tasks_q_size=100, results_q_size=100):
+    def __init__(self, api, tasks_q_size=100, results_q_size=100, batch_size=DEFAULT_WRITE_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, keep_history=False):
+        """
+        :param api: tweepy API object or list of API objects with different credentials, the tasks are distributed
+                    over them in turn
+        :param batch_size: number of users or tweets which are saved together in one transaction
+        :param flush_interval: maximum seconds fetched users or tweets wait before they are saved
+        :param keep_history: save a snapshot of the volatile columns of each fetched user or tweet in the sqlite
+                             database
+        """
         assert api is not None
         assert tasks_q_size > 0
         assert results_q_size > 0
+        assert batch_size > 0
+        assert flush_interval > 0
 
-        self.api = api
+        self.apis = list(api) if isinstance(api, (list, tuple)) else [api]
+        assert len(self.apis) > 0
+
+        self.api = self.apis[0]
         self.tasks_q_size = tasks_q_size
         self.results_q_size = results_q_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_history = keep_history
         self.std_out_lock = Lock()
 
-    def __init_worker__(self, filename, db_type, sqlite, total_length):
+    def __init_worker__(self, filename, db_type, sqlite, total_length, jobs=None):
         self.tasks_q = Queue(self.tasks_q_size)
         self.results_q = Queue(self.results_q_size)
         self.workers = []
 
-        if sqlite:
-            if db_type is DBType.USER:
-                db = SqliteUserDB(filename)
-            else:
-                db = SqliteTweetDB(filename)
-        else:
-            if db_type is DBType.USER:
-                db = CsvUserDB(filename)
-            else:
-                db = CsvTweetDB(filename)
+        db = open_db(filename, db_type, sqlite, self.keep_history)
 
         for i in range(os.cpu_count()):
             worker = FetchWorker(self.tasks_q, self.results_q)
@@ -136,7 +362,8 @@ class DatasetGenerator(ABC):
         print("{} download worker started.".format(len(self.workers)))
 
         self.save_worker = SaveWorker(self.results_q, db, len(self.workers), total_length,
-                                      self.std_out_lock)
+                                      self.std_out_lock, self.batch_size, self.flush_interval,
+                                      None if jobs is None else jobs.filename)
         self.save_worker.start()
 
     def __stop_worker__(self):
@@ -146,79 +373,82 @@ class DatasetGenerator(ABC):
 
 class TweetDatasetGenerator(DatasetGenerator):
 
-    def get_tweets_of_users(self, users, filename=None, limit=200, is_username=False, sqlite=True):
+    def get_tweets_of_users(self, users, filename=None, limit=200, is_username=False, sqlite=True,
+                            incremental=False, resume=False):
+        """
+        :param incremental: only fetch the tweets which are newer than the newest saved tweet of each user, requires
+                            a sqlite database and user ids
+        :param resume: continue the unfinished jobs of a previous run with the same output file instead of fetching
+                       all users
+        """
         assert filename is not None
         assert limit > -2 and limit != 0
+        assert not incremental or (sqlite and not is_username)
 
-        self.__init_worker__(filename, DBType.TWEET, sqlite, limit * len(users))
+        jobs = open_job_queue(filename, lambda: create_timeline_payloads(filename, users, limit, is_username,
+                                                                         incremental), resume)
+        n_jobs = jobs.get_counts()[JobState.PENDING]
 
-        for u in users:
+        self.__init_worker__(filename, DBType.TWEET, sqlite, limit * n_jobs, jobs)
+
+        for i, (job_id, payload) in enumerate(jobs.start()):
+            api = self.apis[i % len(self.apis)]
+            paginator = TimelinePaginator.from_state(payload)
             self.tasks_q.put(
-                FetchTask(self.fetch_tweets_for_user, {"api": self.api, "user": u, "is_username": is_username,
-                                                       "limit": limit},
-                          limit))
+                FetchTask(self.fetch_tweets_for_user, {"api": api, "paginator": paginator},
+                          paginator.get_remaining(), job_id))
 
         self.__stop_worker__()
 
         self.save_worker.join()
+        jobs.close()
 
     @staticmethod
-    def fetch_tweets_for_user(api, user=None, limit=200, is_username=False, tweet_mode="extended"):
+    def fetch_tweets_for_user(api, user=None, limit=200, is_username=False, tweet_mode="extended", since_id=None,
+                              paginator=None):
+        """
+        :param since_id: only fetch the tweets with a higher id, None to fetch the timeline up to the limit
+        :param paginator: TimelinePaginator of a previous run of the task which continues where it stopped, by default
+                          a new paginator of the other arguments
+        """
         assert api is not None
-        assert user is not None
-        assert limit is not None
 
-        tweets = []
+        if paginator is None:
+            assert user is not None
+            assert limit is not None
+            paginator = TimelinePaginator(user, limit, is_username, since_id, tweet_mode)
 
-        if limit > 200:
-            count = 200
-        else:
-            count = limit
+        tweets = []
 
-        since_id = None
         retries = 5
         network_down_retries = 20
 
-        while True:
+        while not paginator.finished:
             try:
-                if is_username:
-                    for status in tweepy.Cursor(api.user_timeline, screen_name=user, count=count, since_id=since_id,
-                                                trim_user=True, tweet_mode=tweet_mode).items(limit):
-                        tweets.append(status)
-                else:
-                    for status in tweepy.Cursor(api.user_timeline, user_id=user, count=count, since_id=since_id,
-                                                trim_user=True, tweet_mode=tweet_mode).items(limit):
-                        tweets.append(status)
-                break
+                tweets.extend(paginator.next_page(api))
             except tweepy.error.TweepError as error:
                 status_code = getattr(error.response, "status_code", None)
                 if status_code == 401:
                     # the Twitter user does not exists anymore
+                    paginator.finished = True
                     break
                 elif all(error_substring in error.reason for error_substring in
                          NETWORK_CONNECTION_DOWN_ERROR_SUBSTRINGS):
                     if network_down_retries > 0:
                         __handle_connection_down_error__(network_down_retries)
                         network_down_retries -= 1
-                        if len(tweets) > 0:
-                            since_id = tweets[-1].id
-                        limit = limit - len(tweets)
-                        continue
                     else:
                         print(
                             "Network connection is down and max number of retries reached. Stopping current request loop.")
                         break
                 else:
                     if retries > 0:
-                        print("Error while loading tweets from {} with error response {}".format(user,
+                        print("Error while loading tweets from {} with error response {}".format(paginator.user,
                                                                                                  getattr(error,
                                                                                                          "response",
                                                                                                          "unkown")))
                         print("Retry: {}".format(retries))
                         retries -= 1
-                        if len(tweets) > 0:
-                            since_id = tweets[-1].id
-                        limit = limit - len(tweets)
                     else:
                         print("Max number of retries reached. Stopping current request loop.")
                         break
@@ -228,22 +458,29 @@ class TweetDatasetGenerator(DatasetGenerator):
 
 class UserDatasetGenerator(DatasetGenerator):
 
-    def get_users(self, users, filename=None, is_username=False, sqlite=True):
+    def get_users(self, users, filename=None, is_username=False, sqlite=True, resume=False):
+        """
+        :param resume: continue the unfinished jobs of a previous run with the same output file instead of fetching
+                       all users
+        """
         assert filename is not None
 
-        self.__init_worker__(filename, DBType.USER, sqlite, len(users))
+        jobs = open_job_queue(filename, lambda: create_lookup_payloads(users, is_username), resume)
+        started = list(jobs.start())
+
+        self.__init_worker__(filename, DBType.USER, sqlite, sum(len(p["users"]) for _, p in started), jobs)
 
-        idx = 0
-        while idx < len(users):
-            temp = users[idx:idx + 100]
+        for i, (job_id, payload) in enumerate(started):
+            api = self.apis[i % len(self.apis)]
             self.tasks_q.put(
-                FetchTask(self.fetch_users, {"api": self.api, "users_to_fetch": temp, "is_username": is_username},
-                          len(temp)))
-            idx += 100
+                FetchTask(self.fetch_users, {"api": api, "users_to_fetch": payload["users"],
+                                             "is_username": payload["is_username"]},
+                          len(payload["users"]), job_id))
 
         self.__stop_worker__()
 
         self.save_worker.join()
+        jobs.close()
 
     @staticmethod
     def fetch_users(api, users_to_fetch=None, is_username=True, network_down_retries=20):
@@ -274,13 +511,18 @@ class UserDatasetGenerator(DatasetGenerator):
                             network_down_retries -= 1
                             continue
                         else:
+                            # the task fails, so the job of the users is fetched again when it is resumed
                             print("Network connection is down and max retries reached. Stopping current request loop.")
-                            break
+                            raise error
                     else:
                         raise error
 
                 idx += 100
-        return [parse_user(u) for u in users]
+
+        # the profile urls of all users are resolved concurrently
+        expanded_urls = get_url_resolver().resolve_many(u.url for u in users if u.url is not None)
+
+        return [parse_user(u, expanded_urls) for u in users]
 
 
 def __handle_connection_down_error__(retries):
@@ -290,25 +532,23 @@ def __handle_connection_down_error__(retries):
     time.sleep(wait_time)
 
 
-def parse_user(user):
+def parse_user(user, expanded_urls=None):
+    """
+    :param user: tweepy user object
+    :param expanded_urls: dict of the already resolved profile urls to their expanded urls, the other urls are resolved
+
+    :return: list of the user values in the order of the USER_HEADER
+    """
     withheld_in_countries = getattr(user, "withheld_in_countries", None)
     if withheld_in_countries is not None:
         withheld_in_countries = ";".join(withheld_in_countries)
 
     if user.url is None:
         expanded_url = ""
+    elif expanded_urls is not None and user.url in expanded_urls:
+        expanded_url = expanded_urls[user.url]
     else:
-        expanded_url = requests.head(user.url).headers["location"]
-
-        if URL_SCHEME.sub("", expanded_url) == URL_SCHEME.sub("", user.url):
-            try:
-                expanded_url = requests.get(user.url, timeout=10).url
-            except requests.exceptions.ConnectionError as e:
-                expanded_url = e.request.url
-            except requests.exceptions.ReadTimeout as e:
-                expanded_url = e.request.url
-            except requests.exceptions.TooManyRedirects as e:
-                expanded_url = e.request.url
+        expanded_url = get_url_resolver().resolve(user.url)
 
     return [
         user.id,
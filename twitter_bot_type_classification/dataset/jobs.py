@@ -0,0 +1,161 @@
+import json
+import os
+from enum import Enum
+
+from twitter_bot_type_classification.dataset import schema
+
+# the job queue of a dataset is saved next to the output file
+JOB_QUEUE_SUFFIX = ".jobs"
+
+# number of runs with --resume in which a failed job is fetched again
+DEFAULT_MAX_RETRIES = 3
+
+# number of jobs which are read or created together
+JOB_PAGE_SIZE = 10000
+
+
+class JobState(Enum):
+    PENDING = 0
+    IN_FLIGHT = 1
+    DONE = 2
+    FAILED = 3
+
+
+class JobQueue:
+    """
+    Persistent queue of the fetch jobs of a dataset generation in a sqlite database. Each job is a user or a chunk of
+    users with a json payload. A job is only done after its results were saved, so the jobs of a run which was
+    stopped can be continued.
+
+    The queue is used by the process which creates the jobs and by the process which saves the results, each process
+    opens its own connection. The connection can be used by another thread than the one which opened it, for example
+    the writer thread of the async engine, but only by one thread at a time.
+
+    :param filename: path of the sqlite database
+    :param max_retries: number of times a failed job is started again
+    """
+
+    def __init__(self, filename, max_retries=DEFAULT_MAX_RETRIES):
+        assert filename is not None
+        assert max_retries >= 0
+
+        self.filename = filename
+        self.max_retries = max_retries
+        self.conn = None
+        self.pid = None
+
+    def __connect__(self):
+        # a connection must not be used in a forked process
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = schema.connect(self.filename, check_same_thread=False)
+            schema.migrate(self.conn, schema.JOB_QUEUE_MIGRATIONS)
+            self.pid = os.getpid()
+
+        return self.conn
+
+    def create(self, payloads):
+        """
+        Remove all jobs and add a pending job for each payload
+
+        :param payloads: iterable of json serializable payloads
+        """
+        conn = self.__connect__()
+
+        with conn:
+            conn.execute("DELETE FROM job")
+
+            page = []
+            for payload in payloads:
+                page.append((JobState.PENDING.value, json.dumps(payload)))
+                if len(page) == JOB_PAGE_SIZE:
+                    conn.executemany("INSERT INTO job (state, retries, payload) VALUES(?, 0, ?)", page)
+                    page = []
+            conn.executemany("INSERT INTO job (state, retries, payload) VALUES(?, 0, ?)", page)
+
+    def get_counts(self):
+        """
+        :return: dict of each JobState to the number of jobs in this state
+        """
+        counts = dict(self.__connect__().execute("SELECT state, count(*) FROM job GROUP BY state"))
+        return {state: counts.get(state.value, 0) for state in JobState}
+
+    def requeue(self):
+        """
+        Set the jobs which were in flight when a run stopped and the failed jobs with retries left to pending
+
+        :return: number of pending jobs
+        """
+        conn = self.__connect__()
+
+        with conn:
+            conn.execute("UPDATE job SET state = ? WHERE state = ? OR (state = ? AND retries <= ?)",
+                         (JobState.PENDING.value, JobState.IN_FLIGHT.value, JobState.FAILED.value, self.max_retries))
+
+        return self.get_counts()[JobState.PENDING]
+
+    def start(self):
+        """
+        Set all pending jobs in flight
+
+        :return: generator of (job id, payload) tuples of the started jobs in the order they were created
+        """
+        conn = self.__connect__()
+
+        with conn:
+            conn.execute("UPDATE job SET state = ? WHERE state = ?", (JobState.IN_FLIGHT.value, JobState.PENDING.value))
+
+        # the jobs are read in pages, because jobs which are already finished change while the others are read
+        last_id = -1
+        while True:
+            rows = conn.execute("SELECT id, payload FROM job WHERE state = ? AND id > ? ORDER BY id LIMIT ?",
+                                (JobState.IN_FLIGHT.value, last_id, JOB_PAGE_SIZE)).fetchall()
+            if len(rows) == 0:
+                break
+
+            for job_id, payload in rows:
+                yield job_id, json.loads(payload)
+            last_id = rows[-1][0]
+
+    def finish_many(self, jobs):
+        """
+        :param jobs: list of tuples of the job id, the new payload or None to keep the payload and True if the job
+                     failed
+        """
+        conn = self.__connect__()
+
+        with conn:
+            conn.executemany("UPDATE job SET state = ?, retries = retries + ?, payload = coalesce(?, payload) "
+                             "WHERE id = ?",
+                             [(JobState.FAILED.value if failed else JobState.DONE.value, int(failed),
+                               None if payload is None else json.dumps(payload), job_id)
+                              for job_id, payload, failed in jobs])
+
+    def close(self):
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
+
+
+def open_job_queue(output_filename, create_payloads, resume=False):
+    """
+    Open the job queue of an output file and either continue its unfinished jobs or replace them with new jobs
+
+    :param output_filename: output file of the dataset
+    :param create_payloads: function which returns the payloads of the new jobs
+    :param resume: continue the jobs of the previous run if there are any
+
+    :return: JobQueue object
+    """
+    jobs = JobQueue(output_filename + JOB_QUEUE_SUFFIX)
+
+    counts = jobs.get_counts()
+    if resume and sum(counts.values()) > 0:
+        pending = jobs.requeue()
+        print("Resume {} of {} jobs, {} jobs are already done".format(pending, sum(counts.values()),
+                                                                      counts[JobState.DONE]))
+    else:
+        if resume:
+            print("No jobs to resume found, all users are fetched")
+        jobs.create(create_payloads())
+
+    return jobs
@@ -0,0 +1,410 @@
+import ast
+import os
+import uuid
+from datetime import datetime
+
+from twitter_bot_type_classification.dataset.db import TweetDB, UserDB, DATE_TIME_FORMAT, TWEET_HEADER
+from twitter_bot_type_classification.dataset.records import TweetRecord, UserRecord, PlaceRecord, \
+    EmbeddedTweetRecord, USER_RECORD_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+    ds = None
+
+# number of hash partitions, the partition of a row is user_id % N_USER_BUCKETS
+N_USER_BUCKETS = 64
+
+USER_BUCKET_COLUMN = "user_bucket"
+
+# tweet columns used by the feature calculation
+TWEET_FEATURE_COLUMNS = [c for c in TWEET_HEADER if c not in ["place_name", "quoted_status_text", "withheld_copyright",
+                                                               "fetch_date"]]
+
+if pa is not None:
+    URL_TYPE = pa.struct([("url", pa.string()), ("expanded_url", pa.string())])
+
+    DICT_STRING_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+    TWEET_SCHEMA = pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("created_at", pa.timestamp("s")),
+        ("text", pa.string()),
+        ("coordinates", pa.list_(pa.float64())),
+        ("country_code", DICT_STRING_TYPE),
+        ("place_name", pa.string()),
+        ("in_reply_to_status_id", pa.int64()),
+        ("in_reply_to_user_id", pa.int64()),
+        ("quoted_status_id", pa.int64()),
+        ("quoted_status_text", pa.string()),
+        ("retweeted_status_id", pa.int64()),
+        ("retweet_count", pa.int64()),
+        ("favorite_count", pa.int64()),
+        ("lang", DICT_STRING_TYPE),
+        ("withheld_copyright", pa.bool_()),
+        ("withheld_in_countries", pa.list_(pa.string())),
+        ("urls", pa.list_(URL_TYPE)),
+        ("videos", pa.int32()),
+        ("photos", pa.int32()),
+        ("gifs", pa.int32()),
+        ("source", DICT_STRING_TYPE),
+        ("fetch_date", pa.timestamp("s"))
+    ])
+
+    USER_SCHEMA = pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("screen_name", pa.string()),
+        ("location", pa.string()),
+        ("url", pa.string()),
+        ("expanded_url", pa.string()),
+        ("description", pa.string()),
+        ("protected", pa.bool_()),
+        ("verified", pa.bool_()),
+        ("followers_count", pa.int64()),
+        ("friends_count", pa.int64()),
+        ("listed_count", pa.int64()),
+        ("favourites_count", pa.int64()),
+        ("statuses_count", pa.int64()),
+        ("created_at", pa.timestamp("s")),
+        ("profile_image_url_https", pa.string()),
+        ("default_profile", pa.bool_()),
+        ("default_profile_image", pa.bool_()),
+        ("withheld_in_countries", pa.list_(pa.string())),
+        ("fetch_date", pa.timestamp("s"))
+    ])
+
+    PARTITIONING = ds.partitioning(pa.schema([(USER_BUCKET_COLUMN, pa.int32())]), flavor="hive")
+
+
+def _is_empty(value):
+    return value is None or value == ""
+
+
+def _to_int(value):
+    return None if _is_empty(value) else int(value)
+
+
+def _to_bool(value):
+    return value in (True, 1, "True", "1")
+
+
+def _to_datetime(value):
+    if _is_empty(value):
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, DATE_TIME_FORMAT)
+
+
+def _to_text(value, file_encoding="utf-8", text_encoding="unicode_escape"):
+    # the text of the row based datasets is unicode escaped
+    return None if value is None else value.encode(file_encoding).decode(text_encoding)
+
+
+def _to_list(value, list_separator=";"):
+    if _is_empty(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return value.split(list_separator)
+
+
+def _to_coordinates(value):
+    if _is_empty(value):
+        return None
+    coords = value.split(";")
+    if len(coords) < 2:
+        return None
+    return [float(coords[0]), float(coords[1])]
+
+
+def _to_urls(value):
+    if _is_empty(value):
+        return []
+    urls = ast.literal_eval(value) if isinstance(value, str) else value
+    return [{"url": url, "expanded_url": expanded_url} for url, expanded_url in urls.items()]
+
+
+def _user_bucket(user_id):
+    return user_id % N_USER_BUCKETS
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError("The parquet backend requires pyarrow. Install it with: pip install pyarrow")
+
+
+class ParquetDB:
+    """
+    Parquet dataset directory partitioned by the hash of the user id
+
+    Each call of add or add_many writes new files into the touched partitions, so the rows should be added in big
+    batches.
+    """
+
+    schema = None
+
+    # column which contains the user id used for the partitioning
+    user_id_column = None
+
+    def __init__(self, path, columns=None):
+        _check_pyarrow()
+
+        self.path = path
+        self.columns = columns
+
+        os.makedirs(path, exist_ok=True)
+
+    def __dataset__(self):
+        return ds.dataset(self.path, schema=self.schema.append(pa.field(USER_BUCKET_COLUMN, pa.int32())),
+                          format="parquet", partitioning=PARTITIONING)
+
+    def __user_filter__(self, user_id):
+        # the bucket expression prunes the partitions, the id expression uses the row group statistics
+        return (ds.field(USER_BUCKET_COLUMN) == _user_bucket(user_id)) & (ds.field(self.user_id_column) == user_id)
+
+    def __range_filter__(self, start_id, end_id):
+        return (ds.field(self.user_id_column) >= start_id) & (ds.field(self.user_id_column) < end_id)
+
+    def __read__(self, filter=None):
+        return self.__dataset__().to_table(columns=self.columns, filter=filter)
+
+    def add(self, item):
+        self.add_many([item])
+
+    def add_many(self, items):
+        if len(items) == 0:
+            return
+
+        columns = self.__to_columns__(items)
+        columns[USER_BUCKET_COLUMN] = [_user_bucket(user_id) for user_id in columns[self.user_id_column]]
+
+        table = pa.Table.from_pydict(columns, schema=self.schema.append(pa.field(USER_BUCKET_COLUMN, pa.int32())))
+
+        # the files of earlier writes are kept, so each write needs file names which are unique across instances and
+        # processes
+        ds.write_dataset(table, self.path, format="parquet", partitioning=PARTITIONING,
+                         basename_template="part-{}-{{i}}.parquet".format(uuid.uuid4().hex),
+                         existing_data_behavior="overwrite_or_ignore")
+
+    def __to_columns__(self, items):
+        raise NotImplementedError
+
+
+class ParquetTweetDB(ParquetDB, TweetDB):
+    """
+    Tweet dataset stored as typed parquet columns
+
+    :param path: directory of the parquet dataset
+    :param columns: list of the columns to read, for example TWEET_FEATURE_COLUMNS. Not read columns are None.
+    """
+
+    user_id_column = "user_id"
+
+    def __init__(self, path, columns=None):
+        super().__init__(path, columns)
+        self.schema = TWEET_SCHEMA
+
+    def __to_columns__(self, tweets):
+        return {
+            "id": [int(t[0]) for t in tweets],
+            "user_id": [int(t[1]) for t in tweets],
+            "created_at": [_to_datetime(t[2]) for t in tweets],
+            "text": [_to_text(t[3]) for t in tweets],
+            "coordinates": [_to_coordinates(t[4]) for t in tweets],
+            "country_code": [None if _is_empty(t[5]) else t[5] for t in tweets],
+            "place_name": [None if _is_empty(t[6]) else t[6] for t in tweets],
+            "in_reply_to_status_id": [_to_int(t[7]) for t in tweets],
+            "in_reply_to_user_id": [_to_int(t[8]) for t in tweets],
+            "quoted_status_id": [_to_int(t[9]) for t in tweets],
+            "quoted_status_text": [None if _is_empty(t[10]) else _to_text(t[10]) for t in tweets],
+            "retweeted_status_id": [_to_int(t[11]) for t in tweets],
+            "retweet_count": [int(t[12]) for t in tweets],
+            "favorite_count": [int(t[13]) for t in tweets],
+            "lang": [t[14] for t in tweets],
+            "withheld_copyright": [_to_bool(t[15]) for t in tweets],
+            "withheld_in_countries": [_to_list(t[16]) for t in tweets],
+            "urls": [_to_urls(t[17]) for t in tweets],
+            "videos": [int(t[18]) for t in tweets],
+            "photos": [int(t[19]) for t in tweets],
+            "gifs": [int(t[20]) for t in tweets],
+            "source": [t[21] for t in tweets],
+            "fetch_date": [_to_datetime(t[22]) for t in tweets]
+        }
+
+    @staticmethod
+    def __to_tweets__(table):
+        columns = table.to_pydict()
+        # not read columns are None
+        empty_column = [None] * table.num_rows
+        columns = {name: columns.get(name, empty_column) for name in TWEET_SCHEMA.names}
+        tweets = []
+
+        for i in range(table.num_rows):
+            def value(name):
+                return columns[name][i]
+
+            coordinates = value("coordinates")
+            country_code = value("country_code")
+
+            quoted_status_text = value("quoted_status_text")
+            retweeted_status_id = value("retweeted_status_id")
+
+            tweets.append(TweetRecord(
+                id=value("id"),
+                user_id=value("user_id"),
+                # the timestamp is already typed, so no string conversion is needed
+                created_at=value("created_at"),
+                text=value("text"),
+                coordinates=None if coordinates is None else {"coordinates": coordinates},
+                place=None if country_code is None else PlaceRecord(country_code, value("place_name")),
+                in_reply_to_status_id=value("in_reply_to_status_id"),
+                in_reply_to_user_id=value("in_reply_to_user_id"),
+                quoted_status_id=value("quoted_status_id"),
+                quoted_status=None if quoted_status_text is None else EmbeddedTweetRecord(text=quoted_status_text),
+                retweeted_status=None if retweeted_status_id is None else EmbeddedTweetRecord(id=retweeted_status_id),
+                retweet_count=value("retweet_count"),
+                favorite_count=value("favorite_count"),
+                lang=value("lang"),
+                withheld_copyright=bool(value("withheld_copyright")),
+                withheld_in_countries=value("withheld_in_countries"),
+                entities={
+                    "urls": value("urls") or []
+                },
+                videos=value("videos"),
+                photos=value("photos"),
+                gifs=value("gifs"),
+                source=value("source"),
+                fetch_date=value("fetch_date")
+            ))
+
+        return tweets
+
+    def get_tweets_for_user(self, user_id):
+        tweets = self.__to_tweets__(self.__read__(self.__user_filter__(int(user_id))))
+        tweets.sort(key=lambda t: t.id, reverse=True)
+        return tweets
+
+    def get_tweets_grouped_by_user(self, user_id_range=None):
+        """
+        Iterate once over all tweets partition by partition
+
+        :param user_id_range: optional (start_id, end_id) tuple to only iterate over the tweets of the users with
+                              start_id <= user id < end_id, the tweets of the range are read at once
+
+        :return: generator of (user_id, tweets) tuples, the users are only sorted inside each partition and the
+                 tweets of each user are sorted from newest to oldest
+        """
+        if user_id_range is not None:
+            yield from self.__iter_groups__(self.__read__(self.__range_filter__(*user_id_range)))
+            return
+
+        for bucket in range(N_USER_BUCKETS):
+            yield from self.__iter_groups__(self.__read__(ds.field(USER_BUCKET_COLUMN) == bucket))
+
+    def __iter_groups__(self, table):
+        if table.num_rows == 0:
+            return
+
+        table = table.sort_by([("user_id", "ascending"), ("id", "descending")])
+        user_ids = table.column("user_id").to_pylist()
+
+        start = 0
+        for end in range(1, len(user_ids) + 1):
+            if end == len(user_ids) or user_ids[end] != user_ids[start]:
+                yield user_ids[start], self.__to_tweets__(table.slice(start, end - start))
+                start = end
+
+
+class ParquetUserDB(ParquetDB, UserDB):
+    """
+    User dataset stored as typed parquet columns
+
+    :param path: directory of the parquet dataset
+    :param columns: list of the columns to read. Not read columns are None.
+    """
+
+    user_id_column = "id"
+
+    def __init__(self, path, columns=None):
+        super().__init__(path, columns)
+        self.schema = USER_SCHEMA
+
+    def __to_columns__(self, users):
+        return {
+            "id": [int(u[0]) for u in users],
+            "name": [_to_text(u[1]) for u in users],
+            "screen_name": [u[2] for u in users],
+            "location": [u[3] for u in users],
+            "url": [None if _is_empty(u[4]) else u[4] for u in users],
+            "expanded_url": [None if _is_empty(u[5]) else u[5] for u in users],
+            "description": [_to_text(u[6]) for u in users],
+            "protected": [_to_bool(u[7]) for u in users],
+            "verified": [_to_bool(u[8]) for u in users],
+            "followers_count": [int(u[9]) for u in users],
+            "friends_count": [int(u[10]) for u in users],
+            "listed_count": [int(u[11]) for u in users],
+            "favourites_count": [int(u[12]) for u in users],
+            "statuses_count": [int(u[13]) for u in users],
+            "created_at": [_to_datetime(u[14]) for u in users],
+            "profile_image_url_https": [u[15] for u in users],
+            "default_profile": [_to_bool(u[16]) for u in users],
+            "default_profile_image": [_to_bool(u[17]) for u in users],
+            "withheld_in_countries": [_to_list(u[18]) for u in users],
+            "fetch_date": [_to_datetime(u[19]) for u in users]
+        }
+
+    @staticmethod
+    def __to_users__(table):
+        rows = table.to_pylist()
+        users = []
+
+        for row in rows:
+            users.append(UserRecord(**{name: row.get(name) for name in USER_RECORD_FIELDS}))
+
+        return users
+
+    def get_user(self, user_id):
+        users = self.__to_users__(self.__read__(self.__user_filter__(int(user_id))))
+        return users[0] if users else None
+
+    def get_all_user(self):
+        return self.__to_users__(self.__read__())
+
+    def get_user_ids(self):
+        table = self.__dataset__().to_table(columns=["id"])
+        return sorted(table.column("id").to_pylist())
+
+    def get_users_in_range(self, start_id, end_id):
+        users = self.__to_users__(self.__read__(self.__range_filter__(start_id, end_id)))
+        users.sort(key=lambda u: u.id)
+        return users
+
+
+def convert_db(src_db, dst_db, batch_size=100000):
+    """
+    Copy all rows of a sqlite or csv database into a parquet database
+
+    :param src_db: SqliteTweetDB, SqliteUserDB, CsvTweetDB or CsvUserDB
+    :param dst_db: ParquetTweetDB or ParquetUserDB
+    :param batch_size: number of rows written at once
+
+    :return: number of copied rows
+    """
+    n = 0
+    batch = []
+    for row in src_db.iter_rows():
+        batch.append(row)
+        if len(batch) >= batch_size:
+            dst_db.add_many(batch)
+            n += len(batch)
+            batch = []
+
+    dst_db.add_many(batch)
+    n += len(batch)
+
+    return n
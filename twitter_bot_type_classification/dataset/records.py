@@ -0,0 +1,184 @@
+TWEET_RECORD_FIELDS = (
+    "id",
+    "user_id",
+    "created_at",
+    "text",
+    "coordinates",
+    "place",
+    "in_reply_to_status_id",
+    "in_reply_to_user_id",
+    "quoted_status_id",
+    "quoted_status",
+    "retweeted_status",
+    "retweet_count",
+    "favorite_count",
+    "lang",
+    "withheld_copyright",
+    "withheld_in_countries",
+    "entities",
+    "videos",
+    "photos",
+    "gifs",
+    "source",
+    "fetch_date"
+)
+
+USER_RECORD_FIELDS = (
+    "id",
+    "name",
+    "screen_name",
+    "location",
+    "url",
+    "expanded_url",
+    "description",
+    "protected",
+    "verified",
+    "followers_count",
+    "friends_count",
+    "listed_count",
+    "favourites_count",
+    "statuses_count",
+    "created_at",
+    "profile_image_url_https",
+    "default_profile",
+    "default_profile_image",
+    "withheld_in_countries",
+    "fetch_date"
+)
+
+
+class PlaceRecord:
+    """
+    Place of a tweet read from the dataset
+    """
+
+    __slots__ = ("country_code", "name")
+
+    def __init__(self, country_code, name):
+        self.country_code = country_code
+        self.name = name
+
+    def __repr__(self):
+        return "PlaceRecord(country_code={!r}, name={!r})".format(self.country_code, self.name)
+
+
+class EmbeddedTweetRecord:
+    """
+    Quoted or retweeted tweet of a tweet read from the dataset. The dataset only contains the text of quoted tweets
+    and the id of retweeted tweets, the missing attribute is not set.
+    """
+
+    __slots__ = ("id", "text")
+
+    def __init__(self, id=None, text=None):
+        if id is not None:
+            self.id = id
+        if text is not None:
+            self.text = text
+
+    def __repr__(self):
+        return "EmbeddedTweetRecord(id={!r}, text={!r})".format(getattr(self, "id", None),
+                                                                getattr(self, "text", None))
+
+
+class TweetRecord:
+    """
+    Tweet read from the dataset with the same attribute names as the tweepy Status object.
+    Like the tweepy object, the attributes quoted_status and retweeted_status are only set if the tweet contains a
+    quote or is a retweet.
+    """
+
+    __slots__ = TWEET_RECORD_FIELDS
+
+    def __init__(self, id, user_id, created_at, text, coordinates=None, place=None, in_reply_to_status_id=None,
+                 in_reply_to_user_id=None, quoted_status_id=None, quoted_status=None, retweeted_status=None,
+                 retweet_count=0, favorite_count=0, lang=None, withheld_copyright=False, withheld_in_countries=None,
+                 entities=None, videos=0, photos=0, gifs=0, source=None, fetch_date=None):
+        """
+        :param id: id of the tweet
+        :param user_id: id of the author
+        :param created_at: datetime object of the creation date
+        :param text: text of the tweet
+        :param coordinates: dict with the coordinates list under the key "coordinates" or None
+        :param place: PlaceRecord object or None
+        :param in_reply_to_status_id: id of the replied tweet or None
+        :param in_reply_to_user_id: id of the replied user or None
+        :param quoted_status_id: id of the quoted tweet or None
+        :param quoted_status: EmbeddedTweetRecord object of the quoted tweet or None
+        :param retweeted_status: EmbeddedTweetRecord object of the retweeted tweet or None
+        :param retweet_count: number of retweets
+        :param favorite_count: number of likes
+        :param lang: language code of the tweet
+        :param withheld_copyright: whether the tweet is withheld because of copyright
+        :param withheld_in_countries: list of country codes the tweet is withheld in or None
+        :param entities: dict with the url entities under the key "urls"
+        :param videos: number of videos included in the tweet
+        :param photos: number of photos included in the tweet
+        :param gifs: number of gifs included in the tweet
+        :param source: name of the client used to create the tweet
+        :param fetch_date: datetime object of the date when the tweet was fetched
+        """
+
+        self.id = id
+        self.user_id = user_id
+        self.created_at = created_at
+        self.text = text
+        self.coordinates = coordinates
+        self.place = place
+        self.in_reply_to_status_id = in_reply_to_status_id
+        self.in_reply_to_user_id = in_reply_to_user_id
+        self.quoted_status_id = quoted_status_id
+        if quoted_status is not None:
+            self.quoted_status = quoted_status
+        if retweeted_status is not None:
+            self.retweeted_status = retweeted_status
+        self.retweet_count = retweet_count
+        self.favorite_count = favorite_count
+        self.lang = lang
+        self.withheld_copyright = withheld_copyright
+        self.withheld_in_countries = withheld_in_countries
+        self.entities = {"urls": []} if entities is None else entities
+        self.videos = videos
+        self.photos = photos
+        self.gifs = gifs
+        self.source = source
+        self.fetch_date = fetch_date
+
+    def __repr__(self):
+        return "TweetRecord(id={!r}, user_id={!r})".format(self.id, self.user_id)
+
+
+class UserRecord:
+    """
+    User read from the dataset with the same attribute names as the tweepy User object
+    """
+
+    __slots__ = USER_RECORD_FIELDS
+
+    def __init__(self, id, name, screen_name, location, url, expanded_url, description, protected, verified,
+                 followers_count, friends_count, listed_count, favourites_count, statuses_count, created_at,
+                 profile_image_url_https, default_profile, default_profile_image, withheld_in_countries,
+                 fetch_date):
+        self.id = id
+        self.name = name
+        self.screen_name = screen_name
+        self.location = location
+        self.url = url
+        self.expanded_url = expanded_url
+        self.description = description
+        self.protected = protected
+        self.verified = verified
+        self.followers_count = followers_count
+        self.friends_count = friends_count
+        self.listed_count = listed_count
+        self.favourites_count = favourites_count
+        self.statuses_count = statuses_count
+        self.created_at = created_at
+        self.profile_image_url_https = profile_image_url_https
+        self.default_profile = default_profile
+        self.default_profile_image = default_profile_image
+        self.withheld_in_countries = withheld_in_countries
+        self.fetch_date = fetch_date
+
+    def __repr__(self):
+        return "UserRecord(id={!r}, screen_name={!r})".format(self.id, self.screen_name)
@@ -0,0 +1,226 @@
+import sqlite3
+
+# seconds to wait for a lock held by another connection, for example a running fetch job
+BUSY_TIMEOUT = 60.0
+
+# pragmas set on each new connection:
+# - WAL lets readers work concurrently with one writer without "database is locked" errors
+# - NORMAL synchronous is durable in WAL mode except for the last transactions on power loss
+# - negative cache size is in KiB (64 MiB), mmap size is in bytes (256 MiB)
+CONNECTION_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -65536),
+    ("mmap_size", 268435456),
+    ("temp_store", "MEMORY")
+]
+
+# Each migration is a list of sql statements. The index of a migration + 1 is the schema version after the migration
+# was applied. The schema version is stored in the user_version pragma of the database. New migrations have to be
+# appended, already released migrations must not be changed.
+TWEET_MIGRATIONS = [
+    # 1: tweet table
+    [
+        """CREATE TABLE IF NOT EXISTS tweet (
+            "id" INTEGER PRIMARY KEY,
+            "user_id" INTEGER,
+            "created_at" TEXT,
+            "text" TEXT,
+            "coordinates" TEXT,
+            "country_code" TEXT,
+            "place_name" TEXT,
+            "in_reply_to_status_id" INTEGER,
+            "in_reply_to_user_id" INTEGER,
+            "quoted_status_id" INTEGER,
+            "quoted_status_text" TEXT,
+            "retweeted_status_id" INTEGER,
+            "retweet_count" INTEGER,
+            "favorite_count" INTEGER,
+            "lang" TEXT,
+            "withheld_copyright" INTEGER,
+            "withheld_in_countries" TEXT,
+            "urls" INTEGER,
+            "videos" INTEGER,
+            "photos" INTEGER,
+            "gifs" INTEGER,
+            "source" TEXT,
+            "fetch_date" TEXT
+        )"""
+    ],
+    # 2: secondary indexes for the per user lookups and time range queries
+    [
+        "CREATE INDEX IF NOT EXISTS tweet_user_id_idx ON tweet (user_id)",
+        "CREATE INDEX IF NOT EXISTS tweet_created_at_idx ON tweet (created_at)"
+    ],
+    # 3: snapshots of the volatile columns of each fetch, only written if the history is enabled
+    [
+        """CREATE TABLE IF NOT EXISTS tweet_history (
+            "id" INTEGER,
+            "retweet_count" INTEGER,
+            "favorite_count" INTEGER,
+            "fetch_date" TEXT,
+            PRIMARY KEY ("id", "fetch_date")
+        ) WITHOUT ROWID"""
+    ]
+]
+
+USER_MIGRATIONS = [
+    # 1: user table
+    [
+        """CREATE TABLE IF NOT EXISTS user (
+            "id" INTEGER PRIMARY KEY,
+            "name" TEXT,
+            "screen_name" TEXT,
+            "location" TEXT,
+            "url" TEXT,
+            "expanded_url" TEXT,
+            "description" TEXT,
+            "protected" INTEGER,
+            "verified" INTEGER,
+            "followers_count" INTEGER,
+            "friends_count" INTEGER,
+            "listed_count" INTEGER,
+            "favourites_count" INTEGER,
+            "statuses_count" INTEGER,
+            "created_at" TEXT,
+            "profile_image_url_https" TEXT,
+            "default_profile" INTEGER,
+            "default_profile_image" INTEGER,
+            "withheld_in_countries" TEXT,
+            "fetch_date" TEXT
+        )"""
+    ],
+    # 2: secondary index for the username lookups
+    [
+        "CREATE INDEX IF NOT EXISTS user_screen_name_idx ON user (screen_name)"
+    ],
+    # 3: snapshots of the volatile columns of each fetch, only written if the history is enabled
+    [
+        """CREATE TABLE IF NOT EXISTS user_history (
+            "id" INTEGER,
+            "followers_count" INTEGER,
+            "friends_count" INTEGER,
+            "listed_count" INTEGER,
+            "favourites_count" INTEGER,
+            "statuses_count" INTEGER,
+            "fetch_date" TEXT,
+            PRIMARY KEY ("id", "fetch_date")
+        ) WITHOUT ROWID"""
+    ]
+]
+
+
+TWEET_FEATURE_STORE_MIGRATIONS = [
+    # 1: stored tweet features and the version of the feature calculation which created them
+    [
+        """CREATE TABLE IF NOT EXISTS tweet_features (
+            "id" INTEGER PRIMARY KEY,
+            "user_key" TEXT,
+            "features" BLOB
+        )""",
+        """CREATE TABLE IF NOT EXISTS feature_store_info (
+            "key" TEXT PRIMARY KEY,
+            "value" TEXT
+        )"""
+    ]
+]
+
+JOB_QUEUE_MIGRATIONS = [
+    # 1: fetch jobs of a dataset generation, the payload is a json object with the users and the fetch position
+    [
+        """CREATE TABLE IF NOT EXISTS job (
+            "id" INTEGER PRIMARY KEY,
+            "state" INTEGER,
+            "retries" INTEGER,
+            "payload" TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS job_state_idx ON job (state)"
+    ]
+]
+
+URL_CACHE_MIGRATIONS = [
+    # 1: resolved urls, the status is null if the url could not be resolved
+    [
+        """CREATE TABLE IF NOT EXISTS url_cache (
+            "url" TEXT PRIMARY KEY,
+            "final_url" TEXT,
+            "status" INTEGER,
+            "resolved_at" REAL
+        )"""
+    ]
+]
+
+
+def connect(filename, timeout=BUSY_TIMEOUT, check_same_thread=True):
+    """
+    Open a sqlite connection and configure it with the CONNECTION_PRAGMAS
+
+    :param filename: path of the sqlite database
+    :param timeout: seconds to wait for a lock of another connection
+    :param check_same_thread: only allow the thread which opened the connection to use it, the other threads have to
+                              synchronize the access themselves otherwise
+
+    :return: sqlite3 connection
+    """
+    conn = sqlite3.connect(filename, timeout=timeout, check_same_thread=check_same_thread)
+
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute("PRAGMA {} = {}".format(name, value))
+
+    return conn
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_exists(conn, table):
+    return conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def migrate(conn, migrations):
+    """
+    Apply all migrations which are newer than the current schema version of the database
+
+    :param conn: sqlite3 connection
+    :param migrations: list of migrations, each migration is a list of sql statements
+
+    :return: schema version before the migration
+    """
+    version = get_schema_version(conn)
+
+    if version > len(migrations):
+        raise RuntimeError("The database schema version {} is newer than the supported version {}".format(
+            version, len(migrations)))
+
+    for new_version, statements in enumerate(migrations[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("PRAGMA user_version = {}".format(new_version))
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    return version
+
+
+def optimize(conn, vacuum=True):
+    """
+    Update the query planner statistics and rebuild the database file. Should only be used when no other process
+    is writing to the database, because VACUUM needs an exclusive lock.
+
+    :param conn: sqlite3 connection
+    :param vacuum: rebuild the database file to remove free pages and defragment the tables and indexes
+    """
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    if vacuum:
+        conn.execute("VACUUM")
+
+    # move the content of the write ahead log into the database file
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
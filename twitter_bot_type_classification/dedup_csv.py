@@ -0,0 +1,54 @@
+import argparse
+import os
+import textwrap
+
+from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, deduplicate_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove the duplicated tweets and users of csv files which were "
+                                                 "appended by several fetch runs. Only the last fetched row of each "
+                                                 "id is kept.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=textwrap.dedent("""\
+                                     License:
+                                        MIT - Copyright (c) 2020 Marvin Heptner
+                                     """))
+
+    parser.add_argument("-u", "--users", help="Input csv file of user data")
+    parser.add_argument("-t", "--tweets", help="Input csv file of tweet data")
+    parser.add_argument("--users-out", help="Output csv file of the deduplicated user data")
+    parser.add_argument("--tweets-out", help="Output csv file of the deduplicated tweet data")
+    parser.add_argument("-b", "--batch-size", type=int, help="Number of rows written at once. Default value is 100000",
+                        default=100000)
+    parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the csv input file",
+                        default=False)
+
+    args = parser.parse_args()
+
+    if not args.users and not args.tweets:
+        parser.error("ERROR: No user or tweets file provided.")
+
+    if (args.users is None) != (args.users_out is None) or (args.tweets is None) != (args.tweets_out is None):
+        parser.error("ERROR: Each input file needs an output file.")
+
+    for output in [args.users_out, args.tweets_out]:
+        if output is not None and os.path.exists(output):
+            parser.error("ERROR: The output file {} already exists.".format(output))
+
+    if args.batch_size < 1:
+        parser.error("ERROR: The batch size has to be greater or equal 1.")
+
+    if args.users is not None:
+        n_read, n_written = deduplicate_csv(CsvUserDB(args.users, skip_header=args.skip_header),
+                                            CsvUserDB(args.users_out), batch_size=args.batch_size)
+        print("Removed {} duplicated users, {} users saved".format(n_read - n_written, n_written))
+
+    if args.tweets is not None:
+        n_read, n_written = deduplicate_csv(CsvTweetDB(args.tweets, skip_header=args.skip_header),
+                                            CsvTweetDB(args.tweets_out), batch_size=args.batch_size)
+        print("Removed {} duplicated tweets, {} tweets saved".format(n_read - n_written, n_written))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,283 @@
 import os
-from multiprocessing import Queue, Process, Lock
+from multiprocessing import Queue, Process, Lock, resource_tracker, get_start_method
+from multiprocessing.shared_memory import SharedMemory
 
 import numpy as np
 
-from twitter_bot_type_classification.features.user import UserFeatures
+from twitter_bot_type_classification.features.output import FeatureShardWriter, FeatureShardReader, read_manifest
+from twitter_bot_type_classification.features.store import TweetFeatureStore
+from twitter_bot_type_classification.features.tokenizer import get_tokenizer
+from twitter_bot_type_classification.features.user import UserFeatures, USER_FEATURES_INDEX
+from twitter_bot_type_classification.features.utils import get_emoji_matcher, get_html_escape_table, \
+    get_coordinate_group_classifier
+
+N_USER_FEATURES = len(USER_FEATURES_INDEX)
+
+
+class SharedFeatureBlock:
+    """
+    User features of many users passed from a worker to the save worker through shared memory. Only the name of the
+    shared memory block and the number of users are pickled.
+
+    The block contains the int64 user ids followed by the float32 user features.
+    """
+
+    def __init__(self, name, n):
+        self.name = name
+        self.n = n
+
+    @classmethod
+    def create(cls, user_ids, features):
+        """
+        Copy the user ids and features into a new shared memory block
+
+        :param user_ids: list of user ids
+        :param features: list of user feature vectors in the order of the user ids
+
+        :return: SharedFeatureBlock object, the block has to be released with read
+        """
+        n = len(user_ids)
+        ids_size = n * np.dtype(np.int64).itemsize
+
+        # a shared memory block can't be empty
+        shm = SharedMemory(create=True, size=max(1, ids_size + n * N_USER_FEATURES * np.dtype(np.float32).itemsize))
+        try:
+            if n > 0:
+                np.ndarray((n,), dtype=np.int64, buffer=shm.buf)[:] = user_ids
+                np.ndarray((n, N_USER_FEATURES), dtype=np.float32, buffer=shm.buf, offset=ids_size)[:] = features
+        finally:
+            shm.close()
+
+        return cls(shm.name, n)
+
+    def read(self):
+        """
+        Copy the user ids and features out of the shared memory block and release the block
+
+        :return: tuple of numpy user ids and numpy features with shape (n, N_USER_FEATURES)
+        """
+        shm = SharedMemory(name=self.name)
+        try:
+            ids_size = self.n * np.dtype(np.int64).itemsize
+            user_ids = np.ndarray((self.n,), dtype=np.int64, buffer=shm.buf).copy()
+            features = np.ndarray((self.n, N_USER_FEATURES), dtype=np.float32, buffer=shm.buf,
+                                  offset=ids_size).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return user_ids, features
 
 
 class CalcWorker(Process):
-    def __init__(self, task_q, results_q):
+    def __init__(self, task_q, results_q, feature_store=None):
         self.task_q = task_q
         self.results_q = results_q
+        self.feature_store = feature_store
         super(CalcWorker, self).__init__()
 
     def run(self):
+        # the sqlite connection can't be shared between processes, so each worker opens its own
+        feature_store = None if self.feature_store is None else TweetFeatureStore(self.feature_store)
+
         while True:
             feature_data = self.task_q.get()
             if feature_data is None:
+                if feature_store is not None:
+                    feature_store.close()
                 self.results_q.put(None)
                 break
 
             user, tweets = feature_data
-            features = UserFeatures(user, tweets)
+            features = UserFeatures(user, tweets, feature_store)
 
             self.results_q.put((user.id, features))
 
 
+class RangeCalcWorker(Process):
+    """
+    Worker which reads the users and tweets of user id ranges itself and returns the features of each range as
+    SharedFeatureBlock
+
+    :param range_q: queue of (start_id, end_id) tuples, None stops the worker
+    :param results_q: queue for the SharedFeatureBlock results
+    :param user_db_factory: picklable callable which opens the UserDB in the worker, for example a functools.partial
+    :param tweet_db_factory: picklable callable which opens the TweetDB in the worker
+    :param feature_store: optional filename of the TweetFeatureStore
+    :param skip_user_ids: optional sorted numpy array of user ids which are skipped, for example already written users
+    """
+
+    def __init__(self, range_q, results_q, user_db_factory, tweet_db_factory, feature_store=None,
+                 skip_user_ids=None):
+        self.range_q = range_q
+        self.results_q = results_q
+        self.user_db_factory = user_db_factory
+        self.tweet_db_factory = tweet_db_factory
+        self.feature_store = feature_store
+        self.skip_user_ids = skip_user_ids
+        super(RangeCalcWorker, self).__init__()
+
+    def run(self):
+        user_db = self.user_db_factory()
+        tweet_db = self.tweet_db_factory()
+        feature_store = None if self.feature_store is None else TweetFeatureStore(self.feature_store)
+
+        while True:
+            user_id_range = self.range_q.get()
+            if user_id_range is None:
+                if feature_store is not None:
+                    feature_store.close()
+                self.results_q.put(None)
+                break
+
+            user_ids = []
+            features = []
+            for u, tweets in iter_users_with_tweets(user_db, tweet_db, user_id_range):
+                if self.skip_user_ids is not None and contains_sorted(self.skip_user_ids, u.id):
+                    continue
+
+                tweets.sort(key=lambda t: t.id, reverse=True)
+
+                user_ids.append(u.id)
+                features.append(UserFeatures(u, tweets, feature_store))
+
+            self.results_q.put(SharedFeatureBlock.create(user_ids, features))
+
+
+def contains_sorted(values, value):
+    i = np.searchsorted(values, value)
+    return i < len(values) and values[i] == value
+
+
+def split_user_id_ranges(user_ids, range_size):
+    """
+    Split sorted user ids into ranges with range_size users
+
+    :param user_ids: list of user ids in ascending order
+    :param range_size: number of users of each range
+
+    :return: list of (start_id, end_id) tuples, the end id is not included in the range
+    """
+    return [(user_ids[i], user_ids[min(i + range_size, len(user_ids)) - 1] + 1)
+            for i in range(0, len(user_ids), range_size)]
+
+
 class SaveWorker(Process):
-    def __init__(self, results_q, filename, fetch_worker_count, std_out_lock):
+    def __init__(self, results_q, filename, fetch_worker_count, std_out_lock, shard_size=None, resume=False):
         self.results_q = results_q
         self.filename = filename
         self.fetch_worker_count = fetch_worker_count
         self.std_out_lock = std_out_lock
+        self.shard_size = shard_size
+        self.resume = resume
         super(SaveWorker, self).__init__()
 
     def run(self):
-        features = []
-        user_ids = []
+        if self.shard_size is None:
+            output = NpzOutput()
+        else:
+            # the features are written every shard_size users instead of keeping all of them in memory
+            output = FeatureShardWriter(self.filename, N_USER_FEATURES, self.shard_size, resume=self.resume)
+
         while True:
             res = self.results_q.get()
             if res is None:
                 self.fetch_worker_count -= 1
                 if self.fetch_worker_count == 0:
-                    np.savez_compressed(self.filename, features=np.asarray(features), ids=np.asarray(user_ids))
+                    if self.shard_size is None:
+                        output.save(self.filename)
+                        message = "\nSuccessfully saved features as npz file"
+                    else:
+                        output.close()
+                        message = "\nSuccessfully saved features as shards"
 
                     self.std_out_lock.acquire()
-                    print("\nSuccessfully saved features as npz file")
+                    print(message)
                     self.std_out_lock.release()
 
                     break
+            elif isinstance(res, SharedFeatureBlock):
+                output.extend(*res.read())
             else:
-                user_ids.append(res[0])
-                features.append(res[1])
+                output.append(res[0], res[1])
+
+
+class NpzOutput:
+    """
+    Collect all features in memory and save them as one npz file
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self.features = []
+
+    def append(self, user_id, features):
+        self.user_ids.append(user_id)
+        self.features.append(features)
+
+    def extend(self, user_ids, features):
+        self.user_ids.extend(user_ids)
+        self.features.extend(features)
+
+    def save(self, filename):
+        np.savez_compressed(filename, features=np.asarray(self.features), ids=np.asarray(self.user_ids))
+
+
+def preload_feature_data():
+    """
+    Load the tokenizer models and the tables, which are otherwise loaded on first use, before the workers are
+    started. Forked workers share them with this process instead of loading them each, spawned workers load them on
+    first use. A missing punkt model raises an error before any worker is started.
+    """
+    get_tokenizer().load()
+
+    if get_start_method() != "fork":
+        return
+
+    get_emoji_matcher()
+    get_html_escape_table()
+    get_coordinate_group_classifier()
+
+
+def iter_users_with_tweets(user_db, tweet_db, user_id_range=None):
+    """
+    Join the users with their tweets
+
+    If the tweet db supports a grouped iteration over all tweets, the tweet db is only read once sequentially,
+    otherwise the tweets are queried for each user.
+
+    :param user_db: UserDB object
+    :param tweet_db: TweetDB object or None
+    :param user_id_range: optional (start_id, end_id) tuple to only join the users with start_id <= id < end_id
+
+    :return: generator of (user, tweets) tuples
+    """
+
+    if user_id_range is None:
+        users = {u.id: u for u in user_db.get_all_user()}
+    else:
+        users = {u.id: u for u in user_db.get_users_in_range(*user_id_range)}
+
+    if tweet_db is None:
+        for u in users.values():
+            yield u, []
+        return
+
+    try:
+        tweet_groups = tweet_db.get_tweets_grouped_by_user(user_id_range)
+    except NotImplementedError:
+        for u in users.values():
+            yield u, tweet_db.get_tweets_for_user(u.id)
+        return
+
+    # the groups can be in any order, tweets of users which are not in the user db are skipped
+    for user_id, tweets in tweet_groups:
+        u = users.pop(user_id, None)
+        if u is not None:
+            yield u, tweets
+
+    for u in users.values():
+        yield u, []
 
 
 class FeatureCalculator:
@@ -65,33 +292,122 @@ class FeatureCalculator:
         self.results_q_size = results_q_size
         self.std_out_lock = Lock()
 
-    def calc_features(self, user_db, tweet_db, filename, limit=500, n_worker=os.cpu_count()):
+    def calc_features(self, user_db, tweet_db, filename, limit=500, n_worker=os.cpu_count(), feature_store=None,
+                      shard_size=None, resume=False):
         assert user_db is not None and tweet_db is not None
         assert filename is not None
         assert limit > -2
         assert n_worker is not None and n_worker > 0
+        assert not resume or shard_size is not None
+
+        preload_feature_data()
+
+        written_user_ids = set(self.__get_written_user_ids__(filename, resume).tolist())
+
+        if feature_store is not None:
+            # create the store and apply a feature version change once before the workers open it
+            TweetFeatureStore(feature_store).close()
 
         tasks_q = Queue(self.tasks_q_size)
         results_q = Queue(self.results_q_size)
         workers = []
 
         for _ in range(n_worker):
-            worker = CalcWorker(tasks_q, results_q)
+            worker = CalcWorker(tasks_q, results_q, feature_store)
             workers.append(worker)
             worker.start()
 
-        for u in user_db.get_all_user():
-            tweets = []
-            if tweet_db is not None:
-                tweets = tweet_db.get_tweets_for_user(u.id)
-                tweets.sort(key=lambda t: t.id, reverse=True)
+        # the save worker runs during the calculation to write the shards as soon as they are complete
+        self.save_worker = SaveWorker(results_q, filename, len(workers), self.std_out_lock, shard_size, resume)
+        self.save_worker.start()
+
+        for u, tweets in iter_users_with_tweets(user_db, tweet_db):
+            if u.id in written_user_ids:
+                continue
+
+            tweets.sort(key=lambda t: t.id, reverse=True)
 
             tasks_q.put((u, tweets))
 
         for _ in range(len(workers)):
             tasks_q.put(None)
 
-        self.save_worker = SaveWorker(results_q, filename, len(workers), self.std_out_lock)
+        self.save_worker.join()
+
+    def __get_written_user_ids__(self, filename, resume):
+        """
+        :return: sorted numpy array of the user ids of the committed shards if the run is resumed, otherwise an
+                 empty array
+        """
+        if not resume or read_manifest(filename) is None:
+            return np.empty(0, dtype=np.int64)
+
+        written_user_ids = np.unique(FeatureShardReader(filename).get_user_ids())
+
+        self.std_out_lock.acquire()
+        print("Resume run, {} already written users are skipped".format(len(written_user_ids)))
+        self.std_out_lock.release()
+
+        return written_user_ids
+
+    def calc_features_by_range(self, user_db_factory, tweet_db_factory, filename, n_worker=os.cpu_count(),
+                               range_size=1000, feature_store=None, shard_size=None, resume=False):
+        """
+        Calculate the user features with workers which read their user id ranges from the database themselves and
+        return the features through shared memory. The databases have to support get_user_ids, get_users_in_range
+        and the grouped tweet iteration of a user id range.
+
+        :param user_db_factory: picklable callable which opens the UserDB, for example a functools.partial
+        :param tweet_db_factory: picklable callable which opens the TweetDB
+        :param filename: output npz file or output directory of the shards
+        :param n_worker: number of worker processes
+        :param range_size: number of users of each range
+        :param feature_store: optional filename of the TweetFeatureStore
+        :param shard_size: write the features every shard_size users as shard into the filename directory instead
+                           of one npz file
+        :param resume: skip the users of the already committed shards of the filename directory and append the
+                       new shards, requires shard_size
+        """
+        assert user_db_factory is not None and tweet_db_factory is not None
+        assert filename is not None
+        assert n_worker is not None and n_worker > 0
+        assert range_size > 0
+        assert not resume or shard_size is not None
+
+        preload_feature_data()
+
+        written_user_ids = self.__get_written_user_ids__(filename, resume)
+
+        if feature_store is not None:
+            # create the store and apply a feature version change once before the workers open it
+            TweetFeatureStore(feature_store).close()
+
+        user_ids = user_db_factory().get_user_ids()
+        if len(written_user_ids) > 0:
+            user_ids = np.setdiff1d(user_ids, written_user_ids).tolist()
+
+        range_q = Queue()
+        for user_id_range in split_user_id_ranges(user_ids, range_size):
+            range_q.put(user_id_range)
+
+        # the workers have to share the resource tracker of this process, otherwise the tracker of a worker would
+        # remove the shared memory blocks not yet read by the save worker when the worker exits
+        resource_tracker.ensure_running()
+
+        results_q = Queue(self.results_q_size)
+        workers = []
+
+        for _ in range(n_worker):
+            # already written users between the not written users of a range are skipped by the worker
+            worker = RangeCalcWorker(range_q, results_q, user_db_factory, tweet_db_factory, feature_store,
+                                     written_user_ids if len(written_user_ids) > 0 else None)
+            workers.append(worker)
+            worker.start()
+
+        for _ in range(len(workers)):
+            range_q.put(None)
+
+        self.save_worker = SaveWorker(results_q, filename, len(workers), self.std_out_lock, shard_size, resume)
         self.save_worker.start()
 
         self.save_worker.join()
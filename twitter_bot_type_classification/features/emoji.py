@@ -0,0 +1,209 @@
+import csv
+import importlib.resources
+import os
+import pickle
+import re
+
+from twitter_bot_type_classification import data
+
+# Has to be increased on each change of the trie format, an outdated serialized matcher is rebuilt
+EMOJI_MATCHER_VERSION = 2
+
+EMOJI_MATCHER_FILENAME = "emoji-matcher.pickle"
+
+# key of the trie nodes which marks the end of an emoji sequence, can't be a character of the text
+_END = ""
+
+
+def read_emoji_sequences():
+    """
+    Read the emoji sequences of the emoji-test.txt file
+
+    :return: list of the emoji strings
+    """
+    sequences = []
+
+    with importlib.resources.open_text(data, "emoji-test.txt") as f:
+        reader = csv.reader(f, delimiter=";")
+
+        for r in reader:
+            if len(r) == 0 or "#" in r[0]:
+                continue
+            sequences.append("".join(chr(int(e, 16)) for e in r[0].strip().split(" ")))
+
+    return sequences
+
+
+def _char_ranges(chars):
+    """
+    Build the content of a regex character class with ranges of consecutive characters. The regex engine checks the
+    characters outside of the basic multilingual plane one by one, so a class of ranges is much faster than a class of
+    single characters.
+
+    :param chars: iterable of characters
+
+    :return: character class string without the brackets
+    """
+    codepoints = sorted(ord(c) for c in chars)
+    ranges = []
+
+    for codepoint in codepoints:
+        if ranges and ranges[-1][1] + 1 == codepoint:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+
+    return "".join(re.escape(chr(start)) if start == end else "{}-{}".format(re.escape(chr(start)), re.escape(chr(end)))
+                   for start, end in ranges)
+
+
+class EmojiMatcher:
+    """
+    Emoji matcher based on a codepoint trie of all emoji sequences. At each position the longest emoji sequence is
+    matched, for example a waving hand with skin tone is one emoji and not a waving hand followed by a skin tone.
+
+    Only the positions found by a character class regex of all first characters of the sequences are checked with the
+    trie, so the text is mostly scanned by the regex engine.
+
+    :param sequences: list of emoji strings
+    :param trie: trie of another matcher, which is extended by the sequences
+    """
+
+    def __init__(self, sequences=(), trie=None):
+        self.trie = {} if trie is None else trie
+
+        for sequence in sequences:
+            node = self.trie
+            for c in sequence:
+                node = node.setdefault(c, {})
+            node[_END] = True
+
+        self.start_regex = re.compile("[{}]".format(_char_ranges(self.trie)))
+
+    def match_length(self, text, start):
+        """
+        :param text: text to search
+        :param start: position of the first character of the emoji
+
+        :return: length of the longest emoji sequence at the position, 0 if there is no emoji
+        """
+        node = self.trie
+        length = 0
+
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if _END in node:
+                length = i + 1 - start
+
+        return length
+
+    def iter_spans(self, text):
+        """
+        Find the emojis in the text from left to right
+
+        :param text: text to search
+
+        :return: generator of (start, end) tuples of the emojis in the text
+        """
+        search = self.start_regex.search
+        pos = 0
+
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return
+
+            start = m.start()
+            length = self.match_length(text, start)
+            if length > 0:
+                pos = start + length
+                yield start, pos
+            else:
+                pos = start + 1
+
+    def findall(self, text):
+        """
+        :param text: text to search
+
+        :return: list of the emojis in the text
+        """
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def count(self, text):
+        """
+        :param text: text to search
+
+        :return: number of emojis in the text
+        """
+        n = 0
+        for _ in self.iter_spans(text):
+            n += 1
+        return n
+
+    def strip(self, text):
+        """
+        Remove all emojis from the text
+
+        :param text: text to clean
+
+        :return: tuple of the text without emojis and the number of removed emojis
+        """
+        parts = []
+        n = 0
+        pos = 0
+
+        for start, end in self.iter_spans(text):
+            parts.append(text[pos:start])
+            pos = end
+            n += 1
+
+        if n == 0:
+            return text, 0
+
+        parts.append(text[pos:])
+        return "".join(parts), n
+
+
+def build_emoji_matcher(filename=None):
+    """
+    Build the emoji matcher from the emoji-test.txt file and serialize its trie. Only the dict of the trie is
+    serialized, so the file does not depend on the module the EmojiMatcher class was imported from.
+
+    :param filename: output file, default is the emoji-matcher.pickle file of the data package
+
+    :return: EmojiMatcher object
+    """
+    if filename is None:
+        filename = os.path.join(os.path.dirname(data.__file__), EMOJI_MATCHER_FILENAME)
+
+    matcher = EmojiMatcher(read_emoji_sequences())
+
+    with open(filename, "wb") as f:
+        pickle.dump({"version": EMOJI_MATCHER_VERSION, "trie": matcher.trie}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return matcher
+
+
+def load_emoji_matcher():
+    """
+    Load the serialized emoji matcher of the data package. If it is missing or outdated, the matcher is built from
+    the emoji-test.txt file.
+
+    :return: EmojiMatcher object
+    """
+    try:
+        with importlib.resources.open_binary(data, EMOJI_MATCHER_FILENAME) as f:
+            serialized = pickle.load(f)
+        if serialized.get("version") == EMOJI_MATCHER_VERSION:
+            return EmojiMatcher(trie=serialized["trie"])
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        pass
+
+    return EmojiMatcher(read_emoji_sequences())
+
+
+if __name__ == "__main__":
+    build_emoji_matcher()
+    print("Emoji matcher saved")
@@ -0,0 +1,73 @@
+import importlib.resources
+import os
+import pickle
+import xml.etree.ElementTree as ET
+
+from twitter_bot_type_classification import data
+
+# Has to be increased on each change of the table format, an outdated serialized table is rebuilt
+HTML_ESCAPE_TABLE_VERSION = 1
+
+HTML_ESCAPE_TABLE_FILENAME = "html-escape-table.pickle"
+
+
+def read_html_escape_table():
+    """
+    Read the html 5 entities of the html5ents.xml file,
+    source: https://www.w3.org/2003/entities/2007xml/html5ents.xml
+
+    :return: dict of the lowercase entity with leading & to the unicode string
+    """
+    with importlib.resources.open_binary(data, "html5ents.xml") as f:
+        root = ET.parse(f).getroot()
+
+    table = {}
+
+    for item in root[0][1]:
+        unicode = item[1].text.strip()
+        entity = "&" + item[0][0].text.lower()
+        table[entity] = unicode
+
+    return table
+
+
+def build_html_escape_table(filename=None):
+    """
+    Build the html escape table from the html5ents.xml file and serialize it
+
+    :param filename: output file, default is the html-escape-table.pickle file of the data package
+
+    :return: html escape table dict
+    """
+    if filename is None:
+        filename = os.path.join(os.path.dirname(data.__file__), HTML_ESCAPE_TABLE_FILENAME)
+
+    table = read_html_escape_table()
+
+    with open(filename, "wb") as f:
+        pickle.dump({"version": HTML_ESCAPE_TABLE_VERSION, "table": table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return table
+
+
+def load_html_escape_table():
+    """
+    Load the serialized html escape table of the data package. If it is missing or outdated, the table is read from
+    the html5ents.xml file.
+
+    :return: html escape table dict
+    """
+    try:
+        with importlib.resources.open_binary(data, HTML_ESCAPE_TABLE_FILENAME) as f:
+            serialized = pickle.load(f)
+        if serialized.get("version") == HTML_ESCAPE_TABLE_VERSION:
+            return serialized["table"]
+    except (FileNotFoundError, pickle.UnpicklingError, AttributeError, EOFError):
+        pass
+
+    return read_html_escape_table()
+
+
+if __name__ == "__main__":
+    build_html_escape_table()
+    print("Html escape table saved")
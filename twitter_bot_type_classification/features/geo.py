@@ -0,0 +1,194 @@
+import numpy as np
+
+# number of points tested at once, limits the size of the (points, edges) arrays of the ray casting
+POINT_CHUNK_SIZE = 4096
+
+# points closer to an edge than this distance are inside the polygon
+BOUNDARY_TOLERANCE = 1e-8
+
+# grid cell value of the cells which are touched by an edge, the points of these cells are tested with ray casting
+AMBIGUOUS_CELL = -2
+
+
+class Polygon:
+    """
+    Edges of a polygon as numpy arrays for the vectorized point in polygon test
+
+    :param vertices: list of (x, y) vertices, the polygon is closed between the last and the first vertex
+    """
+
+    def __init__(self, vertices):
+        vertices = np.asarray(vertices, dtype=np.float64)
+
+        self.x0 = vertices[:, 0]
+        self.y0 = vertices[:, 1]
+        self.x1 = np.roll(self.x0, -1)
+        self.y1 = np.roll(self.y0, -1)
+
+        self.dx = self.x1 - self.x0
+        self.dy = self.y1 - self.y0
+        # horizontal edges never cross a horizontal ray, their slope is not needed
+        self.slope = np.divide(self.dx, self.dy, out=np.zeros_like(self.dy), where=self.dy != 0)
+        self.edge_tolerance = BOUNDARY_TOLERANCE * np.hypot(self.dx, self.dy)
+
+        self.edge_min_x = np.minimum(self.x0, self.x1) - BOUNDARY_TOLERANCE
+        self.edge_max_x = np.maximum(self.x0, self.x1) + BOUNDARY_TOLERANCE
+        self.edge_min_y = np.minimum(self.y0, self.y1) - BOUNDARY_TOLERANCE
+        self.edge_max_y = np.maximum(self.y0, self.y1) + BOUNDARY_TOLERANCE
+
+    def __len__(self):
+        return len(self.x0)
+
+    def touched_cells(self, cell_size, n_x, n_y):
+        """
+        Find the cells of a longitude and latitude grid which are touched by an edge of the polygon
+
+        :param cell_size: size of the grid cells in degrees
+        :param n_x: number of cells in x direction
+        :param n_y: number of cells in y direction
+
+        :return: numpy bool array with shape (n_x, n_y)
+        """
+        touched = np.zeros((n_x, n_y), dtype=bool)
+
+        for i in range(len(self.x0)):
+            ix0, ix1 = np.clip(np.floor((np.array([self.edge_min_x[i], self.edge_max_x[i]]) + 180) / cell_size)
+                               .astype(np.int64), 0, n_x - 1)
+            iy0, iy1 = np.clip(np.floor((np.array([self.edge_min_y[i], self.edge_max_y[i]]) + 90) / cell_size)
+                               .astype(np.int64), 0, n_y - 1)
+
+            # the edge touches a cell of its bounding box if the corners of the cell are not all strictly on the
+            # same side of the edge line
+            cx = (-180 + np.arange(ix0, ix1 + 2) * cell_size)[:, np.newaxis]
+            cy = (-90 + np.arange(iy0, iy1 + 2) * cell_size)[np.newaxis, :]
+            side = self.dx[i] * (cy - self.y0[i]) - self.dy[i] * (cx - self.x0[i])
+            corners = np.stack([side[:-1, :-1], side[1:, :-1], side[:-1, 1:], side[1:, 1:]])
+
+            touched[ix0:ix1 + 1, iy0:iy1 + 1] |= (corners.min(axis=0) <= self.edge_tolerance[i]) \
+                & (corners.max(axis=0) >= -self.edge_tolerance[i])
+
+        return touched
+
+
+class CoordinateGroupClassifier:
+    """
+    Assign coordinates to the group of the first polygon which contains them.
+
+    The groups of the cells of a longitude and latitude grid which are not touched by any polygon edge are
+    precomputed, so that most points are classified by a grid lookup. Only the points of the touched cells are tested
+    with ray casting against the edges of all polygons. Points on the boundary of a polygon are inside the polygon.
+
+    :param groups: list of the polygons of each group, each polygon is a list of (longitude, latitude) vertices
+    :param cell_size: size of the grid cells in degrees
+    """
+
+    def __init__(self, groups, cell_size=1.0):
+        self.groups = [[Polygon(vertices) for vertices in polygons] for polygons in groups]
+        self.cell_size = cell_size
+
+        # edges of all polygons for the ray casting of all polygons at once
+        polygons = [p for polygons in self.groups for p in polygons]
+        for name in ["x0", "y0", "x1", "y1", "dx", "dy", "slope", "edge_tolerance", "edge_min_x", "edge_max_x",
+                     "edge_min_y", "edge_max_y"]:
+            setattr(self, name, np.concatenate([getattr(p, name) for p in polygons]))
+        self.polygon_starts = np.cumsum([0] + [len(p) for p in polygons[:-1]])
+        self.polygon_groups = np.array([i for i, polygons in enumerate(self.groups) for _ in polygons], dtype=np.int64)
+
+        self.grid = self.__build_grid__()
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __build_grid__(self):
+        n_x = int(round(360 / self.cell_size))
+        n_y = int(round(180 / self.cell_size))
+
+        ambiguous = np.zeros((n_x, n_y), dtype=bool)
+        for polygons in self.groups:
+            for polygon in polygons:
+                ambiguous |= polygon.touched_cells(self.cell_size, n_x, n_y)
+
+        # all points of a cell which is not touched by an edge are in the same group as its center. The centers of a
+        # grid row are classified at once with the crossings of the ray casting sorted by their x value
+        center_x = -180 + (np.arange(n_x) + 0.5) * self.cell_size
+        polygon_ends = np.append(self.polygon_starts[1:], len(self.x0))
+
+        grid = np.empty((n_x, n_y), dtype=np.int64)
+        for iy in range(n_y):
+            y = -90 + (iy + 0.5) * self.cell_size
+            crossed = (self.y0 > y) != (self.y1 > y)
+            crossing_x = self.x0 + (y - self.y0) * self.slope
+
+            row = np.full(n_x, len(self.groups), dtype=np.int64)
+            # the later polygons are overwritten by the first polygon which contains a center
+            for start, end, group in reversed(list(zip(self.polygon_starts, polygon_ends, self.polygon_groups))):
+                xs = np.sort(crossing_x[start:end][crossed[start:end]])
+                inside = (len(xs) - np.searchsorted(xs, center_x, side="right")) % 2 == 1
+                row[inside] = group
+
+            grid[:, iy] = row
+
+        grid[ambiguous] = AMBIGUOUS_CELL
+
+        return grid
+
+    def __classify_exact__(self, points):
+        groups = np.empty(points.shape[0], dtype=np.int64)
+
+        for start in range(0, points.shape[0], POINT_CHUNK_SIZE):
+            px = points[start:start + POINT_CHUNK_SIZE, 0, np.newaxis]
+            py = points[start:start + POINT_CHUNK_SIZE, 1, np.newaxis]
+
+            # an edge is crossed by the ray to the right of the point if the point is between the y values of the
+            # edge and left of the intersection
+            crosses = ((self.y0 > py) != (self.y1 > py)) & (px < self.x0 + (py - self.y0) * self.slope)
+            on_edge = (np.abs(self.dx * (py - self.y0) - self.dy * (px - self.x0)) <= self.edge_tolerance) \
+                & (px >= self.edge_min_x) & (px <= self.edge_max_x) & (py >= self.edge_min_y) & (py <= self.edge_max_y)
+
+            # points on the boundary are inside the polygon
+            inside = (np.add.reduceat(crosses, self.polygon_starts, axis=1) % 2 == 1) \
+                | np.logical_or.reduceat(on_edge, self.polygon_starts, axis=1)
+
+            # the polygons are ordered by group, so the first polygon which contains a point is of its first group
+            first = inside.argmax(axis=1)
+            groups[start:start + POINT_CHUNK_SIZE] = np.where(inside.any(axis=1), self.polygon_groups[first],
+                                                              len(self.groups))
+
+        return groups
+
+    def classify(self, coordinates):
+        """
+        Get the coordinate group of each point
+
+        :param coordinates: numpy array with shape (n, 2) of longitude and latitude, nan for missing coordinates
+
+        :return: numpy int64 array with the group index of each point, -1 for missing coordinates and the number of
+                 groups for points outside all groups
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+
+        groups = np.full(coordinates.shape[0], -1, dtype=np.int64)
+
+        valid = np.flatnonzero(~np.isnan(coordinates).any(axis=1))
+        if len(valid) == 0:
+            return groups
+
+        points = coordinates[valid]
+        n_x, n_y = self.grid.shape
+        ix = np.floor((points[:, 0] + 180) / self.cell_size).astype(np.int64)
+        iy = np.floor((points[:, 1] + 90) / self.cell_size).astype(np.int64)
+        # the points on the east and north border of the grid belong to the last cells
+        ix[points[:, 0] == 180] = n_x - 1
+        iy[points[:, 1] == 90] = n_y - 1
+
+        in_grid = (ix >= 0) & (ix < n_x) & (iy >= 0) & (iy < n_y)
+        valid_groups = np.full(len(points), AMBIGUOUS_CELL, dtype=np.int64)
+        valid_groups[in_grid] = self.grid[ix[in_grid], iy[in_grid]]
+
+        exact = np.flatnonzero(valid_groups == AMBIGUOUS_CELL)
+        if len(exact) > 0:
+            valid_groups[exact] = self.__classify_exact__(points[exact])
+
+        groups[valid] = valid_groups
+
+        return groups
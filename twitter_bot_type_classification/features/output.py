@@ -0,0 +1,190 @@
+import json
+import os
+
+import numpy as np
+
+MANIFEST_FILENAME = "manifest.json"
+
+MANIFEST_VERSION = 1
+
+SHARD_FEATURES_FILENAME = "features-{:06d}.npy"
+
+SHARD_IDS_FILENAME = "ids-{:06d}.npy"
+
+
+def _write_atomic(filename, write):
+    """
+    Write a file under a temporary name and rename it, so that the file is either complete or not present
+
+    :param filename: path of the file
+    :param write: function which writes the content into the given file object
+    """
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_filename, filename)
+
+
+def read_manifest(path):
+    """
+    Read the manifest of a feature output directory
+
+    :param path: feature output directory
+
+    :return: manifest dict or None if no manifest exists
+    """
+    filename = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, "r") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError("Unsupported feature output version {}".format(manifest.get("version")))
+
+    return manifest
+
+
+class FeatureShardWriter:
+    """
+    Append only feature output which writes the buffered features every shard_size users as new shard files.
+
+    A shard is committed when it is listed in the manifest file, shard files which are not listed are the result of
+    an interrupted write and are overwritten.
+
+    :param path: output directory
+    :param n_features: number of features of each user
+    :param shard_size: number of users of each shard
+    :param resume: continue an existing output, otherwise an existing output is replaced
+    """
+
+    def __init__(self, path, n_features, shard_size=100000, resume=False):
+        assert shard_size > 0
+
+        self.path = path
+        self.n_features = n_features
+        self.shard_size = shard_size
+        self.user_ids = []
+        self.features = []
+
+        os.makedirs(path, exist_ok=True)
+
+        self.manifest = read_manifest(path) if resume else None
+        if self.manifest is None:
+            self.manifest = {
+                "version": MANIFEST_VERSION,
+                "n_features": n_features,
+                "dtype": "float32",
+                "n_users": 0,
+                "shards": []
+            }
+            # an existing output is replaced by the empty manifest
+            self.__write_manifest__()
+        elif self.manifest["n_features"] != n_features:
+            raise ValueError("The existing output has {} features instead of {}".format(self.manifest["n_features"],
+                                                                                        n_features))
+
+    def append(self, user_id, features):
+        self.user_ids.append(user_id)
+        self.features.append(features)
+
+        if len(self.user_ids) >= self.shard_size:
+            self.flush()
+
+    def extend(self, user_ids, features):
+        for user_id, f in zip(user_ids, features):
+            self.append(user_id, f)
+
+    def flush(self):
+        """
+        Write the buffered features as new shard and commit it in the manifest
+        """
+        if len(self.user_ids) == 0:
+            return
+
+        index = len(self.manifest["shards"])
+        features_filename = SHARD_FEATURES_FILENAME.format(index)
+        ids_filename = SHARD_IDS_FILENAME.format(index)
+
+        features = np.asarray(self.features, dtype=np.float32).reshape(-1, self.n_features)
+        user_ids = np.asarray(self.user_ids, dtype=np.int64)
+
+        _write_atomic(os.path.join(self.path, features_filename), lambda f: np.save(f, features))
+        _write_atomic(os.path.join(self.path, ids_filename), lambda f: np.save(f, user_ids))
+
+        self.manifest["shards"].append({
+            "features": features_filename,
+            "ids": ids_filename,
+            "n_users": len(user_ids)
+        })
+        self.manifest["n_users"] += len(user_ids)
+        self.__write_manifest__()
+
+        self.user_ids = []
+        self.features = []
+
+    def __write_manifest__(self):
+        _write_atomic(os.path.join(self.path, MANIFEST_FILENAME),
+                      lambda f: f.write(json.dumps(self.manifest, indent=2).encode("utf-8")))
+
+    def close(self):
+        self.flush()
+
+
+class FeatureShardReader:
+    """
+    Lazy reader of the committed shards of a feature output directory
+
+    :param path: feature output directory written by FeatureShardWriter
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = read_manifest(path)
+
+        if self.manifest is None:
+            raise FileNotFoundError("No feature output manifest found in {}".format(path))
+
+    def __len__(self):
+        return self.manifest["n_users"]
+
+    def iter_shards(self, mmap_mode="r"):
+        """
+        Iterate over the committed shards, the feature arrays are memory mapped by default
+
+        :param mmap_mode: mmap_mode of np.load, None to read the shards into memory
+
+        :return: generator of (user ids, features) tuples
+        """
+        for shard in self.manifest["shards"]:
+            yield np.load(os.path.join(self.path, shard["ids"])), \
+                  np.load(os.path.join(self.path, shard["features"]), mmap_mode=mmap_mode)
+
+    def get_user_ids(self):
+        """
+        :return: numpy array with the user ids of all committed shards in output order
+        """
+        ids = [np.load(os.path.join(self.path, shard["ids"])) for shard in self.manifest["shards"]]
+        return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+
+    def load(self):
+        """
+        Read all shards into memory
+
+        :return: tuple of features with shape (number of users, number of features) and user ids, like the arrays of
+                 the npz output
+        """
+        features = np.empty((len(self), self.manifest["n_features"]), dtype=np.float32)
+        ids = np.empty(len(self), dtype=np.int64)
+
+        start = 0
+        for shard_ids, shard_features in self.iter_shards():
+            features[start:start + len(shard_ids)] = shard_features
+            ids[start:start + len(shard_ids)] = shard_ids
+            start += len(shard_ids)
+
+        return features, ids
@@ -0,0 +1,139 @@
+import numpy as np
+
+from twitter_bot_type_classification.dataset import schema
+from twitter_bot_type_classification.features.tokenizer import get_tokenizer
+from twitter_bot_type_classification.features.tweet import TweetBatch, TweetFeatures, TWEET_FEATURES_INDEX, N_FEATURES
+from twitter_bot_type_classification.features.urls import get_url_resolver
+
+# Has to be increased on each change of the tweet feature calculation, so that stored features of an older
+# calculation are not reused. A version change clears the store.
+FEATURE_SCHEMA_VERSION = 6
+
+# sqlite limits the number of host parameters of a statement
+MAX_QUERY_PARAMETERS = 900
+
+
+def get_user_key(user):
+    """
+    Get the user attributes and the name of the tokenizer the text features of a tweet depend on. Stored features
+    are only reused if the key did not change since the features were calculated.
+
+    :param user: tweepy user object or UserRecord object
+
+    :return: key string
+    """
+    return "{}\n{}\n{}\n{}".format(user.id, user.screen_name, getattr(user, "expanded_url", user.url) or "",
+                                   get_tokenizer().name)
+
+
+class TweetFeatureStore:
+    """
+    Persistent sqlite store of the calculated tweet features keyed by tweet id
+
+    :param filename: path of the sqlite database
+    """
+
+    def __init__(self, filename):
+        self.conn = schema.connect(filename)
+        schema.migrate(self.conn, schema.TWEET_FEATURE_STORE_MIGRATIONS)
+        self.__check_feature_version__()
+
+    def __check_feature_version__(self):
+        version = "{}:{}".format(FEATURE_SCHEMA_VERSION, N_FEATURES)
+
+        row = self.conn.execute("SELECT value FROM feature_store_info WHERE key = 'feature_version'").fetchone()
+        if row is not None and row[0] == version:
+            return
+
+        if row is not None:
+            print("Feature version of the store changed from {} to {}, the stored features are removed".format(
+                row[0], version))
+
+        with self.conn:
+            self.conn.execute("DELETE FROM tweet_features")
+            self.conn.execute("INSERT OR REPLACE INTO feature_store_info VALUES ('feature_version', ?)", (version,))
+
+    def get_many(self, tweet_ids, user_key):
+        """
+        Get the stored features of the tweets
+
+        :param tweet_ids: list of tweet ids
+        :param user_key: key of the author returned by get_user_key
+
+        :return: dict of tweet id to numpy float32 vector, tweets without stored features are not included
+        """
+        features = {}
+
+        for i in range(0, len(tweet_ids), MAX_QUERY_PARAMETERS):
+            chunk = tweet_ids[i:i + MAX_QUERY_PARAMETERS]
+            rows = self.conn.execute("SELECT id, user_key, features FROM tweet_features WHERE id IN ({})".format(
+                ",".join("?" * len(chunk))), chunk)
+
+            for tweet_id, key, blob in rows:
+                if key == user_key and len(blob) == N_FEATURES * 4:
+                    features[tweet_id] = np.frombuffer(blob, dtype=np.float32)
+
+        return features
+
+    def add_many(self, tweet_ids, user_key, features):
+        """
+        Store the features of the tweets
+
+        :param tweet_ids: list of tweet ids
+        :param user_key: key of the author returned by get_user_key
+        :param features: numpy array with shape (number of tweets, N_FEATURES)
+        """
+        features = np.asarray(features, dtype=np.float32)
+
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tweet_features VALUES (?, ?, ?)",
+                                  ((tweet_id, user_key, row.tobytes()) for tweet_id, row in zip(tweet_ids, features)))
+
+    def calc_features(self, tweets, user):
+        """
+        Get the tweet features of the tweets of one user. Only the features of tweets which are not stored are
+        calculated and added to the store. The retweet and like counts are always taken from the given tweets.
+
+        The features of a tweet with a shortened url which is not in the url cache are not stored, they change after
+        the url was resolved into the cache.
+
+        :param tweets: list of tweepy tweet objects or TweetRecord objects
+        :param user: tweepy user object or UserRecord object of the author of the tweets
+
+        :return: numpy 2 dim float32 array with shape (number of tweets, N_FEATURES)
+        """
+        n = len(tweets)
+        tweet_ids = [t.id for t in tweets]
+        user_key = get_user_key(user)
+
+        stored = self.get_many(tweet_ids, user_key)
+
+        features = np.empty((n, N_FEATURES), dtype=np.float32)
+        missing = []
+        for i, tweet_id in enumerate(tweet_ids):
+            row = stored.get(tweet_id)
+            if row is None:
+                missing.append(i)
+            else:
+                features[i] = row
+
+        if len(missing) > 0:
+            tweet_batch = TweetBatch([tweets[i] for i in missing])
+            with get_url_resolver().record_uncached_urls() as uncached_urls:
+                missing_features = TweetFeatures.batch(tweet_batch, user)
+            features[missing] = missing_features
+
+            # the urls are found in the tweet text, so a tweet contains each of its uncached urls
+            cached = [j for j, text in enumerate(tweet_batch.texts) if not any(url in text for url in uncached_urls)]
+            self.add_many([tweet_ids[missing[j]] for j in cached], user_key, missing_features[cached])
+
+        if len(missing) < n:
+            # the retweet and like counts change after the tweet was created
+            features[:, TWEET_FEATURES_INDEX["retweet_count"]] = [t.retweet_count for t in tweets]
+            features[:, TWEET_FEATURES_INDEX["likes_count"]] = [
+                0 if getattr(t, "favorite_count", None) is None else t.favorite_count for t in tweets]
+
+        return features
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,365 @@
+import functools
+import os
+import re
+import string
+from abc import ABC, abstractmethod
+
+# nltk data directory which contains the punkt sentence tokenizer model, searched before the nltk data paths.
+# The environment variable is inherited by the worker processes.
+PUNKT_PATH_ENV = "TWITTER_BOT_PUNKT_PATH"
+
+PUNKT_LANGUAGE = "english"
+
+# name of the tokenizer used for the text features, inherited by the worker processes like the punkt path
+TOKENIZER_ENV = "TWITTER_BOT_TOKENIZER"
+
+DEFAULT_TOKENIZER = "nltk"
+
+# characters which are always a token of their own in the nltk word tokenizer
+_SINGLE_CHARS = ";@#$%&?!*()\\[\\]{}<>\"`«“‘„»”’‒-―"
+
+_FAST_WORD_REGEX = re.compile(
+    r"\.{2,}"
+    r"|--"
+    # commas and colons are only split from the word if no digit follows, for example 1,000 or 12:30
+    r"|[:,](?!\d)"
+    r"|[" + _SINGLE_CHARS + r"]"
+    r"|(?:[^\s" + _SINGLE_CHARS + r":,.-]|[:,](?=\d)|\.(?!\.)|-(?!-))+")
+
+# sentence end punctuation followed by closing quotes or brackets and the start of the next sentence
+_FAST_SENTENCE_END_REGEX = re.compile(r"(?:\.{2,}|[.!?])+[\"')\]}”’»]*(?=\s+\S)")
+
+_FAST_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "inc", "ltd", "co", "no", "approx",
+                       "dept", "est", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov",
+                       "dec", "mon", "tue", "wed", "thu", "fri", "sat", "sun", "e.g", "i.e", "u.s", "u.k", "a.m", "p.m"}
+
+_FAST_CONTRACTION_SUFFIXES = ("'s", "'S", "'m", "'M", "'d", "'D", "'ll", "'LL", "'re", "'RE", "'ve", "'VE")
+
+_FAST_CONTRACTION_WORDS = {"cannot": 3, "gimme": 3, "gonna": 3, "gotta": 3, "lemme": 3, "wanna": 3}
+
+_FAST_CLOSING_TOKENS = {")", "]", "}", ">", "''", "'", "»", "”", "’"}
+
+_LEADING_QUOTE_REGEX = re.compile(r"(?i)'(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+
+
+@functools.lru_cache(maxsize=None)
+def load_nltk():
+    """
+    Import nltk on first use. Importing nltk takes about a second, so it is not imported together with the feature
+    modules.
+
+    :return: nltk module
+    """
+    import nltk
+
+    return nltk
+
+
+def get_punkt_paths():
+    """
+    :return: list of the directories which are searched for the punkt model
+    """
+    nltk = load_nltk()
+
+    punkt_path = os.environ.get(PUNKT_PATH_ENV)
+    if punkt_path:
+        return [punkt_path] + [p for p in nltk.data.path if p != punkt_path]
+
+    return list(nltk.data.path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_punkt():
+    """
+    Load the punkt sentence tokenizer model once from the local nltk data directories, the model is never downloaded.
+    Newer nltk versions read the punkt_tab model, older versions the pickled punkt model.
+
+    :return: punkt sentence tokenizer object
+    """
+    nltk = load_nltk()
+    paths = get_punkt_paths()
+
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+    except ImportError:
+        PunktTokenizer = None
+
+    try:
+        if PunktTokenizer is not None:
+            nltk.data.find("tokenizers/punkt_tab/{}/".format(PUNKT_LANGUAGE), paths)
+            # PunktTokenizer only searches the nltk data paths
+            for p in reversed(paths):
+                if p not in nltk.data.path:
+                    nltk.data.path.insert(0, p)
+            return PunktTokenizer(PUNKT_LANGUAGE)
+
+        return nltk.data.load(
+            "file:" + nltk.data.find("tokenizers/punkt/{}.pickle".format(PUNKT_LANGUAGE), paths).path)
+    except LookupError:
+        model = "punkt" if PunktTokenizer is None else "punkt_tab"
+        raise FileNotFoundError(
+            "The nltk {} sentence tokenizer model was not found in: {}. Download it once with "
+            "\"python -m nltk.downloader -d <directory> {}\" and set the directory with the environment variable {} "
+            "or the --punkt-path argument.".format(model, ", ".join(paths), model, PUNKT_PATH_ENV)) from None
+
+
+class Tokenizer(ABC):
+    """
+    Sentence and word tokenizer of the text features
+    """
+
+    name = None
+
+    def load(self):
+        """
+        Load the models of the tokenizer, raises an error if a model is missing
+        """
+        pass
+
+    @abstractmethod
+    def sent_tokenize(self, text):
+        """
+        Split the text into sentences
+
+        :param text: text to split
+
+        :return: list of sentence strings
+        """
+        pass
+
+    @abstractmethod
+    def word_tokenize(self, text, preserve_line=False):
+        """
+        Split the text into words and punctuation tokens
+
+        :param text: text to split
+        :param preserve_line: do not split the text into sentences before, the text is handled as one sentence
+
+        :return: list of token strings
+        """
+        pass
+
+
+class NltkTokenizer(Tokenizer):
+    """
+    Exact tokenizer with the nltk punkt sentence tokenizer and the nltk word tokenizer
+    """
+
+    name = "nltk"
+
+    def load(self):
+        load_punkt()
+
+    def sent_tokenize(self, text):
+        return load_punkt().tokenize(text)
+
+    def word_tokenize(self, text, preserve_line=False):
+        nltk = load_nltk()
+
+        if preserve_line:
+            return nltk.word_tokenize(text, preserve_line=True)
+
+        return [w for s in self.sent_tokenize(text) for w in nltk.word_tokenize(s, preserve_line=True)]
+
+
+class FastTokenizer(Tokenizer):
+    """
+    Regex tokenizer which approximates the nltk tokenizer with one pass over the text instead of the many regex
+    substitutions of the nltk word tokenizer. The sentences are split at end punctuation followed by whitespace,
+    except after common abbreviations and single letters. It does not need nltk or the punkt model.
+    """
+
+    name = "fast"
+
+    def sent_tokenize(self, text):
+        sentences = []
+        start = 0
+
+        for m in _FAST_SENTENCE_END_REGEX.finditer(text):
+            end_punctuation = m.group().rstrip("\"')]}”’»")
+
+            if end_punctuation == ".":
+                word = text[text.rfind(" ", start, m.start()) + 1:m.start()].lower()
+                if word in _FAST_ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                    continue
+            elif end_punctuation.startswith(".."):
+                # an ellipsis only ends the sentence if the next sentence starts uppercase
+                next_char = text[m.end():].lstrip()[:1]
+                if not next_char.isupper():
+                    continue
+
+            sentence = text[start:m.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = m.end()
+
+        sentence = text[start:].strip()
+        if sentence:
+            sentences.append(sentence)
+
+        return sentences
+
+    def word_tokenize(self, text, preserve_line=False):
+        if not preserve_line:
+            return [w for s in self.sent_tokenize(text) for w in self.word_tokenize(s, preserve_line=True)]
+
+        tokens = []
+
+        for m in _FAST_WORD_REGEX.finditer(text):
+            token = m.group()
+
+            if token == "\"":
+                start = m.start()
+                # opening quotes at the start or after whitespace or an opening bracket, otherwise closing quotes
+                tokens.append("``" if start == 0 or text[start - 1] in " \t\n([{<" else "''")
+            elif "'" in token:
+                self.__split_apostrophes__(token, tokens)
+            elif token.lower() in _FAST_CONTRACTION_WORDS:
+                i = _FAST_CONTRACTION_WORDS[token.lower()]
+                tokens.append(token[:i])
+                tokens.append(token[i:])
+            else:
+                tokens.append(token)
+
+        # only the final period of the text is split from its word
+        i = len(tokens) - 1
+        while i >= 0 and tokens[i] in _FAST_CLOSING_TOKENS:
+            i -= 1
+        if i >= 0 and len(tokens[i]) > 1 and tokens[i][-1] == "." and tokens[i][-2] != ".":
+            tokens[i:i + 1] = [tokens[i][:-1], "."]
+
+        return tokens
+
+    @staticmethod
+    def __split_apostrophes__(token, tokens):
+        if len(token) > 1 and _LEADING_QUOTE_REGEX.match(token):
+            tokens.append("'")
+            token = token[1:]
+
+        suffix = None
+        if len(token) > 3 and token[-3:].lower() == "n't":
+            suffix = token[-3:]
+        else:
+            for s in _FAST_CONTRACTION_SUFFIXES:
+                if token.endswith(s) and len(token) > len(s) and token[-len(s) - 1] != "'":
+                    suffix = s
+                    break
+            else:
+                if len(token) > 1 and token[-1] == "'" and token[-2] != "'":
+                    suffix = "'"
+
+        if suffix is None:
+            tokens.append(token)
+        else:
+            tokens.append(token[:-len(suffix)])
+            tokens.append(suffix)
+
+
+TOKENIZERS = {
+    NltkTokenizer.name: NltkTokenizer,
+    FastTokenizer.name: FastTokenizer
+}
+
+_tokenizer = None
+
+
+def get_tokenizer():
+    """
+    :return: Tokenizer object selected with set_tokenizer or the environment variable, created on first use
+    """
+    global _tokenizer
+
+    if _tokenizer is None:
+        name = os.environ.get(TOKENIZER_ENV, DEFAULT_TOKENIZER)
+        if name not in TOKENIZERS:
+            raise ValueError("Unknown tokenizer {}, available are: {}".format(name, ", ".join(TOKENIZERS)))
+        _tokenizer = TOKENIZERS[name]()
+
+    return _tokenizer
+
+
+def set_tokenizer(name):
+    """
+    Select the tokenizer of this process and of the worker processes started afterwards
+
+    :param name: name of the tokenizer, a key of TOKENIZERS
+    """
+    global _tokenizer
+
+    assert name in TOKENIZERS
+
+    os.environ[TOKENIZER_ENV] = name
+    _tokenizer = None
+
+
+def sent_tokenize(text):
+    """
+    Split the text into sentences with the selected tokenizer
+
+    :param text: text to split
+
+    :return: list of sentence strings
+    """
+    return get_tokenizer().sent_tokenize(text)
+
+
+def word_tokenize(text, preserve_line=False):
+    """
+    Split the text into words with the selected tokenizer
+
+    :param text: text to split
+    :param preserve_line: do not split the text into sentences before, the text is handled as one sentence
+
+    :return: list of token strings
+    """
+    return get_tokenizer().word_tokenize(text, preserve_line=preserve_line)
+
+
+def count_tokens(tokenizer, text):
+    """
+    Count the sentences, words and punctuation tokens of the text like the tweet text features
+
+    :param tokenizer: Tokenizer object
+    :param text: text to count
+
+    :return: tuple of the number of sentences, words and punctuation tokens
+    """
+    sentences = tokenizer.sent_tokenize(text)
+    n_words = 0
+    n_punctuations = 0
+
+    for s in sentences:
+        for w in tokenizer.word_tokenize(s, preserve_line=True):
+            if w in string.punctuation:
+                n_punctuations += 1
+            else:
+                n_words += 1
+
+    return len(sentences), n_words, n_punctuations
+
+
+def compare_tokenizers(texts, reference, candidate):
+    """
+    Measure how often the counts of the candidate tokenizer differ from the counts of the reference tokenizer
+
+    :param texts: iterable of texts
+    :param reference: Tokenizer object of the expected results, usually NltkTokenizer
+    :param candidate: Tokenizer object to compare, usually FastTokenizer
+
+    :return: dict with the number of texts and for sentences, words, punctuations and tokens the number of texts
+             with different results
+    """
+    result = {"texts": 0, "sentences": 0, "words": 0, "punctuations": 0, "tokens": 0}
+
+    for text in texts:
+        result["texts"] += 1
+
+        for name, r, c in zip(("sentences", "words", "punctuations"), count_tokens(reference, text),
+                              count_tokens(candidate, text)):
+            if r != c:
+                result[name] += 1
+
+        if reference.word_tokenize(text) != candidate.word_tokenize(text):
+            result["tokens"] += 1
+
+    return result
@@ -1,17 +1,15 @@
+import functools
 import re
 import string
 from urllib.parse import urlsplit
 from xml.sax.saxutils import unescape
 
-import nltk
 import numpy as np
 
-from twitter_bot_type_classification.features.utils import URL_SHORTER_REGEX, URL_REGEX, EMOJI_REGEX, HASHTAG_REGEX, \
+from twitter_bot_type_classification.features.tokenizer import get_tokenizer
+from twitter_bot_type_classification.features.utils import URL_SHORTER_REGEX, URL_REGEX, HASHTAG_REGEX, \
     USERNAME_REGEX, NUMBER_CHAR_REGEX, \
-    get_expanded_url, URL_PATH_SPLIT, COORDINATE_GROUPS, HTML_ESCAPE_TABLE
-
-# download punkt sentence tokenizer model
-nltk.download("punkt", quiet=True)  # , download_dir=)
+    get_cached_url, URL_PATH_SPLIT, get_coordinate_group_classifier, get_emoji_matcher, get_html_escape_table
 
 TEXT_ENCODING = "UTF-8"
 
@@ -19,6 +17,22 @@ PAGINATION_START_REGEX = re.compile(r"(^(\d+/\d+)|(?<=^\()\d+/\d+(?=\)))(?![.,]\
 
 PAGINATION_END_REGEX = re.compile(r"(?<!\d[.,])((\d+/\d+)\Z|(?<=\()\d+/\d+(?=\)\Z))")
 
+# types of the tokens of lex_tweet_text
+TOKEN_URL = "url"
+TOKEN_SHORTENED_URL = "shortened_url"
+TOKEN_EMOJI = "emoji"
+TOKEN_HASHTAG = "hashtag"
+TOKEN_MENTION = "mention"
+TOKEN_NUMBER = "number"
+TOKEN_WORD = "word"
+TOKEN_PUNCTUATION = "punctuation"
+TOKEN_SENTENCE = "sentence"
+
+# hashtags and user mentions never overlap, the numbers inside of them are matched separately
+TEXT_TOKEN_REGEX = re.compile("(?P<{}>{})|(?P<{}>{})|(?P<{}>{})".format(TOKEN_HASHTAG, HASHTAG_REGEX.pattern,
+                                                                       TOKEN_MENTION, USERNAME_REGEX.pattern,
+                                                                       TOKEN_NUMBER, NUMBER_CHAR_REGEX.pattern))
+
 # ISO 639 1 Language codes
 # The following changes have been made in comparison to ISO-639-1:
 # "iw" for Hebrew, "ckb" for Kurdish and "in" for Indonesian was added
@@ -149,387 +163,565 @@ TWEET_FEATURES_INDEX = {
 N_FEATURES = len(TWEET_FEATURES_INDEX)
 
 
-class TweetFeatures(np.ndarray):
 
-    def __new__(cls, tweet, user):
-        """
-        Calculate all tweet features and return as a numpy vector
+# features calculated from the tweet text, in the order returned by calc_text_features
+TWEET_TEXT_FEATURES_IDX = list(range(TWEET_FEATURES_INDEX["contains_pagination"],
+                                     TWEET_FEATURES_INDEX["tweet_text_length"])) + [
+                              TWEET_FEATURES_INDEX["number_emojis"]]
 
-        :param tweet: tweepy tweet object
-        :param user: tweepy user object
 
-        :return: numpy 1 dim vector with all calculated tweet features
+class TweetBatch:
+    """
+    Columnar representation of many tweets used for the batch feature calculation
+    """
+
+    def __init__(self, tweets):
         """
+        Collect the attributes of the tweets needed for the feature calculation into columns
 
-        #### tweet metadata features ####
+        :param tweets: list of tweepy tweet objects or TweetRecord objects
+        """
 
-        likes_count = 0 if getattr(tweet, "favorite_count", None) is None else tweet.favorite_count
-
-        # longitude (-180 to 180), latitude (-90 to 90)
-        coordinates_group = -1
-        if tweet.coordinates is not None:
-            coords = tweet.coordinates.get("coordinates", [])
-            if len(coords) > 1:
-                coordinates_group = len(COORDINATE_GROUPS)
-                for i, paths in enumerate(COORDINATE_GROUPS):
-                    if coordinates_group != len(COORDINATE_GROUPS):
-                        break
-                    for path in paths:
-                        if path.contains_point(coords[:2], radius=-1e-8):
-                            coordinates_group = i
-                            break
-
-        country_code_encoded = COUNTRY_CODES_IDX_UNDEF
-        place = tweet.place
-        if place is not None:
-            country_code_encoded = COUNTRY_CODES_IDX.get(place.country_code, COUNTRY_CODES_IDX_UNDEF)
-
-        source_encoded = TWEET_SOURCES_IDX.get(tweet.source, None)
-        if source_encoded is None:
-            if URL_REGEX.match(tweet.source):
-                source_encoded = TWEET_CUSTOM_SOURCES_IDX["url"]
+        n = len(tweets)
+
+        self.texts = [t.text for t in tweets]
+        self.url_entities = [t.entities["urls"] for t in tweets]
+        self.sources = [t.source for t in tweets]
+        self.langs = [t.lang for t in tweets]
+        self.country_codes = [None if t.place is None else t.place.country_code for t in tweets]
+
+        self.retweet_count = np.fromiter((t.retweet_count for t in tweets), dtype=np.float64, count=n)
+        self.favorite_count = np.fromiter(
+            (0 if getattr(t, "favorite_count", None) is None else t.favorite_count for t in tweets),
+            dtype=np.float64, count=n)
+        # -1 marks a tweet which is no reply
+        self.in_reply_to_user_id = np.fromiter(
+            (-1 if t.in_reply_to_user_id is None else t.in_reply_to_user_id for t in tweets), dtype=np.int64, count=n)
+        self.is_retweet = np.fromiter((getattr(t, "retweeted_status", None) is not None for t in tweets),
+                                      dtype=np.bool_, count=n)
+        self.is_answer = np.fromiter((getattr(t, "in_reply_to_status_id", None) is not None for t in tweets),
+                                     dtype=np.bool_, count=n)
+        self.contains_quote = np.fromiter((getattr(t, "quoted_status_id", None) is not None for t in tweets),
+                                          dtype=np.bool_, count=n)
+        self.number_of_withheld_countries = np.fromiter(
+            (len(getattr(t, "withheld_in_countries", None) or ()) for t in tweets), dtype=np.int64, count=n)
+
+        # longitude (-180 to 180), latitude (-90 to 90), nan if the tweet has no coordinates
+        self.coordinates = np.full((n, 2), np.nan, dtype=np.float64)
+        # number of photos, videos and gifs
+        self.media = np.zeros((n, 3), dtype=np.int64)
+
+        for i, t in enumerate(tweets):
+            if t.coordinates is not None:
+                coords = t.coordinates.get("coordinates", [])
+                if len(coords) > 1:
+                    self.coordinates[i] = coords[:2]
+
+            if hasattr(t, "photos") and hasattr(t, "videos") and hasattr(t, "gifs"):
+                # this data is only present when loading from dataset, is this case the entities attribute contains only urls
+                self.media[i] = (t.photos, t.videos, t.gifs)
             else:
-                source_encoded = TWEET_CUSTOM_SOURCES_IDX["other"]
+                # get number of media contents in the tweet
+                for media in t.entities.get("media", []):
+                    if media["type"] == "photo":
+                        self.media[i, 0] += 1
+                    elif media["type"] == "video":
+                        self.media[i, 1] += 1
+                    elif media["type"] == "animated_gif":
+                        self.media[i, 2] += 1
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def encode_source(source):
+    source_encoded = TWEET_SOURCES_IDX.get(source, None)
+    if source_encoded is None:
+        if URL_REGEX.match(source):
+            source_encoded = TWEET_CUSTOM_SOURCES_IDX["url"]
+        else:
+            source_encoded = TWEET_CUSTOM_SOURCES_IDX["other"]
 
-        is_retweet = int(getattr(tweet, "retweeted_status", None) is not None)
+    return source_encoded
 
-        is_answer = int(getattr(tweet, "in_reply_to_status_id", None) is not None)
 
-        is_self_reply = int(tweet.in_reply_to_user_id == user.id)
+def calc_coordinates_groups(coordinates):
+    """
+    Get the coordinate group of each point
 
-        contains_quote = int(getattr(tweet, "quoted_status_id", None) is not None)
+    :param coordinates: numpy array with shape (n, 2) of longitude and latitude, nan for missing coordinates
 
-        if hasattr(tweet, "withheld_in_countries"):
-            number_of_withheld_countries = 0 if tweet.withheld_in_countries is None else len(
-                tweet.withheld_in_countries)
-        else:
-            number_of_withheld_countries = 0
+    :return: numpy array with the coordinate group index of each point, -1 for missing coordinates and
+             len(COORDINATE_GROUP_POLYGONS) for points outside all groups
+    """
+    return get_coordinate_group_classifier().classify(coordinates)
 
-        #### tweet content features ####
 
-        tweet_text_length = len(tweet.text)
+def _remove_spans(text, spans):
+    """
+    :param text: text to clean
+    :param spans: sorted list of non overlapping (start, end) tuples
+
+    :return: text without the characters of the spans
+    """
+    parts = []
+    pos = 0
+
+    for start, end in spans:
+        parts.append(text[pos:start])
+        pos = end
+
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_removed_token_regex(emoji_start_pattern):
+    """
+    :param emoji_start_pattern: character class of the first characters of the emojis
+
+    :return: compiled regex of the urls and the first characters of the emojis
+    """
+    return re.compile("(?P<{}>{})|(?P<{}>{})".format(TOKEN_URL, URL_REGEX.pattern, TOKEN_EMOJI, emoji_start_pattern))
+
+
+def clean_tweet_text(text, url_entities, tokens=None):
+    """
+    Remove the url entities, the urls and the emojis of the tweet text by their offsets. The urls and emojis are found
+    in one scan of the text without the url entities.
+
+    :param text: tweet text
+    :param url_entities: list of url entities of the tweet
+    :param tokens: list to which the (token type, token) tuples of the removed urls and emojis are appended or None,
+                   the token of an url entity is its expanded url
+
+    :return: cleaned text
+    """
+    # unescape the html entities in the tweet text, for example &gt; as >
+    text = unescape(text, get_html_escape_table())
+
+    spans = []
+    for url in url_entities:
+        if tokens is not None:
+            tokens.append((TOKEN_URL, url["expanded_url"]))
+
+        short_url = url["url"]
+        if not short_url:
+            continue
+
+        # an url entity is removed everywhere in the text, except where a previous url entity already was
+        start = text.find(short_url)
+        while start != -1:
+            end = start + len(short_url)
+            if all(end <= s or start >= e for s, e in spans):
+                spans.append((start, end))
+            start = text.find(short_url, start + 1)
 
-        # check if the links were shortened by a service other than Twitter
-        other_shortened_urls = URL_SHORTER_REGEX.findall(tweet.text)
-        number_of_other_shortened_urls = len(other_shortened_urls)
+    if spans:
+        spans.sort()
+        text = _remove_spans(text, spans)
 
-        number_of_photos = 0
-        number_of_videos = 0
-        number_of_gifs = 0
-        if hasattr(tweet, "photos") and hasattr(tweet, "videos") and hasattr(tweet, "gifs"):
-            # this data is only present when loading from dataset, is this case the entities attribute contains only urls
-            number_of_photos = tweet.photos
-            number_of_videos = tweet.videos
-            number_of_gifs = tweet.gifs
+    matcher = get_emoji_matcher()
+    search = _get_removed_token_regex(matcher.start_regex.pattern).search
+
+    spans = []
+    pos = 0
+    while True:
+        m = search(text, pos)
+        if m is None:
+            break
+
+        start = m.start()
+        if m.lastgroup == TOKEN_URL:
+            pos = m.end()
+            if tokens is not None:
+                url = m.group()
+                # urls of other url shorteners than Twitter
+                tokens.append((TOKEN_SHORTENED_URL if URL_SHORTER_REGEX.fullmatch(url) else TOKEN_URL, url))
         else:
-            # get number of media contents in the tweet
-            for media in tweet.entities.get("media", []):
-                if media["type"] == "photo":
-                    number_of_photos += 1
-                elif media["type"] == "video":
-                    number_of_videos += 1
-                elif media["type"] == "animated_gif":
-                    number_of_gifs += 1
-
-        expanded_urls = []
-        cleaned_tweet_text = tweet.text
-        # unescape the html entities in the tweet text, for example &gt; as >
-        cleaned_tweet_text = unescape(cleaned_tweet_text, HTML_ESCAPE_TABLE)
-
-        for url in tweet.entities["urls"]:
-            cleaned_tweet_text = cleaned_tweet_text.replace(url["url"], "")
-            expanded_url = url["expanded_url"]
-            if expanded_url in other_shortened_urls:
-                expanded_url = get_expanded_url(expanded_url)
-            expanded_urls.append(expanded_url)
-
-        # contains urls which are not found by twitter api
-        regex_urls = []
-
-        for m in URL_REGEX.finditer(cleaned_tweet_text):
-            url = m.group()
-            if url in other_shortened_urls:
-                url = get_expanded_url(url)
-            regex_urls.append(url)
-            cleaned_tweet_text = cleaned_tweet_text.replace(m[0], "")
-
-        cleaned_tweet_text, number_emojis = EMOJI_REGEX.subn("", cleaned_tweet_text)
-
-        words_tokenized = nltk.word_tokenize(cleaned_tweet_text)
-        words = list(filter(lambda w: w not in string.punctuation, words_tokenized))
-
-        expanded_urls = expanded_urls + regex_urls
-
-        number_of_urls = len(expanded_urls)
-
-        contains_only_urls = number_of_urls > 0 and len(
-            cleaned_tweet_text.replace(" ", "")) == 0 and number_emojis == 0 and len(tweet.text) != 0
-
-        number_of_url_domains_matches_username = 0
-        number_of_url_domains_matches_profile_url_domain = 0
-        number_of_urls_matches_tweet_text = 0
-
-        profile_url = getattr(user, "expanded_url", user.url)
-
-        for url in expanded_urls:
-            url_split = urlsplit(url)
-            hostname = url_split.hostname
-            if hostname is None:
-                # if the url is without a scheme
-                hostname = url.split("/", 1)[0]
-
-            if user.screen_name.lower() in hostname.lower():
-                number_of_url_domains_matches_username += 1
-            if profile_url is not None and hostname.lower() in profile_url.lower():
-                number_of_url_domains_matches_profile_url_domain += 1
-
-            url_splits = list(filter(None, URL_PATH_SPLIT.split(url_split.path.lower())))
-            for w in words:
-                if w.lower() in url_splits:
-                    number_of_urls_matches_tweet_text += 1
-                    break
-
-        contains_only_emojis = number_emojis > 0 and len(
-            cleaned_tweet_text.replace(" ", "")) == 0 and number_of_urls == 0 and len(tweet.text) != 0
-
-        lang_encoded = LANG_CODES_IDX[tweet.lang]
-
-        number_of_words = len(words)
-
-        max_word_length = 0
-        min_word_length = 0
-        number_of_uppercase_words = 0
-        for word in words:
-            word_length = len(word)
-            if max_word_length < word_length:
-                max_word_length = word_length
-            if min_word_length > word_length or min_word_length == 0:
-                min_word_length = word_length
-            lowercase_letter = False
-            for letter in word:
-                if letter.islower():
-                    lowercase_letter = True
-
-            if not lowercase_letter:
-                number_of_uppercase_words += 1
-
-        cleaned_tweet_text_length = len(cleaned_tweet_text)
-
-        hashtags = HASHTAG_REGEX.findall(cleaned_tweet_text)
-        number_of_hashtags = len(hashtags)
+            length = matcher.match_length(text, start)
+            if length == 0:
+                pos = start + 1
+                continue
+            pos = start + length
+            if tokens is not None:
+                tokens.append((TOKEN_EMOJI, text[start:pos]))
+
+        spans.append((start, pos))
+
+    return _remove_spans(text, spans) if spans else text
+
+
+def lex_tweet_text(text, url_entities):
+    """
+    Split the tweet text into typed tokens. The urls and emojis are removed from the text first, the other tokens are
+    found in the cleaned text, in which for example "#tag😀s" is the hashtag "#tags". The hashtags, user mentions and
+    numbers are found in one scan of the cleaned text and the text is tokenized once.
+
+    The tokens of the urls and emojis come first, then the hashtags, user mentions and numbers and then each sentence
+    followed by its words and punctuations.
+
+    :param text: tweet text
+    :param url_entities: list of url entities of the tweet
+
+    :return: tuple of the list of (token type, token) tuples and the cleaned text
+    """
+    tokens = []
+    cleaned_text = clean_tweet_text(text, url_entities, tokens)
+
+    search = TEXT_TOKEN_REGEX.search
+    match_number = NUMBER_CHAR_REGEX.match
+
+    pos = 0
+    while True:
+        m = search(cleaned_text, pos)
+        if m is None:
+            break
+
+        token_type = m.lastgroup
+        tokens.append((token_type, m.group()))
+        pos = m.end()
+
+        if token_type != TOKEN_NUMBER:
+            # the numbers of a hashtag or user mention are numbers as well, like 2020 of #2020. A number can end after
+            # the hashtag, like 12.5 of #ab12.5
+            i = m.start() + 1
+            while i < pos:
+                if cleaned_text[i].isdigit():
+                    n = match_number(cleaned_text, i)
+                    if n is not None:
+                        tokens.append((TOKEN_NUMBER, n.group()))
+                        i = n.end()
+                        continue
+                i += 1
+            pos = i
+
+    # the text is only split into sentences once, word_tokenize of the whole text returns the same tokens as the
+    # concatenated tokens of its sentences
+    tokenizer = get_tokenizer()
+    for sentence in tokenizer.sent_tokenize(cleaned_text):
+        tokens.append((TOKEN_SENTENCE, sentence))
+        for w in tokenizer.word_tokenize(sentence, preserve_line=True):
+            tokens.append((TOKEN_PUNCTUATION if w in string.punctuation else TOKEN_WORD, w))
+
+    return tokens, cleaned_text
+
+
+def _get_page(regex_match):
+    """
+    :return: 1 if the pagination "x/y" of the match has a page x not greater than the number of pages y, otherwise 0
+    """
+    if regex_match is None:
+        return 0
+
+    c_page, t_pages = regex_match.group(1).split("/")
+    return int(int(c_page) <= int(t_pages))
+
+
+def calc_text_features(text, url_entities, screen_name, profile_url):
+    """
+    Calculate the tweet text features from the tokens of lex_tweet_text
+
+    :param text: tweet text
+    :param url_entities: list of url entities of the tweet
+    :param screen_name: username of the tweet author
+    :param profile_url: expanded profile url of the tweet author or None
+
+    :return: tuple of the text features in the order of TWEET_TEXT_FEATURES_IDX
+    """
+    tokens, cleaned_tweet_text = lex_tweet_text(text, url_entities)
+
+    urls = []
+    other_shortened_urls = []
+    number_emojis = 0
+    words = []
+    number_of_punctuations = 0
+    sentences_lengths = []
+    words_per_sentences = []
+    hashtag_lengths = []
+    number_of_user_mentions = 0
+    number_lengths = []
+
+    for token_type, token in tokens:
+        if token_type == TOKEN_WORD:
+            words.append(token)
+            words_per_sentences[-1] += 1
+        elif token_type == TOKEN_PUNCTUATION:
+            number_of_punctuations += 1
+        elif token_type == TOKEN_SENTENCE:
+            sentences_lengths.append(len(token))
+            words_per_sentences.append(0)
+        elif token_type == TOKEN_HASHTAG:
+            hashtag_lengths.append(len(token))
+        elif token_type == TOKEN_MENTION:
+            number_of_user_mentions += 1
+        elif token_type == TOKEN_NUMBER:
+            number_lengths.append(len(token.replace(".", "").replace(",", "")))
+        elif token_type == TOKEN_EMOJI:
+            number_emojis += 1
+        elif token_type == TOKEN_URL:
+            urls.append(token)
+        else:
+            other_shortened_urls.append(token)
+
+    # links shortened by a service other than Twitter are expanded with the url cache, an url entity only if it occurs
+    # in the text
+    number_of_other_shortened_urls = len(other_shortened_urls)
+    expanded_urls = [get_cached_url(url) if url in other_shortened_urls else url for url in urls]
+    expanded_urls.extend(get_cached_url(url) for url in other_shortened_urls)
+
+    number_of_urls = len(expanded_urls)
+
+    text_without_spaces_empty = len(cleaned_tweet_text.replace(" ", "")) == 0
+
+    contains_only_urls = number_of_urls > 0 and text_without_spaces_empty and number_emojis == 0 and len(text) != 0
+
+    number_of_url_domains_matches_username = 0
+    number_of_url_domains_matches_profile_url_domain = 0
+    number_of_urls_matches_tweet_text = 0
+
+    screen_name_lower = screen_name.lower()
+    profile_url_lower = None if profile_url is None else profile_url.lower()
+
+    for url in expanded_urls:
+        url_split = urlsplit(url)
+        hostname = url_split.hostname
+        if hostname is None:
+            # if the url is without a scheme
+            hostname = url.split("/", 1)[0]
+        hostname = hostname.lower()
+
+        if screen_name_lower in hostname:
+            number_of_url_domains_matches_username += 1
+        if profile_url_lower is not None and hostname in profile_url_lower:
+            number_of_url_domains_matches_profile_url_domain += 1
+
+        url_splits = [s for s in URL_PATH_SPLIT.split(url_split.path.lower()) if s]
+        for w in words:
+            if w.lower() in url_splits:
+                number_of_urls_matches_tweet_text += 1
+                break
+
+    contains_only_emojis = number_emojis > 0 and text_without_spaces_empty and number_of_urls == 0 and len(text) != 0
+
+    number_of_words = len(words)
+
+    max_word_length = 0
+    min_word_length = 0
+    number_of_uppercase_words = 0
+    for word in words:
+        word_length = len(word)
+        if max_word_length < word_length:
+            max_word_length = word_length
+        if min_word_length > word_length or min_word_length == 0:
+            min_word_length = word_length
+        if not any(letter.islower() for letter in word):
+            number_of_uppercase_words += 1
+
+    cleaned_tweet_text_length = len(cleaned_tweet_text)
+
+    number_of_hashtags = len(hashtag_lengths)
+    if hashtag_lengths:
+        mean_hashtag_length = sum(hashtag_lengths) / number_of_hashtags
+        max_hashtag_length = max(hashtag_lengths)
+        min_hashtag_length = min(hashtag_lengths)
+    else:
+        mean_hashtag_length = 0
         max_hashtag_length = 0
         min_hashtag_length = 0
-        hashtag_lengths = []
-        for hashtag in hashtags:
-            hashtag_length = len(hashtag)
-            hashtag_lengths.append(hashtag_length)
-            if max_hashtag_length < hashtag_length:
-                max_hashtag_length = hashtag_length
-            if min_hashtag_length > hashtag_length or min_hashtag_length == 0:
-                min_hashtag_length = hashtag_length
-
-        if not hashtag_lengths:
-            mean_hashtag_length = 0
-        else:
-            mean_hashtag_length = np.mean(hashtag_lengths)
-
-        user_mentions = USERNAME_REGEX.findall(cleaned_tweet_text)
-        number_of_user_mentions = len(user_mentions)
-
-        numbers = NUMBER_CHAR_REGEX.findall(cleaned_tweet_text)
-        number_of_numbers = len(numbers)
-        max_number_length = 0
-        min_number_length = 0
-        for number in numbers:
-            number_length = len(number.replace(".", "").replace(",", ""))
-            if max_number_length < number_length:
-                max_number_length = number_length
-            if min_number_length > number_length or min_number_length == 0:
-                min_number_length = number_length
-
-        start_paginations = PAGINATION_START_REGEX.findall(cleaned_tweet_text)
-        if len(start_paginations) == 1:
-            c_page, t_pages = start_paginations[0][0].split("/")
-            contains_start_pagination = int(int(c_page) <= int(t_pages))
-        else:
-            contains_start_pagination = 0
 
-        end_paginations = PAGINATION_END_REGEX.findall(cleaned_tweet_text)
-        if len(end_paginations) == 1:
-            c_page, t_pages = end_paginations[0][0].split("/")
-            contains_end_pagination = int(int(c_page) <= int(t_pages))
-        else:
-            contains_end_pagination = 0
-
-        contains_pagination = int(contains_start_pagination != contains_end_pagination)
-
-        sentences = nltk.sent_tokenize(cleaned_tweet_text)
-        number_of_sentences = len(sentences)
-
-        number_of_punctuations = 0
-        sentences_lengths = []
-        words_per_sentences = []
-        for s in sentences:
-            sentences_lengths.append(len(s))
-            words = nltk.word_tokenize(s)
-            filtered_words = []
-            for w in words:
-                if w not in string.punctuation:
-                    filtered_words.append(w)
-                else:
-                    number_of_punctuations += 1
-
-            words_per_sentences.append(len(filtered_words))
-
-        if not sentences_lengths:
-            mean_sentence_length = 0
-        else:
-            mean_sentence_length = np.mean(sentences_lengths)
+    number_of_numbers = len(number_lengths)
+    max_number_length = 0
+    min_number_length = 0
+    for number_length in number_lengths:
+        if max_number_length < number_length:
+            max_number_length = number_length
+        if min_number_length > number_length or min_number_length == 0:
+            min_number_length = number_length
 
-        if not words_per_sentences:
-            mean_number_of_words_per_sentences = 0
-        else:
-            mean_number_of_words_per_sentences = np.mean(words_per_sentences)
+    # a pagination can only start at the first character or after an opening bracket, so only these positions are
+    # matched. A pagination at the end is searched from the trailing digits and slashes of the text
+    contains_start_pagination = _get_page(PAGINATION_START_REGEX.match(cleaned_tweet_text) or
+                                          PAGINATION_START_REGEX.match(cleaned_tweet_text, 1))
 
-        max_number_of_words_per_sentences = 0 if len(words_per_sentences) == 0 else max(words_per_sentences)
-        min_number_of_words_per_sentences = 0 if len(words_per_sentences) == 0 else min(words_per_sentences)
+    tail_start = len(cleaned_tweet_text) - 1 if cleaned_tweet_text.endswith(")") else len(cleaned_tweet_text)
+    while tail_start > 0 and (cleaned_tweet_text[tail_start - 1].isdigit() or
+                              cleaned_tweet_text[tail_start - 1] == "/"):
+        tail_start -= 1
+    contains_end_pagination = _get_page(PAGINATION_END_REGEX.search(cleaned_tweet_text, tail_start))
 
-        #### tweet metadata features ####
+    contains_pagination = int(contains_start_pagination != contains_end_pagination)
 
-        obj = np.asarray([
-            #### tweet metadata features ####
+    number_of_sentences = len(sentences_lengths)
 
-            # number of times this tweet has been retweeted
-            tweet.retweet_count,
+    if sentences_lengths:
+        mean_sentence_length = sum(sentences_lengths) / number_of_sentences
+        mean_number_of_words_per_sentences = sum(words_per_sentences) / number_of_sentences
+        max_number_of_words_per_sentences = max(words_per_sentences)
+        min_number_of_words_per_sentences = min(words_per_sentences)
+    else:
+        mean_sentence_length = 0
+        mean_number_of_words_per_sentences = 0
+        max_number_of_words_per_sentences = 0
+        min_number_of_words_per_sentences = 0
 
-            # number of times this tweet has been liked
-            likes_count,
+    return (
+        # text contains tweet pagination (tweet start or ends with "y/x")
+        contains_pagination,
 
-            # tweet coordinates group
-            coordinates_group,
+        # tweet contains only emojis and no other text
+        contains_only_emojis,
 
-            # country code
-            country_code_encoded,
+        # tweet contains only urls and no other text
+        contains_only_urls,
 
-            # tweet source
-            source_encoded,
+        # number of urls in the tweet
+        number_of_urls,
 
-            # is retweet
-            is_retweet,
+        # number shortened urls of other services than Twitter
+        number_of_other_shortened_urls,
 
-            # is answer
-            is_answer,
+        # number of url domains in the tweet matches the username
+        number_of_url_domains_matches_username,
 
-            # is self reply
-            is_self_reply,
+        # number of url domains in the tweet matches the profile url domain
+        number_of_url_domains_matches_profile_url_domain,
 
-            # contains quote
-            contains_quote,
+        # number of urls which contains parts of the tweets text
+        number_of_urls_matches_tweet_text,
 
-            # number of countries where the tweet is withheld
-            number_of_withheld_countries,
+        # number hashtags
+        number_of_hashtags,
 
-            #### tweet content features ####
+        # mean hashtag length
+        mean_hashtag_length,
 
-            # language code encoded
-            lang_encoded,
+        # max hashtag length
+        max_hashtag_length,
 
-            # number photos
-            number_of_photos,
+        # min hashtag length
+        min_hashtag_length,
 
-            # number videos
-            number_of_videos,
+        # number user mentions with '@'
+        number_of_user_mentions,
 
-            # number videos
-            number_of_gifs,
+        # number of sentences
+        number_of_sentences,
 
-            # text contains tweet pagination (tweet start or ends with "y/x")
-            contains_pagination,
+        # mean sentence length
+        mean_sentence_length,
 
-            # tweet contains only emojis and no other text
-            contains_only_emojis,
+        # number of numbers
+        number_of_numbers,
 
-            # tweet contains only urls and no other text
-            contains_only_urls,
+        # max number length
+        max_number_length,
 
-            # number of urls in the tweet
-            number_of_urls,
+        # min number length
+        min_number_length,
 
-            # number shortened urls of other services than Twitter
-            number_of_other_shortened_urls,
+        # max word length
+        max_word_length,
 
-            # number of url domains in the tweet matches the username
-            number_of_url_domains_matches_username,
+        # min word length
+        min_word_length,
 
-            # number of url domains in the tweet matches the profile url domain
-            number_of_url_domains_matches_profile_url_domain,
+        # number of words
+        number_of_words,
 
-            # number of urls which contains parts of the tweets text
-            number_of_urls_matches_tweet_text,
+        # mean number of words per sentence
+        mean_number_of_words_per_sentences,
 
-            # number hashtags
-            number_of_hashtags,
+        # max number of words per sentence
+        max_number_of_words_per_sentences,
 
-            # mean hashtag length
-            mean_hashtag_length,
+        # min number of words per sentence
+        min_number_of_words_per_sentences,
 
-            # max hashtag length
-            max_hashtag_length,
+        # number of punctuations !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~
+        number_of_punctuations,
 
-            # min hashtag length
-            min_hashtag_length,
+        # number of CAPS words
+        number_of_uppercase_words,
 
-            # number user mentions with '@'
-            number_of_user_mentions,
+        # cleaned text length (chars)
+        cleaned_tweet_text_length,
 
-            # number of sentences
-            number_of_sentences,
+        # number of emojis in the tweet text
+        number_emojis
+    )
 
-            # mean sentence length
-            mean_sentence_length,
 
-            # number of numbers
-            number_of_numbers,
+class TweetFeatures(np.ndarray):
 
-            # max number length
-            max_number_length,
+    def __new__(cls, tweet, user):
+        """
+        Calculate all tweet features and return as a numpy vector
 
-            # min number length
-            min_number_length,
+        :param tweet: tweepy tweet object or TweetRecord object
+        :param user: tweepy user object or UserRecord object
 
-            # max word length
-            max_word_length,
+        :return: numpy 1 dim vector with all calculated tweet features
+        """
+
+        return cls.batch([tweet], user)[0].view(cls)
+
+    @staticmethod
+    def batch(tweets, users):
+        """
+        Calculate the tweet features of many tweets at once
+
+        :param tweets: list of tweepy tweet objects, TweetRecord objects or a TweetBatch
+        :param users: tweepy user object of the author of all tweets or a list with the author of each tweet
 
-            # min word length
-            min_word_length,
+        :return: numpy 2 dim float32 array with shape (number of tweets, N_FEATURES)
+        """
+
+        if not isinstance(tweets, TweetBatch):
+            tweets = TweetBatch(tweets)
+
+        n = len(tweets)
 
-            # number of words
-            number_of_words,
+        if isinstance(users, (list, tuple)):
+            assert len(users) == n
+            user_ids = np.fromiter((u.id for u in users), dtype=np.int64, count=n)
+        else:
+            user_ids = users.id
+            users = [users] * n
 
-            # mean number of words per sentence
-            mean_number_of_words_per_sentences,
+        features = np.empty((n, N_FEATURES), dtype=np.float32)
 
-            # max number of words per sentence
-            max_number_of_words_per_sentences,
+        if n == 0:
+            return features
 
-            # min number of words per sentence
-            min_number_of_words_per_sentences,
+        #### tweet metadata features ####
 
-            # number of punctuations !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~
-            number_of_punctuations,
+        features[:, TWEET_FEATURES_INDEX["retweet_count"]] = tweets.retweet_count
+        features[:, TWEET_FEATURES_INDEX["likes_count"]] = tweets.favorite_count
+        features[:, TWEET_FEATURES_INDEX["coordinates_group"]] = calc_coordinates_groups(tweets.coordinates)
+        features[:, TWEET_FEATURES_INDEX["country_code_encoded"]] = [
+            COUNTRY_CODES_IDX.get(c, COUNTRY_CODES_IDX_UNDEF) for c in tweets.country_codes]
 
-            # number of CAPS words
-            number_of_uppercase_words,
+        sources_encoded = {s: encode_source(s) for s in set(tweets.sources)}
+        features[:, TWEET_FEATURES_INDEX["source_encoded"]] = [sources_encoded[s] for s in tweets.sources]
 
-            # cleaned text length (chars)
-            cleaned_tweet_text_length,
+        features[:, TWEET_FEATURES_INDEX["is_retweet"]] = tweets.is_retweet
+        features[:, TWEET_FEATURES_INDEX["is_answer"]] = tweets.is_answer
+        features[:, TWEET_FEATURES_INDEX["is_self_reply"]] = tweets.in_reply_to_user_id == user_ids
+        features[:, TWEET_FEATURES_INDEX["contains_quote"]] = tweets.contains_quote
+        features[:, TWEET_FEATURES_INDEX["number_of_withheld_countries"]] = tweets.number_of_withheld_countries
 
-            # tweet text length (not cleaned)
-            tweet_text_length,
+        #### tweet content features ####
 
-            # number of emojis in the tweet text
-            number_emojis
+        features[:, TWEET_FEATURES_INDEX["lang_encoded"]] = [LANG_CODES_IDX[lang] for lang in tweets.langs]
+        features[:, TWEET_FEATURES_INDEX["number_of_photos"]] = tweets.media[:, 0]
+        features[:, TWEET_FEATURES_INDEX["number_of_videos"]] = tweets.media[:, 1]
+        features[:, TWEET_FEATURES_INDEX["number_of_gifs"]] = tweets.media[:, 2]
+        features[:, TWEET_FEATURES_INDEX["tweet_text_length"]] = [len(text) for text in tweets.texts]
 
-        ], dtype=np.float32).view(cls)
+        text_features = [
+            calc_text_features(text, url_entities, user.screen_name, getattr(user, "expanded_url", user.url))
+            for text, url_entities, user in zip(tweets.texts, tweets.url_entities, users)]
+        features[:, TWEET_TEXT_FEATURES_IDX] = text_features
 
-        return obj
+        return features
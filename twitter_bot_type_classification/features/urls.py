@@ -0,0 +1,385 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from twitter_bot_type_classification.dataset import schema
+from twitter_bot_type_classification.features.tweet import TOKEN_SHORTENED_URL, clean_tweet_text
+from twitter_bot_type_classification.features.utils import URL_SCHEME, TWITTER_URL_SHORTER_REGEX
+
+# sqlite file of the url cache, inherited by the worker processes. Without a file the urls are only cached in memory
+# of each process.
+URL_CACHE_ENV = "TWITTER_BOT_URL_CACHE"
+
+# if set to 1 only cached urls are resolved, the other urls are not expanded
+URL_CACHE_ONLY_ENV = "TWITTER_BOT_URL_CACHE_ONLY"
+
+# seconds to wait for the connection and for each response of a url
+DEFAULT_TIMEOUT = 5
+
+# seconds after which a resolved url is resolved again, urls which could not be resolved are retried earlier
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_ERROR_TTL = 24 * 60 * 60
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_PER_HOST = 4
+
+# maximum number of sql variables of one cache query
+CACHE_QUERY_SIZE = 500
+
+
+class UrlCache:
+    """
+    Persistent cache of the resolved urls in a sqlite database. The threads of a process share one connection, each
+    process opens its own connection.
+
+    :param filename: path of the sqlite database, :memory: for a cache which is not saved
+    :param ttl: seconds until a resolved url expires, None if it never expires
+    :param error_ttl: seconds until a url which could not be resolved expires, None if it never expires
+    """
+
+    def __init__(self, filename=":memory:", ttl=DEFAULT_TTL, error_ttl=DEFAULT_ERROR_TTL):
+        assert filename is not None
+        assert ttl is None or ttl > 0
+        assert error_ttl is None or error_ttl > 0
+
+        self.filename = filename
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def __connect__(self):
+        # a connection must not be used in a forked process
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = schema.connect(self.filename, check_same_thread=False)
+            schema.migrate(self.conn, schema.URL_CACHE_MIGRATIONS)
+            self.pid = os.getpid()
+
+        return self.conn
+
+    def __is_expired__(self, status, resolved_at, now):
+        ttl = self.ttl if status is not None else self.error_ttl
+        return ttl is not None and resolved_at + ttl < now
+
+    def get_many(self, urls, expired=False):
+        """
+        :param urls: list of urls
+        :param expired: return the expired urls as well
+
+        :return: dict of the cached and not expired urls to the tuple of final url and http status, the status is
+                 None if the url could not be resolved
+        """
+        urls = list(urls)
+        now = time.time()
+        result = {}
+
+        with self.lock:
+            conn = self.__connect__()
+            for start in range(0, len(urls), CACHE_QUERY_SIZE):
+                chunk = urls[start:start + CACHE_QUERY_SIZE]
+                rows = conn.execute(
+                    "SELECT url, final_url, status, resolved_at FROM url_cache WHERE url IN ({})".format(
+                        ", ".join("?" * len(chunk))), chunk)
+                for url, final_url, status, resolved_at in rows:
+                    if expired or not self.__is_expired__(status, resolved_at, now):
+                        result[url] = (final_url, status)
+
+        return result
+
+    def get(self, url, expired=False):
+        """
+        :param url: url to look up
+        :param expired: return the url even if it is expired
+
+        :return: tuple of final url and http status or None if the url is not cached or expired
+        """
+        return self.get_many([url], expired).get(url)
+
+    def put_many(self, entries):
+        """
+        :param entries: list of tuples of url, final url and http status
+        """
+        now = time.time()
+
+        with self.lock:
+            conn = self.__connect__()
+            conn.executemany("INSERT OR REPLACE INTO url_cache VALUES(?, ?, ?, ?)",
+                             [(url, final_url, status, now) for url, final_url, status in entries])
+            conn.commit()
+
+    def put(self, url, final_url, status):
+        self.put_many([(url, final_url, status)])
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None and self.pid == os.getpid():
+                self.conn.close()
+            self.conn = None
+
+
+class UrlResolver:
+    """
+    Expand shortened urls concurrently with one connection pool per host and cache the results.
+
+    A url is resolved like before with a HEAD request, the location of the redirect is the expanded url. If the
+    redirect only changes the scheme or adds www, all redirects of a GET request are followed. Urls which could not be
+    resolved are expanded to themselves.
+
+    Without requests, in the cache only mode and with lookup_many, the expired urls of the cache are used as well, so
+    the same cache always expands an url the same way.
+
+    :param cache: UrlCache object, by default an in memory cache
+    :param timeout: seconds to wait for the connection and for each response
+    :param max_workers: number of threads which resolve the urls of resolve_many
+    :param max_per_host: maximum number of concurrent requests to one host
+    :param cache_only: only return cached urls and send no requests, the other urls are returned unchanged
+    """
+
+    def __init__(self, cache=None, timeout=DEFAULT_TIMEOUT, max_workers=DEFAULT_MAX_WORKERS,
+                 max_per_host=DEFAULT_MAX_PER_HOST, cache_only=False):
+        assert timeout > 0
+        assert max_workers > 0
+        assert max_per_host > 0
+
+        self.cache = UrlCache() if cache is None else cache
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.cache_only = cache_only
+
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.host_semaphores = {}
+        self.executor = None
+        self.pid = None
+        self.uncached_urls = None
+
+    def __get_host__(self, host):
+        """
+        :return: tuple of the requests session and the semaphore of the host, created on first use
+        """
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+
+            return self.sessions[host], self.host_semaphores[host]
+
+    def __get_executor__(self):
+        with self.lock:
+            # the threads of the executor do not exist in a forked process
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self.pid = os.getpid()
+
+            return self.executor
+
+    def fetch(self, url, timeout=None):
+        """
+        Resolve the url with http requests, the cache is not used
+
+        :param url: url to resolve
+        :param timeout: seconds to wait for the connection and for each response, by default the timeout of the
+                        resolver
+
+        :return: tuple of the final url and the http status, the status is None if the url could not be resolved
+        """
+        # urls found in the text may have no scheme
+        request_url = url if "://" in url else "http://" + url
+        timeout = self.timeout if timeout is None else timeout
+
+        session, semaphore = self.__get_host__(urlsplit(request_url).netloc.lower())
+
+        with semaphore:
+            try:
+                response = session.head(request_url, allow_redirects=False, timeout=timeout)
+            except requests.exceptions.RequestException:
+                return url, None
+
+            location = response.headers.get("location")
+            if location is None:
+                return url, response.status_code
+
+            expanded_url = urljoin(request_url, location)
+            status = response.status_code
+
+            if URL_SCHEME.sub("", expanded_url) == URL_SCHEME.sub("", url):
+                try:
+                    # the body is not needed, only the url after the redirects
+                    with session.get(request_url, timeout=timeout, stream=True) as response:
+                        expanded_url = response.url
+                        status = response.status_code
+                except requests.exceptions.RequestException as e:
+                    if e.request is not None:
+                        expanded_url = e.request.url
+
+        return expanded_url, status
+
+    def resolve_many(self, urls, timeout=None):
+        """
+        Resolve the urls which are not cached concurrently and cache the results
+
+        :param urls: iterable of urls
+        :param timeout: seconds to wait for the connection and for each response, by default the timeout of the
+                        resolver
+
+        :return: dict of each url to its expanded url
+        """
+        urls = list(dict.fromkeys(urls))
+
+        cached = self.cache.get_many(urls, expired=self.cache_only)
+        result = {url: final_url for url, (final_url, _) in cached.items()}
+
+        missing = [url for url in urls if url not in cached]
+        if len(missing) == 0:
+            return result
+
+        if self.cache_only:
+            result.update((url, url) for url in missing)
+            return result
+
+        if len(missing) == 1:
+            fetched = [self.fetch(missing[0], timeout)]
+        else:
+            fetched = list(self.__get_executor__().map(lambda url: self.fetch(url, timeout), missing))
+
+        self.cache.put_many([(url, final_url, status) for url, (final_url, status) in zip(missing, fetched)])
+        result.update((url, final_url) for url, (final_url, _) in zip(missing, fetched))
+
+        return result
+
+    def lookup_many(self, urls):
+        """
+        Expand the urls with the cache only, no request is sent
+
+        :param urls: iterable of urls
+
+        :return: dict of each url to its cached expanded url, the url itself if it is not cached
+        """
+        urls = list(dict.fromkeys(urls))
+
+        cached = self.cache.get_many(urls, expired=True)
+        if self.uncached_urls is not None:
+            self.uncached_urls.update(url for url in urls if url not in cached)
+
+        return {url: cached[url][0] if url in cached else url for url in urls}
+
+    @contextmanager
+    def record_uncached_urls(self):
+        """
+        Collect the urls which lookup_many does not find in the cache while the context is active
+
+        :return: set of the uncached urls, which is filled until the context exits
+        """
+        self.uncached_urls = set()
+        try:
+            yield self.uncached_urls
+        finally:
+            self.uncached_urls = None
+
+    def lookup(self, url):
+        """
+        :param url: url to expand
+
+        :return: cached expanded url or the url itself if it is not cached
+        """
+        return self.lookup_many([url])[url]
+
+    def resolve(self, url, timeout=None):
+        """
+        :param url: url to resolve
+        :param timeout: seconds to wait for the connection and for each response, by default the timeout of the
+                        resolver
+
+        :return: expanded url
+        """
+        return self.resolve_many([url], timeout)[url]
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown()
+            self.executor = None
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+            self.host_semaphores = {}
+
+        self.cache.close()
+
+
+def iter_shortened_urls(user_db=None, tweet_db=None):
+    """
+    Find the shortened urls which the feature calculation expands: the Twitter profile urls of the users without an
+    expanded url and the shortened url tokens of the tweet texts. The expanded urls of the url entities are only
+    expanded if they occur in the tweet text as well, so they are already part of the text urls.
+
+    :param user_db: UserDB object or None
+    :param tweet_db: TweetDB object or None
+
+    :return: generator of the urls, an url can occur more than once
+    """
+    if user_db is not None:
+        for u in user_db.get_all_user():
+            if u.url is not None and TWITTER_URL_SHORTER_REGEX.match(u.url) \
+                    and getattr(u, "expanded_url", None) is None:
+                yield u.url
+
+    if tweet_db is not None:
+        for _, tweets in tweet_db.get_tweets_grouped_by_user():
+            for t in tweets:
+                tokens = []
+                clean_tweet_text(t.text, t.entities["urls"], tokens)
+                for token_type, token in tokens:
+                    if token_type == TOKEN_SHORTENED_URL:
+                        yield token
+
+
+_url_resolver = None
+
+
+def get_url_resolver():
+    """
+    :return: UrlResolver object configured with set_url_cache or the environment variables, created on first use
+    """
+    global _url_resolver
+
+    if _url_resolver is None:
+        filename = os.environ.get(URL_CACHE_ENV) or ":memory:"
+        cache_only = os.environ.get(URL_CACHE_ONLY_ENV) == "1"
+        _url_resolver = UrlResolver(UrlCache(filename), cache_only=cache_only)
+
+    return _url_resolver
+
+
+def set_url_cache(filename=None, cache_only=False):
+    """
+    Configure the url resolver of this process and of the worker processes started afterwards
+
+    :param filename: path of the sqlite url cache, None for a cache in memory
+    :param cache_only: only expand cached urls and send no requests
+    """
+    global _url_resolver
+
+    assert filename is not None or not cache_only
+
+    if filename is None:
+        os.environ.pop(URL_CACHE_ENV, None)
+    else:
+        os.environ[URL_CACHE_ENV] = filename
+    os.environ[URL_CACHE_ONLY_ENV] = "1" if cache_only else "0"
+
+    if _url_resolver is not None:
+        _url_resolver.close()
+    _url_resolver = None
@@ -1,19 +1,14 @@
 from datetime import datetime
 from urllib.parse import urlsplit
 
-import nltk
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from twitter_bot_type_classification.features.tweet import TweetFeatures, LANG_CODES_IDX, TWEET_FEATURES_INDEX, \
-    N_FEATURES, \
     TWEET_TEXT_SIMILARITY_FEATURES
+from twitter_bot_type_classification.features.tokenizer import get_tokenizer
 from twitter_bot_type_classification.features.utils import URL_REGEX, USERNAME_REGEX, BOT_IN_DIFFERENT_LANG, \
-    EMOJI_REGEX, SERVICE_PROFILES, \
-    get_expanded_url, TWITTER_URL_SHORTER_REGEX, USERNAME_STRUCTURE_REGEXS
-
-# download punkt sentence tokenizer model
-nltk.download("punkt", quiet=True)
+    SERVICE_PROFILES, get_emoji_matcher, \
+    get_cached_url, TWITTER_URL_SHORTER_REGEX, USERNAME_STRUCTURE_REGEXS
 
 USER_FEATURES_INDEX = {
     "tweet_time_interval_mean": 0,
@@ -236,14 +231,28 @@ USER_ONLY_FEATURES = [
 USER_ONLY_FEATURES_IDX = [USER_FEATURES_INDEX[f_name] for f_name in USER_ONLY_FEATURES]
 
 
+def cosine_similarity(features):
+    """
+    Pairwise cosine similarity of the rows, sklearn is imported on first use to keep the import of this module fast
+
+    :param features: numpy 2 dim array
+
+    :return: numpy array with shape (number of rows, number of rows)
+    """
+    from sklearn.metrics.pairwise import cosine_similarity as pairwise_cosine_similarity
+
+    return pairwise_cosine_similarity(features)
+
+
 class UserFeatures(np.ndarray):
 
-    def __new__(cls, user, tweets):
+    def __new__(cls, user, tweets, feature_store=None):
         """
         Generate all user features.
 
-        :param user: user tweepy object
-        :param tweets: list of tweepy tweet objects. NOTE: the tweets have to be chronological sorted.
+        :param user: user tweepy object or UserRecord object
+        :param tweets: list of tweepy tweet objects or TweetRecord objects. NOTE: the tweets have to be chronological sorted.
+        :param feature_store: optional TweetFeatureStore object to reuse the already calculated tweet features
 
         :return: numpy 1 dim array with all calculated user features
         """
@@ -252,21 +261,17 @@ class UserFeatures(np.ndarray):
 
         number_of_selected_tweets = len(tweets)
         if number_of_selected_tweets > 0:
-            time_diff_vec = np.zeros((number_of_selected_tweets - 1, 1), dtype=np.int32)
-            last_timestamp = None
-            tweets_features = np.empty((len(tweets), N_FEATURES), dtype=np.float32)
-
-            interaction_user_ids = set()
-
-            for i, t in enumerate(tweets):
-                timestamp = int(t.created_at.timestamp())
-                if last_timestamp is not None:
-                    time_diff_vec[i - 1] = last_timestamp - timestamp
-                last_timestamp = timestamp
-                t_features = TweetFeatures(t, user)
-                tweets_features[i] = t_features
-                if hasattr(t, "in_reply_to_user_id") and t.in_reply_to_user_id is not None:
-                    interaction_user_ids.add(t.in_reply_to_user_id)
+            timestamps = np.fromiter((int(t.created_at.timestamp()) for t in tweets), dtype=np.int64,
+                                     count=number_of_selected_tweets)
+            time_diff_vec = (timestamps[:-1] - timestamps[1:]).astype(np.int32).reshape(-1, 1)
+
+            if feature_store is None:
+                tweets_features = TweetFeatures.batch(tweets, user)
+            else:
+                tweets_features = feature_store.calc_features(tweets, user)
+
+            interaction_user_ids = {t.in_reply_to_user_id for t in tweets if
+                                    getattr(t, "in_reply_to_user_id", None) is not None}
 
             different_user_interactions = len(interaction_user_ids)
             tweets_features_mean = np.mean(tweets_features, axis=0)
@@ -531,12 +536,12 @@ class UserFeatures(np.ndarray):
 
         description_length = len(user.description)
 
-        description_words_tokenized = nltk.word_tokenize(user.description)
+        description_words_tokenized = get_tokenizer().word_tokenize(user.description)
         number_of_numbers_in_description = len(list(
             filter(lambda w: w.isdigit() or w.replace(".", "").replace(",", "").isdigit(),
                    description_words_tokenized)))
 
-        number_of_emojis_in_description = len(EMOJI_REGEX.findall(user.description))
+        number_of_emojis_in_description = get_emoji_matcher().count(user.description)
 
         description_contains_bot = int(any(bot in user.description for bot in BOT_IN_DIFFERENT_LANG))
 
@@ -567,7 +572,7 @@ class UserFeatures(np.ndarray):
 
         number_of_numbers_in_name = sum(char.isdigit() for char in user.name)
 
-        number_of_emojis_in_name = len(EMOJI_REGEX.findall(user.name))
+        number_of_emojis_in_name = get_emoji_matcher().count(user.name)
 
         name_contains_bot = int(any(bot in user.name for bot in BOT_IN_DIFFERENT_LANG))
 
@@ -578,7 +583,7 @@ class UserFeatures(np.ndarray):
             if TWITTER_URL_SHORTER_REGEX.match(user.url):
                 expanded_profile_url = getattr(user, "expanded_url", None)
                 if expanded_profile_url is None:
-                    expanded_profile_url = get_expanded_url(user.url)
+                    expanded_profile_url = get_cached_url(user.url)
             else:
                 expanded_profile_url = user.url
 
@@ -1,28 +1,11 @@
-import csv
-import importlib
-import pathlib
+import functools
 import re
-import xml.etree.ElementTree as ET
+import warnings
 from datetime import timedelta
 
-import requests
-from matplotlib.path import Path
-
-from twitter_bot_type_classification import data
-
-unicode_emojis = []
-
-with importlib.resources.open_text(data, "emoji-test.txt") as f:
-    reader = csv.reader(f, delimiter=";")
-
-    for r in reader:
-        if len(r) == 0 or "#" in r[0]:
-            continue
-        unicode_emojis.append(r[0].strip().split(" "))
-
-emojis_escaped = [re.escape("".join(chr(int(e.zfill(8), 16)) for e in emoji)) for emoji in unicode_emojis]
-
-EMOJI_REGEX = re.compile("|".join(emojis_escaped), flags=re.UNICODE)
+from twitter_bot_type_classification.features.emoji import load_emoji_matcher, read_emoji_sequences
+from twitter_bot_type_classification.features.entities import load_html_escape_table
+from twitter_bot_type_classification.features.geo import CoordinateGroupClassifier
 
 URL_REGEX = re.compile(
     r"\b((http(s)?://)?((([a-zA-Z]|\d|(?<=([a-zA-Z]|\d))-(?=([a-zA-Z]|\d))))+\.)*(([a-zA-Z]|\d|(?<=([a-zA-Z]|\d))-(?=([a-zA-Z]|\d))))+\.(([a-zA-Z]|(\d+\.\d+\.\d+)))+(:[1-9]\d{0,4})?(\/([a-zA-Z]|\d|(?<=([a-zA-Z]|\d))-(?=([a-zA-Z]|\d)))*)*(([a-zA-Z]|\d)+\?(([a-zA-Z]|\d)+\=([a-zA-Z]|\d|_|-|%)+)+(&([a-zA-Z]|\d)+=([a-zA-Z]|\d|_|-|%)+)*)?(#([a-zA-Z]|\d)*)?)\b")
@@ -121,50 +104,47 @@ SERVICE_PROFILES = [
 
 URL_PATH_SPLIT = re.compile("[-._~/]")
 
-COORDINATE_GROUPS = [
-    [Path(
-        [(-80.9, 31), (-75.5, 35), (-73, 40), (-50.1, 47.8), (-63, 60.3), (-129, 71.5), (-136.3, 69.4), (-157.6, 71.6),
-         (-166.5, 68.89), (-168.5, 65.8), (-168.5, 63.5), (-168.3, 62.5), (-168, 60), (-158, 57.5), (-172, 52.8),
-         (-180, 52.8), (-180, 51.2), (-166, 52.7), (-153, 56.4), (-147, 60), (-126, 48.5), (-125, 38), (-116, 25),
-         (-84, 7), (-78.2, 7.2), (-76.8, 9), (-83, 11), (-83, 16), (-88, 16.5), (-86, 21.8), (-90, 21.8), (-92, 19),
-         (-95.8, 19), (-97.5, 24), (-96.5, 28.2), (-84, 29.5), (-82, 23.5), (-85, 22.5), (-85, 21.5), (-80, 17.5),
-         (-63.5, 17.5), (-61.5, 14), (-61.9, 11.8), (-59, 13), (-62, 18.8), (-73, 22.6), (-80.9, 31)]),
-        Path([(180, 52.8), (175, 52.8), (166, 55.5), (165.5, 55.1), (174.5, 51.5), (180, 51.2), (180, 52.8)])],
-    [Path([(-63, 60.3), (-42, 59), (-38, 63), (-13.5, 63), (-9, 81.9), (-31.5, 84), (-60, 82.4), (-65, 83), (-78, 83.3),
-           (-123, 77), (-129, 71.5), (-63, 60.3)])],
-    [Path([(-76.8, 9), (-75, 11.3), (-70, 13.2), (-60.5, 11), (-58, 7), (-51, 5), (-49, 0), (-33, -5), (-38, -15),
-           (-41, -23), (-48, -26), (-48.5, -29), (-69, -51), (-63, -55), (-68, -56.2), (-75.5, -54), (-76, -46),
-           (-71, -18.5), (-76.5, -14.5), (-83, -4), (-78, 4), (-78.2, 7.2)]), Path(
-        [(-61.3, -50.9), (-57.9, -51.3), (-57.55, -51.65), (-59, -52.6), (-60.8, -52.3), (-61.5, -51.8),
-         (-61.3, -50.9)])],
-    [Path(
-        [(4, 6), (-2, 4.5), (-8, 4.2), (-13.8, 8), (-18.6, 14), (-18, 22), (-6.9, 35.9), (-5, 36), (11, 37.7), (19, 34),
-         (34, 31.7), (35, 28), (43.7, 12), (52.3, 12.2), (48, 3.53), (40, -4.5), (41.5, -16), (35, -20), (36, -24.5),
-         (33.2, -26), (32.5, -29.5), (27, -34), (20, -34.9), (18.4, -34.4), (17.7, -32.8), (16.9, -29.5), (15.4, -28),
-         (12.7, -19.5), (11.2, -17.5), (13, -10), (8.5, -1), (8.3, 2.2), (4, 6)]),
-        Path([(49.5, -11.5), (51, -16), (47, -26), (43, -25.2), (43, -17), (49.5, -11.5)])],
-    [Path([(-6.9, 35.9), (-5, 36), (11, 37.7), (19, 34), (34, 31.7), (27, 35.5), (25, 40), (29, 41), (36, 45), (40, 49),
-           (33, 53), (28, 58), (27.85, 60.6), (31.5, 62.8), (29, 67), (29, 71.1), (25, 71.3), (13, 69), (12.5, 66.3),
-           (9, 64), (4.3, 62.3), (5.3, 58.5), (8.5, 57.4), (7.8, 56.5), (8.4, 53.9), (4.5, 53.4), (4, 52), (2, 51.2),
-           (1.8, 52.8), (-1.5, 56), (-2, 59.6), (-7.8, 58.4), (-7.8, 55.5), (-11, 54), (-10.5, 51.4), (-6.2, 51.4),
-           (-5, 48), (-1.6, 46), (-1.6, 43.5), (-9.5, 43.9), (-9, 40.6), (-10, 37.5), (-6.9, 35.9)])],
-    [Path([(131, 42.5), (135, 42.7), (139, 46), (144, 45.8), (147.3, 44), (143, 41), (141, 35), (122, 22), (129, 4),
-           (153, -2), (180, -16), (180, -19), (167, -24), (153, -12), (133, -8), (123.2, -11.3), (107, -8), (101, -5),
-           (93.5, 6), (98, 6), (97.5, 15.5), (94, 15.5), (92, 21), (88, 21), (82, 16), (80, 11), (82.2, 7.2),
-           (81.2, 5.4), (76.8, 8), (72, 18.5), (66, 25), (61.5, 25), (57, 16.5), (43.7, 12), (35, 28), (34, 31.7),
-           (27, 35.5), (25, 40), (29, 41), (36, 45), (49, 42), (48, 51), (70, 56), (88, 49), (100, 52), (119, 50),
-           (120, 53.5), (126, 53.5), (128, 50), (132, 48), (134.8, 48.5), (131, 42.5)])],
-    [Path([(36, 45), (49, 42), (48, 51), (70, 56), (88, 49), (100, 52), (119, 50), (120, 53.5), (126, 53.5), (128, 50),
-           (132, 48), (134.8, 48.5), (131, 42.5), (135, 42.7), (139, 46), (144, 45.8), (145, 49), (143, 54.5),
-           (139, 55), (138, 56), (143, 59), (158, 58.5), (154.7, 56.5), (155.8, 51.5), (154, 49), (155, 49),
-           (163.5, 55.7), (163.5, 58.4), (171, 60), (180, 62.5), (180, 69.5), (178, 70), (115, 75), (114, 76.5),
-           (104, 78), (69, 73.5), (55, 69.5), (29, 71.1), (29, 67), (31.5, 62.8), (27.85, 60.6), (28, 58), (33, 53),
-           (40, 49), (36, 45)]), Path(
-        [(-180, 69.5), (-180, 62.5), (-176, 63.6), (-168.3, 62.5), (-168.5, 63.5), (-172.5, 64.3), (-169.3, 66.1),
-         (-171.8, 67), (-180, 69.5)])],
-    [Path([(-180, -65), (180, -65), (180, -90), (-180, -90), (-180, -65)])],
-    [Path([(165, -46), (174, -38.5), (172.2, -33.8), (179.9, -38.2), (168, -48), (165, -46)])],
-    [Path([(115, -36), (112, -23), (130, -10.8), (143, -10.5), (155.5, -27), (148, -45), (131, -33), (115, -36)])]
+# polygons of (longitude, latitude) vertices of each coordinate group
+COORDINATE_GROUP_POLYGONS = [
+    [[(-80.9, 31), (-75.5, 35), (-73, 40), (-50.1, 47.8), (-63, 60.3), (-129, 71.5), (-136.3, 69.4), (-157.6, 71.6),
+      (-166.5, 68.89), (-168.5, 65.8), (-168.5, 63.5), (-168.3, 62.5), (-168, 60), (-158, 57.5), (-172, 52.8),
+      (-180, 52.8), (-180, 51.2), (-166, 52.7), (-153, 56.4), (-147, 60), (-126, 48.5), (-125, 38), (-116, 25),
+      (-84, 7), (-78.2, 7.2), (-76.8, 9), (-83, 11), (-83, 16), (-88, 16.5), (-86, 21.8), (-90, 21.8), (-92, 19),
+      (-95.8, 19), (-97.5, 24), (-96.5, 28.2), (-84, 29.5), (-82, 23.5), (-85, 22.5), (-85, 21.5), (-80, 17.5),
+      (-63.5, 17.5), (-61.5, 14), (-61.9, 11.8), (-59, 13), (-62, 18.8), (-73, 22.6), (-80.9, 31)],
+     [(180, 52.8), (175, 52.8), (166, 55.5), (165.5, 55.1), (174.5, 51.5), (180, 51.2), (180, 52.8)]],
+    [[(-63, 60.3), (-42, 59), (-38, 63), (-13.5, 63), (-9, 81.9), (-31.5, 84), (-60, 82.4), (-65, 83), (-78, 83.3),
+      (-123, 77), (-129, 71.5), (-63, 60.3)]],
+    [[(-76.8, 9), (-75, 11.3), (-70, 13.2), (-60.5, 11), (-58, 7), (-51, 5), (-49, 0), (-33, -5), (-38, -15),
+      (-41, -23), (-48, -26), (-48.5, -29), (-69, -51), (-63, -55), (-68, -56.2), (-75.5, -54), (-76, -46),
+      (-71, -18.5), (-76.5, -14.5), (-83, -4), (-78, 4), (-78.2, 7.2)],
+     [(-61.3, -50.9), (-57.9, -51.3), (-57.55, -51.65), (-59, -52.6), (-60.8, -52.3), (-61.5, -51.8), (-61.3, -50.9)]],
+    [[(4, 6), (-2, 4.5), (-8, 4.2), (-13.8, 8), (-18.6, 14), (-18, 22), (-6.9, 35.9), (-5, 36), (11, 37.7), (19, 34),
+      (34, 31.7), (35, 28), (43.7, 12), (52.3, 12.2), (48, 3.53), (40, -4.5), (41.5, -16), (35, -20), (36, -24.5),
+      (33.2, -26), (32.5, -29.5), (27, -34), (20, -34.9), (18.4, -34.4), (17.7, -32.8), (16.9, -29.5), (15.4, -28),
+      (12.7, -19.5), (11.2, -17.5), (13, -10), (8.5, -1), (8.3, 2.2), (4, 6)],
+     [(49.5, -11.5), (51, -16), (47, -26), (43, -25.2), (43, -17), (49.5, -11.5)]],
+    [[(-6.9, 35.9), (-5, 36), (11, 37.7), (19, 34), (34, 31.7), (27, 35.5), (25, 40), (29, 41), (36, 45), (40, 49),
+      (33, 53), (28, 58), (27.85, 60.6), (31.5, 62.8), (29, 67), (29, 71.1), (25, 71.3), (13, 69), (12.5, 66.3),
+      (9, 64), (4.3, 62.3), (5.3, 58.5), (8.5, 57.4), (7.8, 56.5), (8.4, 53.9), (4.5, 53.4), (4, 52), (2, 51.2),
+      (1.8, 52.8), (-1.5, 56), (-2, 59.6), (-7.8, 58.4), (-7.8, 55.5), (-11, 54), (-10.5, 51.4), (-6.2, 51.4),
+      (-5, 48), (-1.6, 46), (-1.6, 43.5), (-9.5, 43.9), (-9, 40.6), (-10, 37.5), (-6.9, 35.9)]],
+    [[(131, 42.5), (135, 42.7), (139, 46), (144, 45.8), (147.3, 44), (143, 41), (141, 35), (122, 22), (129, 4),
+      (153, -2), (180, -16), (180, -19), (167, -24), (153, -12), (133, -8), (123.2, -11.3), (107, -8), (101, -5),
+      (93.5, 6), (98, 6), (97.5, 15.5), (94, 15.5), (92, 21), (88, 21), (82, 16), (80, 11), (82.2, 7.2), (81.2, 5.4),
+      (76.8, 8), (72, 18.5), (66, 25), (61.5, 25), (57, 16.5), (43.7, 12), (35, 28), (34, 31.7), (27, 35.5), (25, 40),
+      (29, 41), (36, 45), (49, 42), (48, 51), (70, 56), (88, 49), (100, 52), (119, 50), (120, 53.5), (126, 53.5),
+      (128, 50), (132, 48), (134.8, 48.5), (131, 42.5)]],
+    [[(36, 45), (49, 42), (48, 51), (70, 56), (88, 49), (100, 52), (119, 50), (120, 53.5), (126, 53.5), (128, 50),
+      (132, 48), (134.8, 48.5), (131, 42.5), (135, 42.7), (139, 46), (144, 45.8), (145, 49), (143, 54.5), (139, 55),
+      (138, 56), (143, 59), (158, 58.5), (154.7, 56.5), (155.8, 51.5), (154, 49), (155, 49), (163.5, 55.7),
+      (163.5, 58.4), (171, 60), (180, 62.5), (180, 69.5), (178, 70), (115, 75), (114, 76.5), (104, 78), (69, 73.5),
+      (55, 69.5), (29, 71.1), (29, 67), (31.5, 62.8), (27.85, 60.6), (28, 58), (33, 53), (40, 49), (36, 45)],
+     [(-180, 69.5), (-180, 62.5), (-176, 63.6), (-168.3, 62.5), (-168.5, 63.5), (-172.5, 64.3), (-169.3, 66.1),
+      (-171.8, 67), (-180, 69.5)]],
+    [[(-180, -65), (180, -65), (180, -90), (-180, -90), (-180, -65)]],
+    [[(165, -46), (174, -38.5), (172.2, -33.8), (179.9, -38.2), (168, -48), (165, -46)]],
+    [[(115, -36), (112, -23), (130, -10.8), (143, -10.5), (155.5, -27), (148, -45), (131, -33), (115, -36)]]
 ]
 
 TWITTER_URL_SHORTER_REGEX = re.compile(r"http(s)?://t\.co/.*")
@@ -196,33 +176,103 @@ COUNTRY_TIMEZONE = {'AD': 1, 'AE': 4, 'AF': 4.5, 'AG': -4, 'AI': -4, 'AL': 1, 'A
                     'UZ': 5, 'VA': 1, 'VC': -4, 'VE': -4, 'VG': -4, 'VI': -4, 'VN': 7, 'VU': 11, 'WF': 12, 'WS': 13,
                     'YE': 3, 'YT': 3, 'ZA': 2, 'ZM': 2, 'ZW': 2}
 
-# html 5 entities source: https://www.w3.org/2003/entities/2007xml/html5ents.xml
-tree = ET.parse(pathlib.Path(__file__).parent.absolute() / "../data/html5ents.xml")
-root = tree.getroot()
+@functools.lru_cache(maxsize=None)
+def get_emoji_matcher():
+    """
+    :return: EmojiMatcher object, loaded on first use
+    """
+    return load_emoji_matcher()
+
+
+@functools.lru_cache(maxsize=None)
+def get_html_escape_table():
+    """
+    :return: dict of the html 5 entities to the unicode strings, loaded on first use
+    """
+    return load_html_escape_table()
+
+
+@functools.lru_cache(maxsize=None)
+def get_coordinate_group_classifier():
+    """
+    :return: CoordinateGroupClassifier object of the coordinate group polygons, built on first use
+    """
+    return CoordinateGroupClassifier(COORDINATE_GROUP_POLYGONS)
+
+
+@functools.lru_cache(maxsize=None)
+def get_emoji_regex():
+    """
+    Deprecated, the alternation of all emojis is much slower than the EmojiMatcher of get_emoji_matcher
+
+    :return: compiled regex of all emoji sequences, built on first use
+    """
+    return re.compile("|".join(re.escape(e) for e in read_emoji_sequences()), flags=re.UNICODE)
 
-HTML_ESCAPE_TABLE = {}
 
-for item in root[0][1]:
-    unicode = item[1].text.strip()
-    entity = "&" + item[0][0].text.lower()
-    HTML_ESCAPE_TABLE[entity] = unicode
+@functools.lru_cache(maxsize=None)
+def get_coordinate_group_paths():
+    """
+    Deprecated, the coordinate groups are classified with the CoordinateGroupClassifier of
+    get_coordinate_group_classifier
+
+    :return: list of the matplotlib paths of the polygons of each coordinate group, built on first use
+    """
+    from matplotlib.path import Path
+
+    return [[Path(polygon) for polygon in group] for group in COORDINATE_GROUP_POLYGONS]
+
+
+# the tables are loaded on first access of the module attributes
+_LAZY_ATTRIBUTES = {
+    "EMOJI_MATCHER": get_emoji_matcher,
+    "HTML_ESCAPE_TABLE": get_html_escape_table
+}
+
+# attributes of older versions which are still built on access, with the replacement to use instead
+_DEPRECATED_ATTRIBUTES = {
+    "EMOJI_REGEX": (get_emoji_regex, "get_emoji_matcher()"),
+    "COORDINATE_GROUPS": (get_coordinate_group_paths, "get_coordinate_group_classifier()")
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    if name in _DEPRECATED_ATTRIBUTES:
+        get_attribute, replacement = _DEPRECATED_ATTRIBUTES[name]
+        warnings.warn("{} is deprecated, use {} instead".format(name, replacement), DeprecationWarning, stacklevel=2)
+        return get_attribute()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def get_local_time(dt, offset):
     return dt + timedelta(minutes=offset * 60)
 
 
-def get_expanded_url(url, timeout=5):
-    expanded_url = requests.head(url).headers["location"]
+def get_expanded_url(url, timeout=None):
+    """
+    Expand a shortened url with the url resolver of the process, which caches the expanded urls
+
+    :param url: shortened url
+    :param timeout: seconds to wait for the connection and for each response, by default the timeout of the resolver
+
+    :return: expanded url, the url itself if it could not be resolved or is not cached in the cache only mode
+    """
+    from twitter_bot_type_classification.features.urls import get_url_resolver
+
+    return get_url_resolver().resolve(url, timeout=timeout)
+
+
+def get_cached_url(url):
+    """
+    Expand a shortened url with the url cache of the process only, no request is sent. The feature calculation expands
+    the urls which twitter-bot-resolve-urls saved in the cache.
+
+    :param url: shortened url
 
-    if URL_SCHEME.sub("", expanded_url) == URL_SCHEME.sub("", url):
-        try:
-            expanded_url = requests.get(url, timeout=timeout).url
-        except requests.exceptions.ConnectionError as e:
-            expanded_url = e.request.url
-        except requests.exceptions.ReadTimeout as e:
-            expanded_url = e.request.url
-        except requests.exceptions.TooManyRedirects as e:
-            expanded_url = e.request.url
+    :return: expanded url, the url itself if it is not cached
+    """
+    from twitter_bot_type_classification.features.urls import get_url_resolver
 
-    return expanded_url
+    return get_url_resolver().lookup(url)
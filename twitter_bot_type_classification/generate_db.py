@@ -68,6 +68,9 @@ def main():
                                      """))
 
     parser.add_argument("api_keys", nargs=2, help="Twitter API App key and secret")
+    parser.add_argument("--more-api-keys", nargs=2, action="append", metavar=("KEY", "SECRET"),
+                        help="Key and secret of another Twitter API App, can be repeated. The requests are "
+                             "distributed over all Apps", default=[])
     parser.add_argument("-u", "--users", nargs="?", help="Output file for user data")
     parser.add_argument("-t", "--tweets", nargs="?", help="Output file for tweet data")
     parser.add_argument("-l", "--limit", type=int,
@@ -81,6 +84,28 @@ def main():
     parser.add_argument("--csv", action="store_true", help="Store the file as csv file instead sqlite", default=False)
     parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the input file",
                         default=False)
+    parser.add_argument("--async", dest="async_fetch", action="store_true",
+                        help="Fetch with many concurrent requests in one process instead of a worker process for "
+                             "each cpu. Requires aiohttp", default=False)
+    parser.add_argument("--concurrency", type=int,
+                        help="Maximum number of concurrent requests of the async fetch. Default value is 64",
+                        default=64)
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of users or tweets which are saved together in one transaction. Default value "
+                             "is 1000", default=1000)
+    parser.add_argument("--flush-interval", type=float,
+                        help="Maximum seconds fetched users or tweets wait before they are saved. Default value is 5",
+                        default=5)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch the tweets which are newer than the newest saved tweet of each user. Only for "
+                             "sqlite databases and user ids", default=False)
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the unfinished, interrupted and failed jobs of a previous run with the same "
+                             "output files instead of fetching all users of the input file", default=False)
+    parser.add_argument("--history", action="store_true",
+                        help="Save a snapshot of the counts of each fetch of a user or tweet. Users and tweets which "
+                             "are fetched again only update their counts and fetch date. Only for sqlite databases",
+                        default=False)
 
     args = parser.parse_args()
 
@@ -90,22 +115,62 @@ def main():
     if len(args.api_keys) != 2:
         parser.error("ERROR: Twitter API consumer key and secret are required")
 
-    auth = tweepy.AppAuthHandler(args.api_keys[0], args.api_keys[1])
+    if args.concurrency < 1:
+        parser.error("ERROR: The concurrency has to be greater than 0.")
+
+    if args.batch_size < 1:
+        parser.error("ERROR: The batch size has to be greater than 0.")
+
+    if args.flush_interval <= 0:
+        parser.error("ERROR: The flush interval has to be greater than 0.")
 
-    api = tweepy.API(auth, wait_on_rate_limit=True, wait_on_rate_limit_notify=True)
+    if args.incremental and (args.csv or args.usernames):
+        parser.error("ERROR: The incremental fetch requires a sqlite database and user ids.")
+
+    if args.history and args.csv:
+        parser.error("ERROR: The history can only be saved in sqlite databases.")
 
     users = load_csv_file(args.file, args.skip_header)
 
+    api_keys = [args.api_keys] + args.more_api_keys
+
+    if args.async_fetch:
+        from twitter_bot_type_classification.dataset.async_generation import AsyncDatasetGenerator, \
+            request_bearer_token
+
+        generator = AsyncDatasetGenerator([request_bearer_token(key, secret) for key, secret in api_keys],
+                                          concurrency=args.concurrency, batch_size=args.batch_size,
+                                          flush_interval=args.flush_interval, keep_history=args.history)
+
+        if args.users is not None:
+            print("Fetch users...")
+            generator.get_users(users, filename=args.users, is_username=args.usernames, sqlite=not args.csv,
+                                resume=args.resume)
+
+        if args.tweets is not None:
+            print("Fetch tweets...")
+            generator.get_tweets_of_users(users, filename=args.tweets, limit=args.limit, is_username=args.usernames,
+                                          sqlite=not args.csv, incremental=args.incremental, resume=args.resume)
+        return
+
+    # each worker waits on the rate limit of the App of its current task only
+    api = [tweepy.API(tweepy.AppAuthHandler(key, secret), wait_on_rate_limit=True, wait_on_rate_limit_notify=True)
+           for key, secret in api_keys]
+
     if args.users is not None:
         print("Fetch users...")
-        user_dataset_generator = UserDatasetGenerator(api)
-        user_dataset_generator.get_users(users, filename=args.users, is_username=args.usernames, sqlite=not args.csv)
+        user_dataset_generator = UserDatasetGenerator(api, batch_size=args.batch_size,
+                                                      flush_interval=args.flush_interval, keep_history=args.history)
+        user_dataset_generator.get_users(users, filename=args.users, is_username=args.usernames, sqlite=not args.csv,
+                                         resume=args.resume)
 
     if args.tweets is not None:
         print("Fetch tweets...")
-        tweet_dataset_generator = TweetDatasetGenerator(api)
+        tweet_dataset_generator = TweetDatasetGenerator(api, batch_size=args.batch_size,
+                                                        flush_interval=args.flush_interval, keep_history=args.history)
         tweet_dataset_generator.get_tweets_of_users(users, filename=args.tweets, limit=args.limit,
-                                                    is_username=args.usernames, sqlite=not args.csv)
+                                                    is_username=args.usernames, sqlite=not args.csv,
+                                                    incremental=args.incremental, resume=args.resume)
 
 
 if __name__ == "__main__":
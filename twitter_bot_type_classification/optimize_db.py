@@ -0,0 +1,41 @@
+import argparse
+import textwrap
+
+from twitter_bot_type_classification.dataset import schema
+from twitter_bot_type_classification.dataset.db import SqliteTweetDB, SqliteUserDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate and optimize sqlite tweet and user databases.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=textwrap.dedent("""\
+                                     Run this command only when no other process is writing to the databases.
+                                     
+                                     License:
+                                        MIT - Copyright (c) 2020 Marvin Heptner
+                                     """))
+
+    parser.add_argument("-u", "--users", nargs="*", help="User databases to optimize", default=[])
+    parser.add_argument("-t", "--tweets", nargs="*", help="Tweet databases to optimize", default=[])
+    parser.add_argument("--skip-vacuum", action="store_true",
+                        help="Only update the query planner statistics and do not rebuild the database file",
+                        default=False)
+
+    args = parser.parse_args()
+
+    if not args.users and not args.tweets:
+        parser.error("ERROR: No user or tweets database provided.")
+
+    # opening the databases applies all pending schema migrations
+    dbs = [SqliteUserDB(filename) for filename in args.users] + [SqliteTweetDB(filename) for filename in args.tweets]
+
+    for filename, db in zip(args.users + args.tweets, dbs):
+        print("Optimize {}...".format(filename))
+        schema.optimize(db.conn, vacuum=not args.skip_vacuum)
+        db.conn.close()
+
+    print("Optimization finished")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import textwrap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expand the shortened urls of a user and tweet dataset concurrently "
+                                                 "and save them in an url cache file. The feature calculation reads "
+                                                 "the expanded urls with --url-cache without sending any "
+                                                 "requests.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=textwrap.dedent("""\
+                                     License:
+                                        MIT - Copyright (c) 2020 Marvin Heptner
+                                     """))
+
+    parser.add_argument("-u", "--users", help="Input file of user data, the Twitter profile urls are expanded")
+    parser.add_argument("-t", "--tweets",
+                        help="Input file of tweet data, the urls of other url shorteners are expanded")
+    parser.add_argument("-c", "--cache", help="Sqlite file of the url cache, already cached urls are not resolved "
+                                              "again until they expire", required=True)
+    parser.add_argument("-w", "--worker", type=int, help="Number of threads which resolve the urls. Default is 16",
+                        default=16)
+    parser.add_argument("--max-per-host", type=int,
+                        help="Maximum number of concurrent requests to one host. Default is 4", default=4)
+    parser.add_argument("--timeout", type=float,
+                        help="Seconds to wait for the connection and for each response. Default is 5", default=5)
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of urls which are resolved and saved together. Default is 1000", default=1000)
+    parser.add_argument("--csv", action="store_true",
+                        help="The provided input files are csv files. Default is sqlite database", default=False)
+    parser.add_argument("--parquet", action="store_true",
+                        help="The provided inputs are parquet dataset directories. Default is sqlite database",
+                        default=False)
+    parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the csv input file",
+                        default=False)
+
+    args = parser.parse_args()
+
+    if not args.users and not args.tweets:
+        parser.error("ERROR: No user or tweets file provided.")
+
+    if args.csv and args.parquet:
+        parser.error("ERROR: The input files can't be csv files and parquet datasets at the same time.")
+
+    if args.worker < 1:
+        parser.error("ERROR: The number of worker has to be greater than 0.")
+
+    if args.max_per_host < 1:
+        parser.error("ERROR: The maximum number of requests per host has to be greater than 0.")
+
+    if args.timeout <= 0:
+        parser.error("ERROR: The timeout has to be greater than 0.")
+
+    if args.batch_size < 1:
+        parser.error("ERROR: The batch size has to be greater than 0.")
+
+    from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, SqliteTweetDB, SqliteUserDB
+    from twitter_bot_type_classification.dataset.parquet import ParquetTweetDB, ParquetUserDB
+    from twitter_bot_type_classification.features.urls import UrlCache, UrlResolver, iter_shortened_urls
+
+    if args.csv:
+        # the tweets are read grouped by user, which needs the offset index of fast_read
+        tweet_db = None if args.tweets is None else CsvTweetDB(args.tweets, skip_header=args.skip_header,
+                                                               fast_read=True)
+        user_db = None if args.users is None else CsvUserDB(args.users, skip_header=args.skip_header)
+    elif args.parquet:
+        tweet_db = None if args.tweets is None else ParquetTweetDB(args.tweets)
+        user_db = None if args.users is None else ParquetUserDB(args.users)
+    else:
+        tweet_db = None if args.tweets is None else SqliteTweetDB(args.tweets)
+        user_db = None if args.users is None else SqliteUserDB(args.users)
+
+    urls = list(dict.fromkeys(iter_shortened_urls(user_db, tweet_db)))
+
+    cache = UrlCache(args.cache)
+    resolver = UrlResolver(cache, timeout=args.timeout, max_workers=args.worker, max_per_host=args.max_per_host)
+
+    cached = 0
+    failed = 0
+    for start in range(0, len(urls), args.batch_size):
+        batch = urls[start:start + args.batch_size]
+        cached += len(cache.get_many(batch))
+
+        resolver.resolve_many(batch)
+        failed += sum(status is None for _, status in cache.get_many(batch).values())
+
+        print("\rResolved: {}/{}".format(start + len(batch), len(urls)), end="", flush=True)
+
+    resolver.close()
+
+    print("\n{} shortened urls found, {} were already cached, {} could not be resolved".format(len(urls), cached,
+                                                                                              failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from twitter_bot_type_classification.dataset import async_generation
+from twitter_bot_type_classification.dataset.async_generation import AsyncDatasetGenerator, CredentialPool, \
+    RateLimitWindow
+from twitter_bot_type_classification.dataset.db import SqliteTweetDB, SqliteUserDB
+from twitter_bot_type_classification.dataset.generation import TimelinePaginator
+from twitter_bot_type_classification.dataset.jobs import JOB_QUEUE_SUFFIX, JobQueue, JobState
+from twitter_bot_type_classification.tests.helpers import FakeClock
+
+
+class FakeResponse:
+
+    def __init__(self, status, data=None, headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return str(self.data)
+
+
+class FakeSession:
+    """
+    Answers the requests with the handler, which gets the endpoint and the query parameters
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.tokens = []
+        self.closed = False
+
+    def get(self, url, params=None, headers=None):
+        endpoint = url[len(async_generation.API_URL):-len(".json")]
+        self.requests.append((endpoint, params))
+        self.tokens.append(headers["Authorization"][len("Bearer "):])
+        return self.handler(endpoint, params)
+
+    async def close(self):
+        self.closed = True
+
+
+def create_tweet_json(tweet_id, user_id):
+    return {"id": tweet_id, "user": {"id": user_id}, "created_at": "Sat Jan 01 00:00:00 +0000 2000",
+            "full_text": "This is just a simple tweet text.", "entities": {"urls": []}, "place": None,
+            "in_reply_to_status_id": None, "in_reply_to_user_id": None, "retweet_count": 2, "favorite_count": 3,
+            "lang": "en", "source": "Twitter Web App"}
+
+
+def create_user_json(user_id):
+    return {"id": user_id, "name": "Test Name", "screen_name": "user{}".format(user_id), "location": "", "url": None,
+            "description": "", "protected": False, "verified": False, "followers_count": 1, "friends_count": 2,
+            "listed_count": 3, "favourites_count": 4, "statuses_count": 5,
+            "created_at": "Sat Jan 01 00:00:00 +0000 2000", "profile_image_url_https": "https://example.com/img.png",
+            "default_profile": False, "default_profile_image": False}
+
+
+def timeline_handler(n_tweets):
+    """
+    :return: handler of user timelines with n_tweets tweets of each user, the tweet ids of user u are u * 1000 + i
+    """
+
+    def handler(endpoint, params):
+        user_id = int(params["user_id"])
+        if user_id == 0:
+            return FakeResponse(401)
+
+        max_id = int(params.get("max_id", user_id * 1000 + n_tweets))
+        since_id = int(params.get("since_id", 0))
+        ids = [i for i in range(user_id * 1000 + n_tweets, user_id * 1000, -1) if since_id < i <= max_id]
+        return FakeResponse(200, [create_tweet_json(i, user_id) for i in ids[:int(params["count"])]])
+
+    return handler
+
+
+class RateLimitWindowTests(unittest.TestCase):
+
+    def test_acquire(self):
+        clock = FakeClock(1000.0)
+        window = RateLimitWindow(2, window=100, clock=clock)
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += seconds
+
+        async def acquire_three():
+            for _ in range(3):
+                await window.acquire()
+
+        with mock.patch.object(async_generation.asyncio, "sleep", sleep):
+            asyncio.run(acquire_three())
+
+        # the third request waits for the next window
+        self.assertEqual(sleeps, [100])
+        self.assertEqual(window.remaining, 1)
+        self.assertEqual(window.reset, 1200)
+
+    def test_update(self):
+        clock = FakeClock(1000.0)
+        window = RateLimitWindow(10, window=100, clock=clock)
+        asyncio.run(window.acquire())
+
+        window.update({"x-rate-limit-remaining": "5", "x-rate-limit-reset": "1050"})
+        self.assertEqual((window.remaining, window.reset), (5, 1050))
+
+        # a response of an ended window is ignored
+        window.update({"x-rate-limit-remaining": "0", "x-rate-limit-reset": "900"})
+        self.assertEqual((window.remaining, window.reset), (5, 1050))
+
+        # requests in flight are not counted by the response of the same window
+        window.update({"x-rate-limit-remaining": "7", "x-rate-limit-reset": "1050"})
+        self.assertEqual(window.remaining, 5)
+
+        window.update({"x-rate-limit-remaining": "8", "x-rate-limit-reset": "1150"})
+        self.assertEqual((window.remaining, window.reset), (8, 1150))
+
+        window.exhaust({"x-rate-limit-reset": "1200"})
+        self.assertEqual((window.remaining, window.reset), (0, 1200))
+
+    def test_unknown_reset(self):
+        clock = FakeClock(1000.0)
+        window = RateLimitWindow(10, window=100, clock=clock)
+
+        # the window ended while the request was in flight and the response has no reset time
+        window.update({"x-rate-limit-remaining": "0"})
+        self.assertEqual(window.get_wait_time(), 100)
+        self.assertFalse(window.try_acquire())
+
+        clock.now += 100
+        self.assertEqual(window.get_wait_time(), 0)
+        self.assertTrue(window.try_acquire())
+
+
+class CredentialPoolTests(unittest.TestCase):
+
+    def test_acquire(self):
+        clock = FakeClock(1000.0)
+        pool = CredentialPool(["a", "b"], limits={"users/lookup": 2}, window=100, clock=clock)
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += seconds
+
+        async def acquire(n):
+            return [await pool.acquire("users/lookup") for _ in range(n)]
+
+        with mock.patch.object(async_generation.asyncio, "sleep", sleep):
+            self.assertEqual(asyncio.run(acquire(4)), ["a", "b", "a", "b"])
+
+            # the window of b resets first
+            pool.update("b", "users/lookup", {"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1050"})
+            self.assertEqual(asyncio.run(acquire(1)), ["b"])
+            self.assertEqual(sleeps, [50])
+
+            pool.exhaust("b", "users/lookup", {"x-rate-limit-reset": "1200"})
+            self.assertEqual(asyncio.run(acquire(1)), ["a"])
+            self.assertEqual(sleeps, [50, 50])
+
+
+class AsyncDatasetGeneratorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_generator(self, session, **kwargs):
+        return AsyncDatasetGenerator("token", session_factory=lambda: session, **kwargs)
+
+    def test_fetch_tweets_paginator(self):
+        session = FakeSession(timeline_handler(450))
+        generator = self.create_generator(session)
+
+        # the paging itself is tested with the TimelinePaginator of the TweetDatasetGenerator
+        paginator = TimelinePaginator(1, limit=300)
+        paginator.max_id = 1250
+        paginator.fetched = 200
+
+        tweets = asyncio.run(generator.fetch_tweets_for_user(session, paginator=paginator))
+
+        self.assertEqual([t["id"] for t in tweets], list(range(1250, 1150, -1)))
+        self.assertEqual(session.requests[0][1], {"user_id": "1", "count": "100", "trim_user": "true",
+                                                  "tweet_mode": "extended", "max_id": "1250"})
+        self.assertTrue(paginator.finished)
+
+        session.requests.clear()
+        tweets = asyncio.run(generator.fetch_tweets_for_user(session, 1, limit=-1))
+
+        self.assertEqual(len(tweets), 450)
+        self.assertEqual([p.get("max_id") for _, p in session.requests], [None, "1250", "1050", "1000"])
+
+    def test_request_retries(self):
+        responses = [FakeResponse(503), FakeResponse(429, headers={"x-rate-limit-reset": "0"}), FakeResponse(200, [])]
+        session = FakeSession(lambda endpoint, params: responses.pop(0))
+        generator = self.create_generator(session, retries=1)
+
+        async def sleep(seconds):
+            pass
+
+        with mock.patch.object(async_generation.asyncio, "sleep", sleep):
+            self.assertEqual(asyncio.run(generator.request(session, "users/lookup", {"user_id": "1"})), [])
+            # the rate limited request does not use a retry
+            self.assertEqual(len(session.requests), 3)
+
+            responses.extend([FakeResponse(500), FakeResponse(500)])
+            with self.assertRaises(ConnectionError):
+                asyncio.run(generator.request(session, "users/lookup", {"user_id": "1"}))
+
+        self.assertEqual(responses, [])
+
+    def test_credentials(self):
+        responses = [FakeResponse(429, headers={"x-rate-limit-reset": str(int(time.time()) + 900)}),
+                     FakeResponse(200, [])]
+        session = FakeSession(lambda endpoint, params: responses.pop(0))
+        generator = AsyncDatasetGenerator(["a", "b"], session_factory=lambda: session)
+
+        self.assertEqual(asyncio.run(generator.request(session, "users/lookup", {"user_id": "1"})), [])
+        # the rate limited request is sent again with the other credential without waiting
+        self.assertEqual(session.tokens, ["a", "b"])
+
+    def test_get_tweets_of_users(self):
+        session = FakeSession(timeline_handler(3))
+        generator = self.create_generator(session, concurrency=2, batch_size=4)
+        filename = os.path.join(self.tmp_dir.name, "tweets.db")
+
+        generator.get_tweets_of_users([1, 0, 2], filename=filename, limit=5)
+
+        tweets = SqliteTweetDB(filename).get_tweets_grouped_by_user()
+        self.assertEqual({user_id: sorted(t.id for t in tweets) for user_id, tweets in tweets},
+                         {1: [1001, 1002, 1003], 2: [2001, 2002, 2003]})
+        self.assertTrue(session.closed)
+
+    def test_get_tweets_of_users_incremental(self):
+        filename = os.path.join(self.tmp_dir.name, "tweets.db")
+        self.create_generator(FakeSession(timeline_handler(3))).get_tweets_of_users([1], filename=filename, limit=5)
+
+        session = FakeSession(timeline_handler(6))
+        self.create_generator(session).get_tweets_of_users(["1", "2"], filename=filename, limit=5, incremental=True)
+
+        # the second request of user 1 is the empty page after the new tweets
+        self.assertEqual([p.get("since_id") for _, p in session.requests], ["1003", "1003", None])
+        tweets = SqliteTweetDB(filename).get_tweets_grouped_by_user()
+        self.assertEqual({user_id: sorted(t.id for t in tweets) for user_id, tweets in tweets},
+                         {1: list(range(1001, 1007)), 2: list(range(2002, 2007))})
+
+    def test_get_tweets_of_users_resume(self):
+        def handler(endpoint, params):
+            if params["user_id"] == "2":
+                return FakeResponse(400, "Bad request")
+            return timeline_handler(3)(endpoint, params)
+
+        filename = os.path.join(self.tmp_dir.name, "tweets.db")
+        self.create_generator(FakeSession(handler)).get_tweets_of_users(["1", "2", "3"], filename=filename, limit=5)
+
+        # only the failed job is fetched again
+        session = FakeSession(timeline_handler(3))
+        self.create_generator(session).get_tweets_of_users(["1", "2", "3"], filename=filename, limit=5, resume=True)
+
+        self.assertEqual({p["user_id"] for _, p in session.requests}, {"2"})
+        tweets = SqliteTweetDB(filename).get_tweets_grouped_by_user()
+        self.assertEqual({user_id: len(tweets) for user_id, tweets in tweets}, {1: 3, 2: 3, 3: 3})
+
+    def test_get_tweets_of_users_resume_after_retries(self):
+        handler = timeline_handler(450)
+
+        def failing_handler(endpoint, params):
+            # the second page of user 1 fails with all retries
+            if params["user_id"] == "1" and "max_id" in params:
+                return FakeResponse(503)
+            return handler(endpoint, params)
+
+        filename = os.path.join(self.tmp_dir.name, "tweets.db")
+        generator = self.create_generator(FakeSession(failing_handler), retries=1)
+        with mock.patch.object(async_generation.asyncio, "sleep", mock.AsyncMock()):
+            generator.get_tweets_of_users(["1", "2"], filename=filename, limit=300)
+
+        jobs = JobQueue(filename + JOB_QUEUE_SUFFIX)
+        self.assertEqual(jobs.get_counts()[JobState.FAILED], 1)
+        jobs.close()
+
+        # the failed job continues below the saved tweets
+        session = FakeSession(handler)
+        self.create_generator(session).get_tweets_of_users(["1", "2"], filename=filename, limit=300, resume=True)
+
+        self.assertEqual([(p["user_id"], p["count"], p["max_id"]) for _, p in session.requests], [("1", "100", "1250")])
+        tweets = SqliteTweetDB(filename).get_tweets_grouped_by_user()
+        self.assertEqual({user_id: len(tweets) for user_id, tweets in tweets}, {1: 300, 2: 300})
+
+    def test_get_users(self):
+        def handler(endpoint, params):
+            ids = [int(i) for i in params["user_id"].split(",")]
+            return FakeResponse(200, [create_user_json(i) for i in ids if i % 2 == 0])
+
+        session = FakeSession(handler)
+        generator = self.create_generator(session)
+        filename = os.path.join(self.tmp_dir.name, "users.db")
+
+        generator.get_users(list(range(1, 151)), filename=filename)
+
+        self.assertEqual([len(p["user_id"].split(",")) for _, p in session.requests], [100, 50])
+        self.assertEqual(SqliteUserDB(filename).get_user_ids(), list(range(2, 151, 2)))
+
+    def test_rows_saved_in_writer_thread(self):
+        threads = []
+
+        class ThreadDB:
+            def add_many(self, rows):
+                threads.append(threading.current_thread())
+
+        async def fetch_rows(session, n):
+            threads.append(threading.current_thread())
+            return list(range(n)), None, False
+
+        generator = self.create_generator(FakeSession(None), batch_size=2)
+        asyncio.run(generator.__run__([(None, (2,), 2), (None, (1,), 1)], fetch_rows, ThreadDB, 3))
+
+        # both jobs are fetched in the thread of the event loop, the rows of the full batch and the last row are saved
+        # in the writer thread
+        self.assertEqual(len(threads), 4)
+        self.assertIs(threads[0], threads[1])
+        self.assertIsNot(threads[2], threads[0])
+        self.assertIs(threads[3], threads[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import Queue, Lock
+
+import numpy as np
+
+from twitter_bot_type_classification.features.calculation import SharedFeatureBlock, N_USER_FEATURES, \
+    split_user_id_ranges, SaveWorker, contains_sorted
+from twitter_bot_type_classification.features.output import FeatureShardReader
+
+
+class CalculationTests(unittest.TestCase):
+
+    def test_split_user_id_ranges(self):
+        self.assertEqual(split_user_id_ranges([1, 4, 5, 9, 12], 2), [(1, 5), (5, 10), (12, 13)])
+        self.assertEqual(split_user_id_ranges([], 2), [])
+
+    def test_contains_sorted(self):
+        values = np.array([2, 5, 9])
+
+        self.assertTrue(contains_sorted(values, 5))
+        self.assertFalse(contains_sorted(values, 4))
+        self.assertFalse(contains_sorted(values, 10))
+
+    def test_shared_feature_block(self):
+        features = np.random.rand(3, N_USER_FEATURES).astype(np.float32)
+
+        block = SharedFeatureBlock.create([7, 8, 9], list(features))
+        user_ids, block_features = block.read()
+
+        self.assertEqual(list(user_ids), [7, 8, 9])
+        np.testing.assert_array_equal(block_features, features)
+
+    def test_shared_feature_block_empty(self):
+        user_ids, features = SharedFeatureBlock.create([], []).read()
+
+        self.assertEqual(len(user_ids), 0)
+        self.assertEqual(features.shape, (0, N_USER_FEATURES))
+
+    def test_save_worker_shards(self):
+        features = np.random.rand(3, N_USER_FEATURES).astype(np.float32)
+        results_q = Queue()
+        results_q.put((1, features[0]))
+        results_q.put(SharedFeatureBlock.create([2, 3], list(features[1:])))
+        results_q.put(None)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "features")
+            SaveWorker(results_q, path, 1, Lock(), shard_size=2).run()
+
+            reader = FeatureShardReader(path)
+            saved_features, ids = reader.load()
+
+            self.assertEqual(len(list(reader.iter_shards())), 2)
+
+        self.assertEqual(list(ids), [1, 2, 3])
+        np.testing.assert_array_equal(saved_features, features)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,421 @@
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from twitter_bot_type_classification.dataset import schema
+from twitter_bot_type_classification.dataset.db import SqliteTweetDB, SqliteUserDB, CsvTweetDB, CSV_INDEX_SUFFIX, \
+    BufferedWriter, deduplicate_csv
+from twitter_bot_type_classification.dataset.generation import FetchTask, SaveWorker
+from twitter_bot_type_classification.dataset.parquet import ParquetTweetDB, ParquetUserDB, convert_db, pa, \
+    TWEET_FEATURE_COLUMNS
+from twitter_bot_type_classification.features.calculation import iter_users_with_tweets
+from twitter_bot_type_classification.tests.helpers import FakeClock
+
+
+def create_tweet_row(tweet_id, user_id, text="This is just a simple tweet text."):
+    return [tweet_id, user_id, "2000-01-01 00:00:00", text, None, None, None, None, None, None, None, None, 2, 3, "en",
+            False, None, "{}", 0, 0, 0, "Twitter Web App", "2000-01-01 23:59:59"]
+
+
+def create_user_row(user_id):
+    return [user_id, "Test Name", "test_username", "Test Location", None, "",
+            "This is a simple profile description with no meaning.", False, False, 123, 567, 8910, 111213, 141516,
+            "2000-01-01 00:00:00", "http://t.co/profile_img", False, False, None, "2000-01-01 23:59:59"]
+
+
+class SqliteDBTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tweet_db = SqliteTweetDB(os.path.join(self.tmp_dir.name, "tweets.db"))
+        self.user_db = SqliteUserDB(os.path.join(self.tmp_dir.name, "users.db"))
+
+    def tearDown(self):
+        self.tweet_db.conn.close()
+        self.user_db.conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_get_tweets_grouped_by_user(self):
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 10), create_tweet_row(3, 20),
+                                create_tweet_row(4, 10)])
+
+        groups = [(user_id, [t.id for t in tweets]) for user_id, tweets in
+                  self.tweet_db.get_tweets_grouped_by_user()]
+
+        self.assertEqual(groups, [(10, [4, 2]), (20, [3, 1])])
+
+    def test_get_tweets_grouped_by_user_empty(self):
+        self.assertEqual(list(self.tweet_db.get_tweets_grouped_by_user()), [])
+
+    def test_iter_users_with_tweets(self):
+        self.user_db.add_many([create_user_row(30), create_user_row(10), create_user_row(20)])
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 5), create_tweet_row(3, 20),
+                                create_tweet_row(4, 10), create_tweet_row(5, 40)])
+
+        users_with_tweets = [(u.id, [t.id for t in tweets]) for u, tweets in
+                             iter_users_with_tweets(self.user_db, self.tweet_db)]
+
+        self.assertEqual(sorted(users_with_tweets), [(10, [4]), (20, [3, 1]), (30, [])])
+
+    def test_iter_users_with_tweets_range(self):
+        self.user_db.add_many([create_user_row(30), create_user_row(10), create_user_row(20)])
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 5), create_tweet_row(3, 20),
+                                create_tweet_row(4, 10), create_tweet_row(5, 30)])
+
+        users_with_tweets = [(u.id, [t.id for t in tweets]) for u, tweets in
+                             iter_users_with_tweets(self.user_db, self.tweet_db, (10, 30))]
+
+        self.assertEqual(self.user_db.get_user_ids(), [10, 20, 30])
+        self.assertEqual(sorted(users_with_tweets), [(10, [4]), (20, [3, 1])])
+
+    def test_schema_version(self):
+        self.assertEqual(schema.get_schema_version(self.tweet_db.conn), len(schema.TWEET_MIGRATIONS))
+        self.assertEqual(schema.get_schema_version(self.user_db.conn), len(schema.USER_MIGRATIONS))
+
+    def test_indexes(self):
+        tweet_indexes = {r[0] for r in self.tweet_db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        user_indexes = {r[0] for r in self.user_db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+        self.assertIn("tweet_user_id_idx", tweet_indexes)
+        self.assertIn("tweet_created_at_idx", tweet_indexes)
+        self.assertIn("user_screen_name_idx", user_indexes)
+
+    def test_get_tweets_for_user_uses_index(self):
+        plan = self.tweet_db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM tweet WHERE user_id == ? ORDER BY id DESC", (1,)).fetchall()
+
+        self.assertTrue(any("tweet_user_id_idx" in r[-1] for r in plan))
+
+    def test_get_max_tweet_ids(self):
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(5, 10), create_tweet_row(3, 20),
+                                create_tweet_row(2, 10)])
+
+        self.assertEqual(self.tweet_db.get_max_tweet_ids(["10", 20, 30]), {10: 5, 20: 3})
+
+        plan = self.tweet_db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT user_id, max(id) FROM tweet WHERE user_id IN (?, ?) GROUP BY user_id",
+            (1, 2)).fetchall()
+        self.assertTrue(any("tweet_user_id_idx" in r[-1] for r in plan))
+
+    def test_wal_mode(self):
+        self.assertEqual(self.tweet_db.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_migrate_existing_db(self):
+        """
+        database created before the schema versioning was introduced
+        """
+        filename = os.path.join(self.tmp_dir.name, "old_tweets.db")
+        conn = sqlite3.connect(filename)
+        for statement in schema.TWEET_MIGRATIONS[0]:
+            conn.execute(statement)
+        conn.execute("INSERT INTO tweet (id, user_id) VALUES (1, 2)")
+        conn.commit()
+        conn.close()
+
+        tweet_db = SqliteTweetDB(filename)
+
+        self.assertEqual(schema.get_schema_version(tweet_db.conn), len(schema.TWEET_MIGRATIONS))
+        self.assertEqual(tweet_db.conn.execute("SELECT count(*) FROM tweet").fetchone()[0], 1)
+        tweet_db.conn.close()
+
+    def test_optimize(self):
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 10)])
+
+        schema.optimize(self.tweet_db.conn)
+
+        self.assertEqual(self.tweet_db.conn.execute("SELECT count(*) FROM tweet").fetchone()[0], 2)
+        self.assertTrue(schema.table_exists(self.tweet_db.conn, "sqlite_stat1"))
+
+    def test_add_many_updates_volatile_columns(self):
+        self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 10)])
+
+        refetched = create_tweet_row(2, 10, "Fetched again")
+        refetched[12:14] = [20, 30]
+        refetched[-1] = "2000-01-02 23:59:59"
+        self.tweet_db.add_many([refetched, create_tweet_row(3, 10)])
+
+        user = create_user_row(10)
+        self.user_db.add(user)
+        user[9] = 124
+        self.user_db.add(user)
+
+        tweets = self.tweet_db.get_tweets_for_user(10)
+        self.assertEqual([(t.id, t.text, t.retweet_count, t.favorite_count) for t in tweets],
+                         [(3, "This is just a simple tweet text.", 2, 3),
+                          (2, "This is just a simple tweet text.", 20, 30)])
+        self.assertEqual(tweets[1].fetch_date, datetime(2000, 1, 2, 23, 59, 59))
+        self.assertEqual([u.followers_count for u in self.user_db.get_all_user()], [124])
+        self.assertEqual(self.tweet_db.get_history(2), [])
+
+    def test_history(self):
+        tweet_db = SqliteTweetDB(os.path.join(self.tmp_dir.name, "tweet_history.db"), keep_history=True)
+        tweet_db.add_many([create_tweet_row(1, 10)])
+        tweet_db.add_many([create_tweet_row(1, 10)])
+
+        refetched = create_tweet_row(1, 10)
+        refetched[12] = 5
+        refetched[-1] = "2000-01-02 23:59:59"
+        tweet_db.add(refetched)
+
+        # the same fetch is only saved once
+        self.assertEqual(tweet_db.get_history(1), [(1, 2, 3, "2000-01-01 23:59:59"), (1, 5, 3, "2000-01-02 23:59:59")])
+        tweet_db.conn.close()
+
+        user_db = SqliteUserDB(os.path.join(self.tmp_dir.name, "user_history.db"), keep_history=True)
+        user_db.add(create_user_row(10))
+        self.assertEqual(user_db.get_history(10), [(10, 123, 567, 8910, 111213, 141516, "2000-01-01 23:59:59")])
+        user_db.conn.close()
+
+    def test_add_many_one_transaction(self):
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 10)[:-1]])
+
+        # the first tweet is rolled back together with the invalid one
+        self.assertEqual(self.tweet_db.conn.execute("SELECT count(*) FROM tweet").fetchone()[0], 0)
+
+
+class ListDB:
+
+    def __init__(self):
+        self.batches = []
+
+    def add_many(self, rows):
+        self.batches.append(list(rows))
+
+
+class BufferedWriterTests(unittest.TestCase):
+
+    def test_batch_size(self):
+        db = ListDB()
+        writer = BufferedWriter(db, batch_size=3, flush_interval=None)
+
+        self.assertEqual(writer.add_many([1, 2]), 0)
+        self.assertEqual(writer.add_many([]), 0)
+        self.assertEqual(writer.add_many([3, 4]), 4)
+        self.assertEqual(writer.add_many([5]), 0)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(writer.flush(), 0)
+
+        self.assertEqual(db.batches, [[1, 2, 3, 4], [5]])
+
+    def test_flush_interval(self):
+        db = ListDB()
+        clock = FakeClock()
+        writer = BufferedWriter(db, batch_size=100, flush_interval=5, clock=clock)
+
+        writer.add_many([1])
+        clock.now = 3
+        self.assertFalse(writer.is_due())
+        self.assertEqual(writer.add_many([2]), 0)
+
+        # the interval starts with the oldest buffered row
+        clock.now = 5
+        self.assertTrue(writer.is_due())
+        self.assertEqual(writer.add_many([3]), 3)
+        self.assertFalse(writer.is_due())
+
+        self.assertEqual(db.batches, [[1, 2, 3]])
+
+    def test_save_worker(self):
+        db = ListDB()
+        task_q = queue.Queue()
+        worker = SaveWorker(task_q, db, 1, 6, threading.Lock(), batch_size=4, flush_interval=0.01)
+
+        for results in [[1, 2], [3]]:
+            task = FetchTask(None, None, 2)
+            task.result = results
+            task_q.put(task)
+
+        thread = threading.Thread(target=worker.run)
+        thread.start()
+
+        # the buffered rows are saved after the flush interval without another task
+        thread.join(0.5)
+        self.assertEqual(db.batches, [[1, 2, 3]])
+
+        task = FetchTask(None, None, 2)
+        task.result = [4]
+        task_q.put(task)
+        task_q.put(None)
+        thread.join()
+
+        self.assertEqual(db.batches, [[1, 2, 3], [4]])
+
+
+class CsvTweetDBTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "tweets.csv")
+
+        CsvTweetDB(self.filename).add_many([create_tweet_row(1, 20), create_tweet_row(2, 10, "First line\nsecond line"),
+                                            create_tweet_row(3, 20, "Quoted \"text\",\nwith comma")])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fast_read_get_tweets_for_user(self):
+        tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+
+        self.assertEqual([t.id for t in tweet_db.get_tweets_for_user(20)], [1, 3])
+        self.assertEqual([t.id for t in tweet_db.get_tweets_for_user("10")], [2])
+        self.assertEqual(tweet_db.get_tweets_for_user(30), [])
+
+    def test_fast_read_multiline_text(self):
+        tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+
+        self.assertEqual(tweet_db.get_tweets_for_user(10)[0].text, "First line\nsecond line")
+        self.assertEqual(tweet_db.get_tweets_for_user(20)[1].text, "Quoted \"text\",\nwith comma")
+
+    def test_fast_read_equals_full_scan(self):
+        fast_tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+        tweet_db = CsvTweetDB(self.filename, skip_header=True)
+
+        for user_id in [10, 20]:
+            self.assertEqual([(t.id, t.text) for t in fast_tweet_db.get_tweets_for_user(user_id)],
+                             [(t.id, t.text) for t in tweet_db.get_tweets_for_user(user_id)])
+
+    def test_index_file_reused(self):
+        CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+        index_mtime = os.stat(self.filename + CSV_INDEX_SUFFIX).st_mtime_ns
+
+        tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+
+        self.assertEqual(os.stat(self.filename + CSV_INDEX_SUFFIX).st_mtime_ns, index_mtime)
+        self.assertEqual([t.id for t in tweet_db.get_tweets_for_user(20)], [1, 3])
+
+    def test_index_invalidated_after_append(self):
+        tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+        tweet_db.get_tweets_for_user(20)
+
+        tweet_db.add(create_tweet_row(4, 20))
+
+        self.assertEqual([t.id for t in tweet_db.get_tweets_for_user(20)], [1, 3, 4])
+        self.assertEqual([t.id for t in CsvTweetDB(self.filename, skip_header=True,
+                                                    fast_read=True).get_tweets_for_user(20)], [1, 3, 4])
+
+    def test_fast_read_get_tweets_grouped_by_user(self):
+        tweet_db = CsvTweetDB(self.filename, skip_header=True, fast_read=True)
+
+        groups = [(user_id, [t.id for t in tweets]) for user_id, tweets in tweet_db.get_tweets_grouped_by_user()]
+
+        self.assertEqual(groups, [(10, [2]), (20, [3, 1])])
+
+    def test_deduplicate_csv(self):
+        refetched = create_tweet_row(1, 20)
+        refetched[12] = 5
+        CsvTweetDB(self.filename).add_many([refetched, create_tweet_row(4, 10)])
+        output = os.path.join(self.tmp_dir.name, "dedup.csv")
+
+        n_read, n_written = deduplicate_csv(CsvTweetDB(self.filename, skip_header=True), CsvTweetDB(output))
+
+        self.assertEqual((n_read, n_written), (5, 4))
+        tweets = CsvTweetDB(output, skip_header=True).get_tweets_for_user(20)
+        self.assertEqual([(t.id, t.retweet_count) for t in tweets], [(3, 2), (1, 5)])
+        self.assertEqual(sorted(t.id for t in CsvTweetDB(output, skip_header=True).get_tweets_for_user(10)), [2, 4])
+
+    def test_get_tweets_grouped_by_user_without_index(self):
+        with self.assertRaises(NotImplementedError):
+            CsvTweetDB(self.filename, skip_header=True).get_tweets_grouped_by_user()
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ParquetDBTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        self.sqlite_tweet_db = SqliteTweetDB(os.path.join(self.tmp_dir.name, "tweets.db"))
+        tweet_row = create_tweet_row(3, 20, "Quoted text \\U0001f600")
+        tweet_row[4] = "13.4;52.5"
+        tweet_row[5] = "DE"
+        tweet_row[6] = "Berlin"
+        tweet_row[8] = 10
+        tweet_row[11] = 7
+        tweet_row[16] = "DE;FR"
+        tweet_row[17] = str({"https://t.co/abc": "https://twitter.com"})
+        self.sqlite_tweet_db.add_many([create_tweet_row(1, 20), create_tweet_row(2, 10), tweet_row,
+                                       create_tweet_row(4, 10 + 64)])
+
+        self.sqlite_user_db = SqliteUserDB(os.path.join(self.tmp_dir.name, "users.db"))
+        self.sqlite_user_db.add_many([create_user_row(10), create_user_row(20)])
+
+        self.tweet_db = ParquetTweetDB(os.path.join(self.tmp_dir.name, "tweets.parquet"))
+        self.user_db = ParquetUserDB(os.path.join(self.tmp_dir.name, "users.parquet"))
+
+        convert_db(self.sqlite_tweet_db, self.tweet_db, batch_size=2)
+        convert_db(self.sqlite_user_db, self.user_db)
+
+    def tearDown(self):
+        self.sqlite_tweet_db.conn.close()
+        self.sqlite_user_db.conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_get_tweets_for_user(self):
+        self.assertEqual([t.id for t in self.tweet_db.get_tweets_for_user(20)], [3, 1])
+        self.assertEqual([t.id for t in self.tweet_db.get_tweets_for_user(10)], [2])
+        self.assertEqual(self.tweet_db.get_tweets_for_user(30), [])
+
+    def test_tweet_attributes_equal_sqlite(self):
+        attributes = ["id", "user_id", "created_at", "text", "coordinates", "in_reply_to_status_id",
+                      "in_reply_to_user_id", "quoted_status_id", "retweet_count", "favorite_count", "lang",
+                      "withheld_copyright", "withheld_in_countries", "entities", "source", "videos", "photos", "gifs",
+                      "fetch_date"]
+
+        tweets = self.tweet_db.get_tweets_for_user(20)
+
+        for tweet, sqlite_tweet in zip(tweets, self.sqlite_tweet_db.get_tweets_for_user(20)):
+            for attribute in attributes:
+                self.assertEqual(getattr(tweet, attribute), getattr(sqlite_tweet, attribute), attribute)
+
+        self.assertEqual(tweets[0].place.country_code, "DE")
+        self.assertEqual(tweets[0].place.name, "Berlin")
+        self.assertEqual(tweets[0].retweeted_status.id, 7)
+        self.assertIsNone(tweets[1].place)
+
+    def test_feature_columns(self):
+        tweet_db = ParquetTweetDB(self.tweet_db.path, columns=TWEET_FEATURE_COLUMNS)
+
+        tweet = tweet_db.get_tweets_for_user(20)[0]
+
+        self.assertEqual(tweet.text, "Quoted text \U0001f600")
+        self.assertIsNone(tweet.fetch_date)
+
+    def test_get_tweets_grouped_by_user(self):
+        groups = sorted((user_id, [t.id for t in tweets]) for user_id, tweets in
+                        self.tweet_db.get_tweets_grouped_by_user())
+
+        self.assertEqual(groups, [(10, [2]), (20, [3, 1]), (74, [4])])
+
+    def test_get_user(self):
+        user = self.user_db.get_user(20)
+
+        self.assertEqual(user.id, 20)
+        self.assertEqual(user.created_at, self.sqlite_user_db.get_all_user()[1].created_at)
+        self.assertIsNone(self.user_db.get_user(30))
+
+    def test_get_all_user(self):
+        self.assertEqual(sorted(u.id for u in self.user_db.get_all_user()), [10, 20])
+
+    def test_append_with_separate_instances(self):
+        path = os.path.join(self.tmp_dir.name, "appended.parquet")
+        ParquetTweetDB(path).add_many([create_tweet_row(1, 20)])
+        ParquetTweetDB(path).add_many([create_tweet_row(2, 20)])
+
+        self.assertEqual([t.id for t in ParquetTweetDB(path).get_tweets_for_user(20)], [2, 1])
+
+    def test_user_id_range(self):
+        groups = [(user_id, [t.id for t in tweets]) for user_id, tweets in
+                  self.tweet_db.get_tweets_grouped_by_user((15, 75))]
+
+        self.assertEqual(groups, [(20, [3, 1]), (74, [4])])
+        self.assertEqual(self.user_db.get_user_ids(), [10, 20])
+        self.assertEqual([u.id for u in self.user_db.get_users_in_range(0, 20)], [10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import importlib.resources
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from twitter_bot_type_classification import data
+from twitter_bot_type_classification.features import emoji, utils
+from twitter_bot_type_classification.features.emoji import EmojiMatcher, read_emoji_sequences, load_emoji_matcher, \
+    build_emoji_matcher, EMOJI_MATCHER_FILENAME, EMOJI_MATCHER_VERSION
+
+
+class EmojiMatcherTests(unittest.TestCase):
+    matcher = EmojiMatcher(read_emoji_sequences())
+
+    def test_count(self):
+        self.assertEqual(self.matcher.count("This is just a simple tweet text."), 0)
+        self.assertEqual(self.matcher.count("\U0001f600 This is just a simple tweet text. \U0001f600"), 2)
+        self.assertEqual(self.matcher.count(""), 0)
+
+    def test_longest_match(self):
+        # waving hand with skin tone, family with zwj and keycap sequence
+        text = "\U0001f44b\U0001f3fb\U0001f468‍\U0001f469‍\U0001f467 1️⃣ 1"
+
+        self.assertEqual(self.matcher.findall(text),
+                         ["\U0001f44b\U0001f3fb", "\U0001f468‍\U0001f469‍\U0001f467", "1️⃣"])
+
+    def test_strip(self):
+        self.assertEqual(self.matcher.strip("\U0001f600 text \U0001f44b\U0001f3fb!"), (" text !", 2))
+        self.assertEqual(self.matcher.strip("text"), ("text", 0))
+
+    def test_all_sequences(self):
+        sequences = read_emoji_sequences()
+
+        self.assertEqual(self.matcher.findall("".join(sequences)), sequences)
+
+    def test_serialized_matcher(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "emoji-matcher.pickle")
+            build_emoji_matcher(filename)
+
+            with open(filename, "rb") as f:
+                serialized = pickle.load(f)
+
+        self.assertEqual(serialized, {"version": EMOJI_MATCHER_VERSION, "trie": self.matcher.trie})
+
+    def test_packaged_matcher(self):
+        with importlib.resources.open_binary(data, EMOJI_MATCHER_FILENAME) as f:
+            serialized = pickle.load(f)
+
+        self.assertEqual(serialized["version"], EMOJI_MATCHER_VERSION)
+        self.assertEqual(serialized["trie"], self.matcher.trie)
+
+        # the packaged matcher is used and not built again from the emoji-test.txt file
+        with mock.patch.object(emoji, "read_emoji_sequences", side_effect=AssertionError("matcher rebuilt")):
+            self.assertEqual(load_emoji_matcher().findall("text \U0001f44b\U0001f3fb"), ["\U0001f44b\U0001f3fb"])
+
+    def test_deprecated_emoji_regex(self):
+        with self.assertWarns(DeprecationWarning):
+            emoji_regex = utils.EMOJI_REGEX
+
+        self.assertEqual(emoji_regex.findall("\U0001f600 text \U0001f600"), ["\U0001f600", "\U0001f600"])
+
+
+if __name__ == '__main__':
+    unittest.main()
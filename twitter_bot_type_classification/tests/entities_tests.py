@@ -0,0 +1,32 @@
+import os
+import pickle
+import tempfile
+import unittest
+from xml.sax.saxutils import unescape
+
+from twitter_bot_type_classification.features.entities import read_html_escape_table, load_html_escape_table, \
+    build_html_escape_table
+
+
+class HtmlEscapeTableTests(unittest.TestCase):
+    table = read_html_escape_table()
+
+    def test_entities(self):
+        self.assertIn("&hellip;", self.table)
+        self.assertTrue(all(entity.startswith("&") and entity == entity.lower() for entity in self.table))
+        self.assertEqual(unescape("text", self.table), "text")
+
+    def test_serialized_table(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "html-escape-table.pickle")
+            build_html_escape_table(filename)
+
+            with open(filename, "rb") as f:
+                serialized = pickle.load(f)
+
+        self.assertEqual(serialized["table"], self.table)
+        self.assertEqual(load_html_escape_table(), self.table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from twitter_bot_type_classification.dataset.db import TweetDB, UserDB
+from twitter_bot_type_classification.features.store import TweetFeatureStore, get_user_key
+from twitter_bot_type_classification.features.tweet import N_FEATURES, TWEET_FEATURES_INDEX
+from twitter_bot_type_classification.features.urls import get_url_resolver, set_url_cache
+
+
+def create_tweet(tweet_id, retweet_count=2, favorite_count=3, text="This is just a simple tweet text."):
+    return TweetDB.parse_tweet([str(tweet_id), "10", "2000-01-01 00:00:00", text, "",
+                                "", "", "", "", "", "", "", str(retweet_count), str(favorite_count), "en", "False", "",
+                                "{}", "0", "0", "0", "Twitter Web App", "2000-01-01 23:59:59"])
+
+
+def create_user(screen_name="test_username"):
+    return UserDB.parse_user(["10", "Test Name", screen_name, "Test Location", "", "",
+                              "This is a simple profile description with no meaning.", "False", "False", "123", "567",
+                              "8910", "111213", "141516", "2000-01-01 00:00:00", "http://t.co/profile_img", "False",
+                              "False", "", "2000-01-01 23:59:59"])
+
+
+class TweetFeatureStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "features.db")
+        self.store = TweetFeatureStore(self.filename)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_add_and_get_many(self):
+        user_key = get_user_key(create_user())
+        features = np.arange(2 * N_FEATURES, dtype=np.float32).reshape(2, N_FEATURES)
+        self.store.add_many([1, 2], user_key, features)
+
+        stored = self.store.get_many([1, 2, 3], user_key)
+
+        self.assertEqual(sorted(stored), [1, 2])
+        np.testing.assert_array_equal(stored[1], features[0])
+        np.testing.assert_array_equal(stored[2], features[1])
+
+    def test_get_many_changed_user(self):
+        self.store.add_many([1], get_user_key(create_user()), np.zeros((1, N_FEATURES)))
+
+        self.assertEqual(self.store.get_many([1], get_user_key(create_user("other_username"))), {})
+
+    def test_feature_version_change(self):
+        self.store.add_many([1], get_user_key(create_user()), np.zeros((1, N_FEATURES)))
+        with self.store.conn:
+            self.store.conn.execute("UPDATE feature_store_info SET value = '0:0' WHERE key = 'feature_version'")
+        self.store.close()
+
+        self.store = TweetFeatureStore(self.filename)
+
+        self.assertEqual(self.store.get_many([1], get_user_key(create_user())), {})
+
+    def test_calc_features_stored(self):
+        user = create_user()
+        features = np.ones((2, N_FEATURES), dtype=np.float32)
+        self.store.add_many([1, 2], get_user_key(user), features)
+
+        tweets_features = self.store.calc_features([create_tweet(1, 5, 6), create_tweet(2, 7, 8)], user)
+
+        self.assertEqual(tweets_features.shape, (2, N_FEATURES))
+        self.assertEqual(tweets_features.dtype, np.float32)
+        self.assertEqual(list(tweets_features[:, TWEET_FEATURES_INDEX["retweet_count"]]), [5, 7])
+        self.assertEqual(list(tweets_features[:, TWEET_FEATURES_INDEX["likes_count"]]), [6, 8])
+        self.assertEqual(tweets_features[0, TWEET_FEATURES_INDEX["lang_encoded"]], 1)
+
+    def test_calc_features_uncached_url(self):
+        set_url_cache(os.path.join(self.tmp_dir.name, "urls.db"))
+        self.addCleanup(set_url_cache)
+        user = create_user()
+        tweets = [create_tweet(1), create_tweet(2, text="Look at bit.ly/abcde")]
+
+        self.store.calc_features(tweets, user)
+
+        # the features of the tweet with the uncached url are calculated again after the url was resolved
+        self.assertEqual(sorted(self.store.get_many([1, 2], get_user_key(user))), [1])
+
+        get_url_resolver().cache.put("bit.ly/abcde", "https://test_username.com/abcde", 301)
+        tweets_features = self.store.calc_features(tweets, user)
+
+        self.assertEqual(tweets_features[1, TWEET_FEATURES_INDEX["number_of_url_domains_matches_username"]], 1)
+        self.assertEqual(sorted(self.store.get_many([1, 2], get_user_key(user))), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import unittest
+
+import tweepy
+from tweepy.models import Status
+
+from twitter_bot_type_classification.dataset.db import SqliteTweetDB
+from twitter_bot_type_classification.dataset.generation import FetchTask, SaveWorker, TimelinePaginator, \
+    TweetDatasetGenerator, UserDatasetGenerator, NETWORK_CONNECTION_DOWN_ERROR_SUBSTRINGS
+from twitter_bot_type_classification.dataset.jobs import JobQueue, JobState
+
+
+def create_status(tweet_id, user_id):
+    return Status.parse(None, {"id": tweet_id, "user": {"id": user_id}, "created_at": "Sat Jan 01 00:00:00 +0000 2000",
+                               "full_text": "This is just a simple tweet text.", "entities": {"urls": []},
+                               "place": None, "in_reply_to_status_id": None, "in_reply_to_user_id": None,
+                               "retweet_count": 2, "favorite_count": 3, "lang": "en", "source": "Twitter Web App"})
+
+
+class FakeApi:
+    """
+    User timeline with the tweet ids n_tweets to 1, the requests in errors fail once with the error
+    """
+
+    def __init__(self, n_tweets, errors=None):
+        self.n_tweets = n_tweets
+        self.errors = errors or {}
+        self.requests = []
+
+    def user_timeline(self, **params):
+        self.requests.append(params)
+        if len(self.requests) in self.errors:
+            raise self.errors[len(self.requests)]
+
+        max_id = params.get("max_id", self.n_tweets)
+        since_id = params.get("since_id", 0)
+        ids = [i for i in range(self.n_tweets, 0, -1) if since_id < i <= max_id]
+        return [create_status(i, params["user_id"]) for i in ids[:params["count"]]]
+
+
+class FakeUserApi:
+    """
+    User lookup which always fails with the error
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    def lookup_users(self, **params):
+        raise self.error
+
+
+class ListDB:
+
+    def __init__(self):
+        self.rows = []
+
+    def add_many(self, rows):
+        self.rows.extend(rows)
+
+
+class TimelinePaginatorTests(unittest.TestCase):
+
+    def test_next_page(self):
+        api = FakeApi(450)
+        paginator = TimelinePaginator(1, limit=250)
+
+        self.assertEqual(len(paginator.next_page(api)), 200)
+        self.assertEqual((paginator.max_id, paginator.get_remaining()), (250, 50))
+        self.assertEqual([t.id for t in paginator.next_page(api)], list(range(250, 200, -1)))
+        self.assertTrue(paginator.finished)
+        self.assertEqual(paginator.next_page(api), [])
+
+        self.assertEqual([(p["count"], p.get("max_id")) for p in api.requests], [(200, None), (50, 250)])
+
+    def test_all_tweets(self):
+        api = FakeApi(250)
+        paginator = TimelinePaginator(1, limit=-1, since_id=20)
+
+        while not paginator.finished:
+            paginator.next_page(api)
+
+        self.assertEqual(paginator.fetched, 230)
+        self.assertEqual([p.get("max_id") for p in api.requests], [None, 50, 20])
+        self.assertTrue(all(p["since_id"] == 20 for p in api.requests))
+
+    def test_resume(self):
+        paginator = TimelinePaginator(1, limit=300)
+        paginator.next_page(FakeApi(450))
+
+        # a restarted task continues with the state of the paginator
+        paginator = pickle.loads(pickle.dumps(paginator))
+        api = FakeApi(450)
+        self.assertEqual([t.id for t in paginator.next_page(api)][:2], [250, 249])
+        self.assertEqual(api.requests[0]["count"], 100)
+
+
+class FetchTweetsTests(unittest.TestCase):
+
+    def test_retry_continues_below_oldest_tweet(self):
+        api = FakeApi(450, errors={2: tweepy.error.TweepError("Internal error")})
+
+        tweets = TweetDatasetGenerator.fetch_tweets_for_user(api, user=1, limit=300)
+
+        self.assertEqual([t[0] for t in tweets], list(range(450, 150, -1)))
+        self.assertEqual([p.get("max_id") for p in api.requests], [None, 250, 250])
+
+    def test_user_not_available(self):
+        error = tweepy.error.TweepError("Not authorized", response=type("Response", (), {"status_code": 401})())
+        api = FakeApi(10, errors={1: error})
+
+        self.assertEqual(TweetDatasetGenerator.fetch_tweets_for_user(api, user=1), [])
+        self.assertEqual(len(api.requests), 1)
+
+
+class FetchJobTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_failed_job_resumes(self):
+        jobs = JobQueue(os.path.join(self.tmp_dir.name, "tweets.db.jobs"))
+        jobs.create([TimelinePaginator(1, limit=300).get_state()])
+        job_id, payload = next(jobs.start())
+
+        # the first page is fetched, all retries of the second page fail
+        api = FakeApi(450, errors={i: tweepy.error.TweepError("Internal error") for i in range(2, 8)})
+        task = FetchTask(TweetDatasetGenerator.fetch_tweets_for_user,
+                         {"api": api, "paginator": TimelinePaginator.from_state(payload)}, 300, job_id)
+        task.execute()
+        self.assertTrue(task.failed)
+
+        tweet_db = SqliteTweetDB(os.path.join(self.tmp_dir.name, "tweets.db"))
+        task_q = queue.Queue()
+        task_q.put(task)
+        task_q.put(None)
+        SaveWorker(task_q, tweet_db, 1, 300, threading.Lock(), jobs_filename=jobs.filename).run()
+
+        self.assertEqual(jobs.get_counts()[JobState.FAILED], 1)
+        self.assertEqual(len(tweet_db.get_tweets_for_user(1)), 200)
+
+        jobs.requeue()
+        paginator = TimelinePaginator.from_state(next(jobs.start())[1])
+        self.assertEqual((paginator.max_id, paginator.get_remaining()), (250, 100))
+        jobs.close()
+
+    def test_failed_lookup_job_resumes(self):
+        jobs = JobQueue(os.path.join(self.tmp_dir.name, "users.db.jobs"))
+        jobs.create([{"users": [1, 2], "is_username": False}])
+        job_id, payload = next(jobs.start())
+
+        # the network is down and all retries of the lookup fail
+        api = FakeUserApi(tweepy.error.TweepError(" ".join(NETWORK_CONNECTION_DOWN_ERROR_SUBSTRINGS)))
+        task = FetchTask(UserDatasetGenerator.fetch_users,
+                         {"api": api, "users_to_fetch": payload["users"], "is_username": payload["is_username"],
+                          "network_down_retries": 0}, 2, job_id)
+        task.execute()
+        self.assertTrue(task.failed)
+        self.assertEqual(task.get_result(), [])
+
+        task_q = queue.Queue()
+        task_q.put(task)
+        task_q.put(None)
+        SaveWorker(task_q, ListDB(), 1, 2, threading.Lock(), jobs_filename=jobs.filename).run()
+
+        self.assertEqual(jobs.get_counts()[JobState.FAILED], 1)
+        jobs.requeue()
+        self.assertEqual(list(jobs.start()), [(job_id, {"users": [1, 2], "is_username": False})])
+        jobs.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
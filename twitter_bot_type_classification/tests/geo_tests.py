@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from twitter_bot_type_classification.features import geo, utils
+from twitter_bot_type_classification.features.geo import CoordinateGroupClassifier, AMBIGUOUS_CELL
+from twitter_bot_type_classification.features.utils import COORDINATE_GROUP_POLYGONS, get_coordinate_group_classifier
+
+GROUPS = [
+    [[(0, 0), (10, 0), (10, 10), (0, 10)]],
+    # the square overlaps the first group, the overlapping points are in the first group
+    [[(20, 0), (30, 0), (25, 10)], [(5, 5), (15, 5), (15, 15), (5, 15)]]
+]
+
+
+class CoordinateGroupClassifierTests(unittest.TestCase):
+    classifier = CoordinateGroupClassifier(GROUPS)
+
+    def test_classify(self):
+        coordinates = np.array([[5, 2], [12, 12], [25, 2], [8, 8], [50, 50], [-170.5, -80.5]])
+
+        np.testing.assert_array_equal(self.classifier.classify(coordinates), [0, 1, 1, 0, 2, 2])
+
+    def test_missing_coordinates(self):
+        coordinates = np.array([[np.nan, np.nan], [5, 2], [np.nan, 3]])
+
+        np.testing.assert_array_equal(self.classifier.classify(coordinates), [-1, 0, -1])
+        np.testing.assert_array_equal(self.classifier.classify(np.empty((0, 2))), [])
+
+    def test_boundary(self):
+        # vertices and points on the edges are inside the polygon
+        coordinates = np.array([[0, 0], [10, 5], [5, 10], [15, 10], [25, 10], [22.5, 5], [30.000001, 0]])
+
+        np.testing.assert_array_equal(self.classifier.classify(coordinates), [0, 0, 0, 1, 1, 1, 2])
+
+    def test_outside_grid(self):
+        coordinates = np.array([[180, 90], [-180, -90], [200, 5], [5, -100]])
+
+        np.testing.assert_array_equal(self.classifier.classify(coordinates), [2, 2, 2, 2])
+
+    def test_grid_matches_ray_casting(self):
+        rng = np.random.default_rng(0)
+        coordinates = np.concatenate([rng.uniform([-180, -90], [180, 90], (10000, 2)),
+                                      rng.uniform([-5, -5], [35, 20], (10000, 2))])
+
+        for classifier in [self.classifier, get_coordinate_group_classifier()]:
+            ambiguous = (classifier.grid == AMBIGUOUS_CELL).sum()
+            self.assertGreater(ambiguous, 0)
+            self.assertLess(ambiguous, classifier.grid.size)
+
+            np.testing.assert_array_equal(classifier.classify(coordinates),
+                                          classifier.__classify_exact__(coordinates))
+
+    def test_chunks(self):
+        point_chunk_size = geo.POINT_CHUNK_SIZE
+        geo.POINT_CHUNK_SIZE = 3
+        try:
+            coordinates = np.array([[5, 2], [12, 12], [25, 2], [8, 8], [50, 50], [5.5, 5.5], [22.5, 5]])
+
+            np.testing.assert_array_equal(self.classifier.__classify_exact__(coordinates), [0, 1, 1, 0, 2, 0, 1])
+        finally:
+            geo.POINT_CHUNK_SIZE = point_chunk_size
+
+    def test_coordinate_groups(self):
+        # new york, berlin, tokyo, sydney, sao paulo and the south pole
+        coordinates = np.array([[-74, 40.7], [13.4, 52.5], [139.7, 35.7], [151.2, -33.9], [-46.6, -23.5], [0, -89]])
+
+        classifier = get_coordinate_group_classifier()
+
+        self.assertEqual(len(classifier), len(COORDINATE_GROUP_POLYGONS))
+        np.testing.assert_array_equal(classifier.classify(coordinates), [0, 4, 5, 9, 2, 7])
+
+    def test_deprecated_coordinate_groups(self):
+        with self.assertWarns(DeprecationWarning):
+            groups = utils.COORDINATE_GROUPS
+
+        self.assertEqual(len(groups), len(COORDINATE_GROUP_POLYGONS))
+        self.assertTrue(groups[1][0].contains_point((-40, 70)))
+
+
+if __name__ == '__main__':
+    unittest.main()
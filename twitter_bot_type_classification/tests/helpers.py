@@ -0,0 +1,10 @@
+class FakeClock:
+    """
+    Clock of the rate limit windows and buffered writers in the tests, the time only changes by setting now
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
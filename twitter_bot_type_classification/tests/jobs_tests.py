@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from twitter_bot_type_classification.dataset.jobs import JOB_QUEUE_SUFFIX, JobQueue, JobState, open_job_queue
+
+
+class JobQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "tweets.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_start_and_finish(self):
+        jobs = JobQueue(self.filename + JOB_QUEUE_SUFFIX)
+        jobs.create({"users": [i]} for i in range(3))
+
+        started = list(jobs.start())
+        self.assertEqual([p for _, p in started], [{"users": [0]}, {"users": [1]}, {"users": [2]}])
+        self.assertEqual(jobs.get_counts()[JobState.IN_FLIGHT], 3)
+
+        jobs.finish_many([(started[0][0], None, False), (started[1][0], {"users": [1], "max_id": 5}, True)])
+
+        self.assertEqual(jobs.get_counts(), {JobState.PENDING: 0, JobState.IN_FLIGHT: 1, JobState.DONE: 1,
+                                             JobState.FAILED: 1})
+        # nothing is pending until the jobs are requeued
+        self.assertEqual(list(jobs.start()), [(started[2][0], {"users": [2]})])
+        jobs.close()
+
+    def test_requeue(self):
+        jobs = JobQueue(self.filename, max_retries=1)
+        jobs.create([{"users": [1]}, {"users": [2]}, {"users": [3]}])
+        first, second, _ = [job_id for job_id, _ in jobs.start()]
+
+        jobs.finish_many([(first, None, False), (second, {"users": [2], "max_id": 5}, True)])
+
+        # the job in flight and the failed job are started again with the saved payload
+        self.assertEqual(jobs.requeue(), 2)
+        self.assertEqual([p for _, p in jobs.start()], [{"users": [2], "max_id": 5}, {"users": [3]}])
+
+        jobs.finish_many([(second, None, True)])
+        self.assertEqual(jobs.requeue(), 1)
+        self.assertEqual(jobs.get_counts()[JobState.FAILED], 1)
+        jobs.close()
+
+    def test_open_job_queue(self):
+        jobs = open_job_queue(self.filename, lambda: [{"users": [1]}, {"users": [2]}])
+        first = next(jobs.start())[0]
+        jobs.finish_many([(first, None, False)])
+        jobs.close()
+
+        jobs = open_job_queue(self.filename, lambda: self.fail("the jobs are resumed"), resume=True)
+        self.assertEqual([p for _, p in jobs.start()], [{"users": [2]}])
+        jobs.close()
+
+        # without resume the unfinished jobs are replaced
+        jobs = open_job_queue(self.filename, lambda: [{"users": [3]}])
+        self.assertEqual([p for _, p in jobs.start()], [{"users": [3]}])
+        jobs.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from twitter_bot_type_classification.features.output import FeatureShardWriter, FeatureShardReader, \
+    SHARD_FEATURES_FILENAME
+
+
+class FeatureOutputTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "features")
+        self.features = np.arange(5 * 3, dtype=np.float32).reshape(5, 3)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_and_load(self):
+        writer = FeatureShardWriter(self.path, 3, shard_size=2)
+        writer.extend([10, 11, 12, 13, 14], self.features)
+        writer.close()
+
+        reader = FeatureShardReader(self.path)
+        features, ids = reader.load()
+
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(len(list(reader.iter_shards())), 3)
+        self.assertEqual(list(ids), [10, 11, 12, 13, 14])
+        self.assertEqual(list(reader.get_user_ids()), [10, 11, 12, 13, 14])
+        np.testing.assert_array_equal(features, self.features)
+
+    def test_flush_every_shard_size(self):
+        writer = FeatureShardWriter(self.path, 3, shard_size=2)
+        writer.extend([10, 11, 12], self.features[:3])
+
+        # the last user is only buffered and not committed yet
+        self.assertEqual(list(FeatureShardReader(self.path).get_user_ids()), [10, 11])
+
+    def test_resume(self):
+        writer = FeatureShardWriter(self.path, 3, shard_size=2)
+        writer.extend([10, 11], self.features[:2])
+        writer.close()
+
+        writer = FeatureShardWriter(self.path, 3, shard_size=2, resume=True)
+        writer.extend([12, 13, 14], self.features[2:])
+        writer.close()
+
+        features, ids = FeatureShardReader(self.path).load()
+
+        self.assertEqual(list(ids), [10, 11, 12, 13, 14])
+        np.testing.assert_array_equal(features, self.features)
+
+    def test_resume_uncommitted_shard(self):
+        writer = FeatureShardWriter(self.path, 3, shard_size=2)
+        writer.extend([10, 11], self.features[:2])
+
+        # shard file of an interrupted write which is not listed in the manifest
+        with open(os.path.join(self.path, SHARD_FEATURES_FILENAME.format(1)), "wb") as f:
+            f.write(b"broken")
+
+        writer = FeatureShardWriter(self.path, 3, shard_size=2, resume=True)
+        writer.extend([12, 13], self.features[2:4])
+
+        features, ids = FeatureShardReader(self.path).load()
+
+        self.assertEqual(list(ids), [10, 11, 12, 13])
+        np.testing.assert_array_equal(features, self.features[:4])
+
+    def test_resume_different_number_of_features(self):
+        FeatureShardWriter(self.path, 3).close()
+
+        with self.assertRaises(ValueError):
+            FeatureShardWriter(self.path, 4, resume=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
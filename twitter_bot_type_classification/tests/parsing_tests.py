@@ -1,7 +1,11 @@
 import unittest
 from datetime import datetime
 
-from twitter_bot_type_classification.dataset.db import DATE_TIME_FORMAT, UserDB, TweetDB
+import numpy as np
+from tweepy import Status
+
+from twitter_bot_type_classification.dataset.db import DATE_TIME_FORMAT, TWITTER_DATE_TIME_FORMAT, UserDB, TweetDB
+from twitter_bot_type_classification.features.tweet import TweetBatch
 
 
 class ParsingTests(unittest.TestCase):
@@ -611,6 +615,49 @@ class ParsingTests(unittest.TestCase):
         tweet = TweetDB.parse_tweet(row=row, file_encoding="utf-8", text_encoding="unicode_escape", list_separator=";")
         self.assertEqual(tweet.fetch_date, datetime.strptime("2000-01-01 23:59:59", DATE_TIME_FORMAT))
 
+    def test_parse_tweet_batch_matches_tweepy(self):
+        row = [
+            "1234", "5647", "2000-01-01 00:00:00", "\\U0001f600 This is just a simple tweet text. https://t.co/123",
+            "-12.135;56.78",
+            "DE", "Berlin", "789", "678", "234", "This is a quotet text.", "456", "2", "3", "en", "False", "DE;GB",
+            "{'https://t.co/123': 'https://twitter.com'}", "4", "5", "6", "Twitter Web App", "2000-01-01 23:59:59"
+        ]
+        record = TweetDB.parse_tweet(row=row, file_encoding="utf-8", text_encoding="unicode_escape",
+                                     list_separator=";")
+        status = Status.parse(api=None, json={
+            "id": 1234,
+            "user_id": 5647,
+            "created_at": datetime.strptime("2000-01-01 00:00:00", DATE_TIME_FORMAT).strftime(
+                TWITTER_DATE_TIME_FORMAT),
+            "text": "😀 This is just a simple tweet text. https://t.co/123",
+            "coordinates": {"coordinates": [-12.135, 56.78]},
+            "place": {"country_code": "DE", "name": "Berlin"},
+            "in_reply_to_status_id": 789,
+            "in_reply_to_user_id": 678,
+            "quoted_status_id": 234,
+            "quoted_status": {"text": "This is a quotet text."},
+            "retweeted_status": {"id": 456},
+            "retweet_count": 2,
+            "favorite_count": 3,
+            "lang": "en",
+            "withheld_copyright": False,
+            "withheld_in_countries": ["DE", "GB"],
+            "entities": {"urls": [{"url": "https://t.co/123", "expanded_url": "https://twitter.com"}]},
+            "videos": 4,
+            "photos": 5,
+            "gifs": 6,
+            "source": "Twitter Web App"
+        })
+
+        self.assertEqual(record.created_at, status.created_at)
+        record_batch = TweetBatch([record])
+        status_batch = TweetBatch([status])
+        for name, value in vars(status_batch).items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(getattr(record_batch, name), value)
+            else:
+                self.assertEqual(getattr(record_batch, name), value)
+
 
 if __name__ == '__main__':
     unittest.main()
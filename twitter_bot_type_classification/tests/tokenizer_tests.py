@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+
+import nltk
+
+from twitter_bot_type_classification.features import tokenizer
+from twitter_bot_type_classification.features.tokenizer import PUNKT_PATH_ENV, PUNKT_LANGUAGE, TOKENIZER_ENV, \
+    FastTokenizer, NltkTokenizer, compare_tokenizers, count_tokens, get_tokenizer, set_tokenizer
+
+try:
+    from nltk.tokenize.punkt import PunktTokenizer
+except ImportError:
+    PunktTokenizer = None
+
+
+@unittest.skipIf(PunktTokenizer is None, "nltk version without the punkt_tab model")
+class PunktPathTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.nltk_data_path = list(nltk.data.path)
+        self.punkt_path = os.environ.get(PUNKT_PATH_ENV)
+        tokenizer.load_punkt.cache_clear()
+
+    def tearDown(self):
+        nltk.data.path[:] = self.nltk_data_path
+        if self.punkt_path is None:
+            os.environ.pop(PUNKT_PATH_ENV, None)
+        else:
+            os.environ[PUNKT_PATH_ENV] = self.punkt_path
+        tokenizer.load_punkt.cache_clear()
+        self.tmp_dir.cleanup()
+
+    def create_model(self):
+        # an empty model without abbreviations or collocations
+        model_path = os.path.join(self.tmp_dir.name, "tokenizers", "punkt_tab", PUNKT_LANGUAGE)
+        os.makedirs(model_path)
+        for filename in ["collocations.tab", "sent_starters.txt", "abbrev_types.txt", "ortho_context.tab"]:
+            open(os.path.join(model_path, filename), "w").close()
+
+    def test_configured_path(self):
+        self.create_model()
+        os.environ[PUNKT_PATH_ENV] = self.tmp_dir.name
+
+        nltk_tokenizer = NltkTokenizer()
+
+        self.assertEqual(nltk_tokenizer.sent_tokenize("This is a tweet. This is another one!"),
+                         ["This is a tweet.", "This is another one!"])
+        self.assertEqual(nltk_tokenizer.word_tokenize("This is a tweet. Another one!"),
+                         ["This", "is", "a", "tweet", ".", "Another", "one", "!"])
+        self.assertIs(tokenizer.load_punkt(), tokenizer.load_punkt())
+
+    def test_missing_model(self):
+        os.environ[PUNKT_PATH_ENV] = self.tmp_dir.name
+        nltk.data.path[:] = []
+
+        with self.assertRaises(FileNotFoundError) as cm:
+            tokenizer.load_punkt()
+
+        self.assertIn(PUNKT_PATH_ENV, str(cm.exception))
+
+
+class FastTokenizerTests(unittest.TestCase):
+    tokenizer = FastTokenizer()
+
+    def test_word_tokenize_matches_nltk(self):
+        texts = [
+            "This is just a simple test tweet text.",
+            "I don't know what you're talking about!!",
+            "Check this out: 1,000 people at 12:30, crazy...",
+            "\"Quoted text\" said he.",
+            "RT @user: hello #world & more",
+            "It's John's car (the red one) isn't it?",
+            "rock'n'roll is 'cool' ok dogs' bones",
+            "I cannot believe we're gonna win -- U.S.A. is big.",
+            "Price is $3.88 (roughly 3,36 euros) 100% sure",
+            ""
+        ]
+
+        for text in texts:
+            self.assertEqual(self.tokenizer.word_tokenize(text, preserve_line=True),
+                             nltk.word_tokenize(text, preserve_line=True), text)
+
+    def test_sent_tokenize(self):
+        self.assertEqual(self.tokenizer.sent_tokenize("Hello world. How are you? Fine!!! Mr. Smith is here... ok"),
+                         ["Hello world.", "How are you?", "Fine!!!", "Mr. Smith is here... ok"])
+        self.assertEqual(self.tokenizer.sent_tokenize("Wait... What? 3.5 is a number."),
+                         ["Wait...", "What?", "3.5 is a number."])
+        self.assertEqual(self.tokenizer.sent_tokenize(" "), [])
+
+    def test_count_tokens(self):
+        self.assertEqual(count_tokens(self.tokenizer, "Hello world. How are you?"), (2, 5, 2))
+
+    def test_compare_tokenizers(self):
+        class SingleSentenceTokenizer(FastTokenizer):
+            def sent_tokenize(self, text):
+                return [text] if text.strip() else []
+
+        result = compare_tokenizers(["One sentence.", "Two. Sentences."], self.tokenizer, SingleSentenceTokenizer())
+
+        # only the final period of a sentence is a token of its own, so "Two." is one word of the single sentence
+        self.assertEqual(result, {"texts": 2, "sentences": 1, "words": 0, "punctuations": 1, "tokens": 1})
+
+
+class TokenizerSelectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer_name = os.environ.get(TOKENIZER_ENV)
+
+    def tearDown(self):
+        if self.tokenizer_name is None:
+            os.environ.pop(TOKENIZER_ENV, None)
+        else:
+            os.environ[TOKENIZER_ENV] = self.tokenizer_name
+        tokenizer._tokenizer = None
+
+    def test_set_tokenizer(self):
+        set_tokenizer("fast")
+
+        self.assertIsInstance(get_tokenizer(), FastTokenizer)
+        self.assertEqual(os.environ[TOKENIZER_ENV], "fast")
+
+        set_tokenizer("nltk")
+
+        self.assertIsInstance(get_tokenizer(), NltkTokenizer)
+
+    def test_unknown_tokenizer(self):
+        os.environ[TOKENIZER_ENV] = "unknown"
+        tokenizer._tokenizer = None
+
+        with self.assertRaises(ValueError):
+            get_tokenizer()
+
+
+if __name__ == '__main__':
+    unittest.main()
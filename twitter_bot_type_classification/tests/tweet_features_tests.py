@@ -1,10 +1,12 @@
 import unittest
 from datetime import datetime
 
+import numpy as np
 from tweepy import Status, User
 
 from features.tweet import TweetFeatures, TWEET_FEATURES_INDEX, LANG_CODES_IDX, TWEET_CUSTOM_SOURCES_IDX, \
-    TWEET_SOURCES_IDX
+    TWEET_SOURCES_IDX, N_FEATURES, TOKEN_URL, TOKEN_SHORTENED_URL, TOKEN_EMOJI, TOKEN_HASHTAG, TOKEN_MENTION, \
+    TOKEN_NUMBER, TOKEN_WORD, TOKEN_PUNCTUATION, TOKEN_SENTENCE, lex_tweet_text
 from twitter_bot_type_classification.dataset.db import DATE_TIME_FORMAT, TWITTER_DATE_TIME_FORMAT
 
 
@@ -8296,5 +8298,132 @@ class TweetFeaturesTests(unittest.TestCase):
         self.assertEqual(tweet_features[TWEET_FEATURES_INDEX["contains_pagination"]], 0)
 
 
+    def test_batch(self):
+        """
+        batch calculation is equal to the calculation of each single tweet
+        """
+        user_dic = {
+            "id": 1,
+            "name": "Test Account",
+            "screen_name": "test_account",
+            "location": "",
+            "url": None,
+            "expanded_url": None,
+            "description": "",
+            "protected": False,
+            "verified": False,
+            "followers_count": 10,
+            "friends_count": 15,
+            "listed_count": 2,
+            "favourites_count": 50,
+            "statuses_count": 9,
+            "created_at": datetime.strptime("2000-01-01 00:00:00", DATE_TIME_FORMAT).strftime(TWITTER_DATE_TIME_FORMAT),
+            "profile_image_url_https": "",
+            "default_profile": True,
+            "default_profile_image": True,
+            "withheld_in_countries": "",
+            "fetch_date": datetime.strptime("2000-01-01 23:59:59", DATE_TIME_FORMAT)
+        }
+        user = User.parse(api=None, json=user_dic)
+
+        tweet_dic_1 = {
+            "id": 0,
+            "user_id": 1,
+            "created_at": datetime.strptime("2000-01-01 00:00:00", DATE_TIME_FORMAT).strftime(TWITTER_DATE_TIME_FORMAT),
+            "text": "1/2 This is just a simple test tweet text. #test @test_account https://twitter.com \U0001f600",
+            "coordinates": {
+                "coordinates": [13.4, 52.5]
+            },
+            "place": {
+                "country_code": "DE",
+                "name": "Berlin"
+            },
+            "in_reply_to_status_id": 5,
+            "in_reply_to_user_id": 1,
+            "quoted_status_id": None,
+            "retweet_count": 2,
+            "favorite_count": 3,
+            "lang": "en",
+            "withheld_copyright": False,
+            "withheld_in_countries": ["DE"],
+            "entities": {
+                "urls": []
+            },
+            "source": "https://example.com",
+            "videos": 1,
+            "photos": 2,
+            "gifs": 3,
+            "fetch_date": datetime.strptime("2000-01-01 23:59:59", DATE_TIME_FORMAT)
+        }
+
+        tweet_dic_2 = {
+            "id": 1,
+            "user_id": 1,
+            "created_at": datetime.strptime("2000-01-01 00:00:00", DATE_TIME_FORMAT).strftime(TWITTER_DATE_TIME_FORMAT),
+            "text": "This is just a simple test tweet text.",
+            "coordinates": None,
+            "place": None,
+            "in_reply_to_status_id": None,
+            "in_reply_to_user_id": None,
+            "quoted_status_id": None,
+            "retweet_count": 4,
+            "favorite_count": None,
+            "lang": "de",
+            "withheld_copyright": False,
+            "withheld_in_countries": None,
+            "entities": {
+                "urls": []
+            },
+            "source": "Twitter Web App",
+            "videos": 0,
+            "photos": 0,
+            "gifs": 0,
+            "fetch_date": datetime.strptime("2000-01-01 23:59:59", DATE_TIME_FORMAT)
+        }
+
+        tweets = [Status.parse(api=None, json=tweet_dic_1), Status.parse(api=None, json=tweet_dic_2)]
+
+        tweets_features = TweetFeatures.batch(tweets, user)
+
+        self.assertEqual(tweets_features.shape, (2, N_FEATURES))
+        self.assertEqual(tweets_features.dtype, np.float32)
+        for i, tweet in enumerate(tweets):
+            np.testing.assert_array_equal(tweets_features[i], TweetFeatures(tweet, user))
+
+    def test_batch_empty(self):
+        user = User.parse(api=None, json={"id": 1, "screen_name": "test_account", "url": None})
+
+        tweets_features = TweetFeatures.batch([], user)
+
+        self.assertEqual(tweets_features.shape, (0, N_FEATURES))
+
+
+class LexTweetTextTests(unittest.TestCase):
+
+    def test_tokens(self):
+        tokens, cleaned_text = lex_tweet_text("Hi @test_1 \U0001f600 see goo.gl/15 https://t.co/abc #tag2020!",
+                                              [{"url": "https://t.co/abc", "expanded_url": "https://example.com"}])
+
+        self.assertEqual(cleaned_text, "Hi @test_1  see   #tag2020!")
+        self.assertEqual(tokens, [(TOKEN_URL, "https://example.com"), (TOKEN_EMOJI, "\U0001f600"),
+                                  (TOKEN_SHORTENED_URL, "goo.gl/15"), (TOKEN_MENTION, "@test_1"),
+                                  (TOKEN_HASHTAG, "#tag2020"), (TOKEN_SENTENCE, cleaned_text), (TOKEN_WORD, "Hi"),
+                                  (TOKEN_PUNCTUATION, "@"), (TOKEN_WORD, "test_1"), (TOKEN_WORD, "see"),
+                                  (TOKEN_PUNCTUATION, "#"), (TOKEN_WORD, "tag2020"), (TOKEN_PUNCTUATION, "!")])
+
+    def test_numbers_in_hashtags(self):
+        tokens, _ = lex_tweet_text("#2020 #ab12.5 @1,5 7", [])
+
+        self.assertEqual([t for t in tokens if t[0] in (TOKEN_HASHTAG, TOKEN_MENTION, TOKEN_NUMBER)],
+                         [(TOKEN_HASHTAG, "#2020"), (TOKEN_NUMBER, "2020"), (TOKEN_HASHTAG, "#ab12"),
+                          (TOKEN_NUMBER, "12.5"), (TOKEN_MENTION, "@1"), (TOKEN_NUMBER, "1,5"), (TOKEN_NUMBER, "7")])
+
+    def test_urls_removed_by_offset(self):
+        # the first url is a prefix of the second url, only the matched characters are removed
+        _, cleaned_text = lex_tweet_text("a http://www.testdomain.com http://www.testdomain.com/testpath", [])
+
+        self.assertEqual(cleaned_text, "a  ")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,314 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+import requests
+
+from twitter_bot_type_classification import resolve_urls
+from twitter_bot_type_classification.dataset.db import CsvTweetDB, TweetDB, UserDB
+from twitter_bot_type_classification.features import urls
+from twitter_bot_type_classification.features.tweet import TWEET_FEATURES_INDEX, TWEET_TEXT_FEATURES_IDX, \
+    calc_text_features
+from twitter_bot_type_classification.features.urls import URL_CACHE_ENV, URL_CACHE_ONLY_ENV, UrlCache, UrlResolver, \
+    get_url_resolver, iter_shortened_urls, set_url_cache
+
+
+def create_user(user_id, url, expanded_url):
+    return UserDB.parse_user([str(user_id), "Test Name", "test_username", "Test Location", url, expanded_url,
+                              "This is a simple profile description with no meaning.", "False", "False", "123", "567",
+                              "8910", "111213", "141516", "2000-01-01 00:00:00", "http://t.co/profile_img", "False",
+                              "False", "", "2000-01-01 23:59:59"])
+
+
+def create_tweet_row(tweet_id, text, urls):
+    return [str(tweet_id), "10", "2000-01-01 00:00:00", text, "", "", "", "", "", "", "", "", "2", "3", "en", "False",
+            "", str(urls), "0", "0", "0", "Twitter Web App", "2000-01-01 23:59:59"]
+
+
+def create_tweet(tweet_id, text, urls):
+    return TweetDB.parse_tweet(create_tweet_row(tweet_id, text, urls))
+
+
+class ListDB:
+
+    def __init__(self, users=(), tweets=()):
+        self.users = users
+        self.tweets = tweets
+
+    def get_all_user(self):
+        return list(self.users)
+
+    def get_tweets_grouped_by_user(self, user_id_range=None):
+        yield 10, list(self.tweets)
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    """
+    /short redirects to /final, /scheme redirects to itself with https and /plain is no redirect
+    """
+
+    def do_HEAD(self):
+        if self.path == "/short":
+            self.send_response(301)
+            self.send_header("Location", "/final")
+        elif self.path == "/scheme":
+            self.send_response(301)
+            self.send_header("Location", "https://{}/scheme".format(self.headers["Host"]))
+        else:
+            self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        # the https url is not reachable, so the GET request ends at the last redirect
+        self.send_response(302)
+        self.send_header("Location", "/final")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingResolver(UrlResolver):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetched = []
+        self.running = {}
+        self.max_running = {}
+
+    def fetch(self, url, timeout=None):
+        host = url.split("/")[2]
+        _, semaphore = self.__get_host__(host)
+
+        with semaphore:
+            with self.lock:
+                self.fetched.append(url)
+                self.running[host] = self.running.get(host, 0) + 1
+                self.max_running[host] = max(self.max_running.get(host, 0), self.running[host])
+            time.sleep(0.01)
+            with self.lock:
+                self.running[host] -= 1
+
+        return url + "/expanded", 200
+
+
+class UrlCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "urls.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_persistent(self):
+        cache = UrlCache(self.filename)
+        cache.put_many([("https://bit.ly/a", "https://example.com/a", 301), ("https://bit.ly/b", "https://bit.ly/b", None)])
+        cache.close()
+
+        cache = UrlCache(self.filename)
+
+        self.assertEqual(cache.get("https://bit.ly/a"), ("https://example.com/a", 301))
+        self.assertEqual(cache.get_many(["https://bit.ly/b", "https://bit.ly/c"]),
+                         {"https://bit.ly/b": ("https://bit.ly/b", None)})
+        cache.close()
+
+    def test_expired(self):
+        cache = UrlCache(self.filename, ttl=100, error_ttl=10)
+        cache.put_many([("https://bit.ly/a", "https://example.com/a", 301), ("https://bit.ly/b", "https://bit.ly/b", None)])
+
+        resolved_at = time.time() - 50
+        cache.conn.execute("UPDATE url_cache SET resolved_at = ?", (resolved_at,))
+
+        self.assertEqual(cache.get_many(["https://bit.ly/a", "https://bit.ly/b"]),
+                         {"https://bit.ly/a": ("https://example.com/a", 301)})
+        cache.close()
+
+
+class UrlResolverTests(unittest.TestCase):
+
+    def test_resolve_many(self):
+        resolver = CountingResolver()
+
+        result = resolver.resolve_many(["http://a.com/1", "http://a.com/2", "http://a.com/1"])
+
+        self.assertEqual(result, {"http://a.com/1": "http://a.com/1/expanded", "http://a.com/2": "http://a.com/2/expanded"})
+        self.assertEqual(resolver.resolve("http://a.com/2"), "http://a.com/2/expanded")
+        self.assertEqual(sorted(resolver.fetched), ["http://a.com/1", "http://a.com/2"])
+        resolver.close()
+
+    def test_max_per_host(self):
+        resolver = CountingResolver(max_workers=8, max_per_host=2)
+
+        resolver.resolve_many(["http://{}.com/{}".format(host, i) for host in "ab" for i in range(8)])
+
+        self.assertEqual(len(resolver.fetched), 16)
+        self.assertEqual(resolver.max_running, {"a.com": 2, "b.com": 2})
+        resolver.close()
+
+    def test_cache_only(self):
+        cache = UrlCache()
+        cache.put("http://a.com/1", "http://example.com/1", 301)
+        resolver = CountingResolver(cache, cache_only=True)
+
+        self.assertEqual(resolver.resolve_many(["http://a.com/1", "http://a.com/2"]),
+                         {"http://a.com/1": "http://example.com/1", "http://a.com/2": "http://a.com/2"})
+        self.assertEqual(resolver.fetched, [])
+        self.assertIsNone(cache.get("http://a.com/2"))
+        resolver.close()
+
+    def test_expired_without_requests(self):
+        cache = UrlCache(ttl=100)
+        cache.put("http://a.com/1", "http://example.com/1", 301)
+        cache.conn.execute("UPDATE url_cache SET resolved_at = ?", (time.time() - 200,))
+
+        # an expired url is only resolved again if requests are sent
+        self.assertEqual(CountingResolver(cache, cache_only=True).resolve("http://a.com/1"), "http://example.com/1")
+        self.assertEqual(CountingResolver(cache).lookup("http://a.com/1"), "http://example.com/1")
+        self.assertEqual(CountingResolver(cache).resolve("http://a.com/1"), "http://a.com/1/expanded")
+        cache.close()
+
+    def test_lookup_many(self):
+        cache = UrlCache()
+        cache.put("http://a.com/1", "http://example.com/1", 301)
+        resolver = CountingResolver(cache)
+
+        self.assertEqual(resolver.lookup_many(["http://a.com/1", "http://a.com/2"]),
+                         {"http://a.com/1": "http://example.com/1", "http://a.com/2": "http://a.com/2"})
+        self.assertEqual(resolver.lookup("http://a.com/2"), "http://a.com/2")
+        self.assertEqual(resolver.fetched, [])
+
+        with resolver.record_uncached_urls() as uncached_urls:
+            resolver.lookup_many(["http://a.com/1", "http://a.com/3"])
+        self.assertEqual(uncached_urls, {"http://a.com/3"})
+        self.assertIsNone(resolver.uncached_urls)
+        resolver.close()
+
+    def test_fetch(self):
+        server = HTTPServer(("127.0.0.1", 0), RedirectHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base_url = "http://127.0.0.1:{}".format(server.server_port)
+
+        resolver = UrlResolver(timeout=2)
+        try:
+            self.assertEqual(resolver.fetch(base_url + "/short"), (base_url + "/final", 301))
+            self.assertEqual(resolver.fetch(base_url + "/plain"), (base_url + "/plain", 200))
+            self.assertEqual(resolver.fetch(base_url + "/scheme")[0], base_url + "/final")
+            # closed port
+            self.assertEqual(resolver.fetch("http://127.0.0.1:1/short"), ("http://127.0.0.1:1/short", None))
+        finally:
+            resolver.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_fetch_get_error(self):
+        resolver = UrlResolver()
+        session, _ = resolver.__get_host__("a.com")
+        head_response = mock.Mock(status_code=301, headers={"location": "https://a.com/1"})
+        error = requests.exceptions.InvalidSchema("No connection adapters were found for 'tg://resolve'",
+                                                  request=mock.Mock(url="tg://resolve"))
+
+        # an error of the GET request which is not a connection error resolves to the last requested url
+        with mock.patch.object(session, "head", return_value=head_response), \
+                mock.patch.object(session, "get", side_effect=error):
+            self.assertEqual(resolver.resolve_many(["http://a.com/1"]), {"http://a.com/1": "tg://resolve"})
+
+        # without the request of the error the location of the HEAD request is the expanded url
+        with mock.patch.object(session, "head", return_value=head_response), \
+                mock.patch.object(session, "get", side_effect=requests.exceptions.InvalidURL()):
+            self.assertEqual(resolver.fetch("http://a.com/1"), ("https://a.com/1", 301))
+        resolver.close()
+
+
+class ShortenedUrlsTests(unittest.TestCase):
+
+    def test_iter_shortened_urls(self):
+        db = ListDB(users=[create_user(1, "https://t.co/abc", ""), create_user(2, "https://t.co/def", "https://a.com"),
+                           create_user(3, "https://example.com", ""), create_user(4, "", "")],
+                    tweets=[create_tweet(1, "Look at bit.ly/abcde and https://t.co/xyz",
+                                         {"https://t.co/xyz": "https://tinyurl.com/xyz"}),
+                            create_tweet(2, "No short url https://t.co/uvw", {"https://t.co/uvw": "https://example.com"})])
+
+        self.assertEqual(list(iter_shortened_urls(user_db=db)), ["https://t.co/abc"])
+        # the shortened url of the url entity is not expanded by the feature calculation
+        self.assertEqual(list(iter_shortened_urls(tweet_db=db)), ["bit.ly/abcde"])
+        self.assertEqual(list(iter_shortened_urls(db, db)), ["https://t.co/abc", "bit.ly/abcde"])
+
+    def test_resolve_urls_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tweets_filename = os.path.join(tmp_dir, "tweets.csv")
+            cache_filename = os.path.join(tmp_dir, "urls.db")
+
+            CsvTweetDB(tweets_filename).add_many([create_tweet_row(1, "Look at bit.ly/abcde", {}),
+                                                  create_tweet_row(2, "No short url", {})])
+
+            # the url is cached, so no request is sent
+            cache = UrlCache(cache_filename)
+            cache.put("bit.ly/abcde", "https://example.com/abcde", 301)
+            cache.close()
+
+            output = io.StringIO()
+            with mock.patch("sys.argv", ["resolve_urls.py", "--csv", "--skip-header", "-t", tweets_filename, "-c",
+                                         cache_filename]), contextlib.redirect_stdout(output):
+                resolve_urls.main()
+
+        self.assertIn("1 shortened urls found, 1 were already cached, 0 could not be resolved", output.getvalue())
+
+
+class UrlResolverSelectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.environ = {name: os.environ.get(name) for name in [URL_CACHE_ENV, URL_CACHE_ONLY_ENV]}
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        if urls._url_resolver is not None:
+            urls._url_resolver.close()
+        urls._url_resolver = None
+        self.tmp_dir.cleanup()
+
+    def test_set_url_cache(self):
+        filename = os.path.join(self.tmp_dir.name, "urls.db")
+
+        set_url_cache(filename, cache_only=True)
+        resolver = get_url_resolver()
+
+        self.assertEqual(resolver.cache.filename, filename)
+        self.assertTrue(resolver.cache_only)
+        self.assertIs(get_url_resolver(), resolver)
+        self.assertEqual(resolver.resolve("https://bit.ly/a"), "https://bit.ly/a")
+
+        set_url_cache()
+
+        self.assertEqual(get_url_resolver().cache.filename, ":memory:")
+        self.assertFalse(get_url_resolver().cache_only)
+
+    def test_tweet_features_use_cache(self):
+        filename = os.path.join(self.tmp_dir.name, "urls.db")
+        cache = UrlCache(filename)
+        cache.put("bit.ly/abcde", "https://test_account.com/abcde", 301)
+        cache.close()
+
+        set_url_cache(filename)
+
+        # the features only read the cache, also without the cache only mode
+        idx = TWEET_TEXT_FEATURES_IDX.index(TWEET_FEATURES_INDEX["number_of_url_domains_matches_username"])
+        with mock.patch.object(UrlResolver, "fetch", side_effect=AssertionError("request sent")):
+            self.assertEqual(calc_text_features("Look at bit.ly/abcde", [], "test_account", None)[idx], 1)
+            self.assertEqual(calc_text_features("Look at bit.ly/fghij", [], "test_account", None)[idx], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import argparse
+import itertools
+import os
+import textwrap
+
+from twitter_bot_type_classification.features.tokenizer import PUNKT_PATH_ENV, TOKENIZERS, compare_tokenizers
+
+
+def iter_texts(tweet_db, user_db=None):
+    """
+    :return: generator of the cleaned tweet texts followed by the user descriptions
+    """
+    from twitter_bot_type_classification.features.tweet import clean_tweet_text
+
+    for _, tweets in tweet_db.get_tweets_grouped_by_user():
+        for t in tweets:
+            yield clean_tweet_text(t.text, t.entities["urls"])
+
+    if user_db is not None:
+        for u in user_db.get_all_user():
+            if u.description:
+                yield u.description
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how often the token counts of a tokenizer differ from the "
+                                                 "nltk tokenizer on the tweet texts and user descriptions.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=textwrap.dedent("""\
+                                     License:
+                                        MIT - Copyright (c) 2020 Marvin Heptner
+                                     """))
+
+    parser.add_argument("-t", "--tweets", help="Input file of tweet data", required=True)
+    parser.add_argument("-u", "--users", help="Input file of user data, the descriptions are compared too")
+    parser.add_argument("-l", "--limit", type=int,
+                        help="Maximum number of texts to compare. If -1 all texts are compared. Default value is -1",
+                        default=-1)
+    parser.add_argument("--tokenizer", choices=[n for n in TOKENIZERS if n != "nltk"],
+                        help="Tokenizer to compare with the nltk tokenizer. Default is fast", default="fast")
+    parser.add_argument("--csv", action="store_true",
+                        help="The provided input files are csv files. Default is sqlite database", default=False)
+    parser.add_argument("--parquet", action="store_true",
+                        help="The provided inputs are parquet dataset directories. Default is sqlite database",
+                        default=False)
+    parser.add_argument("--skip-header", action="store_true", help="Skip the first line of the csv input file",
+                        default=False)
+    parser.add_argument("--punkt-path",
+                        help="nltk data directory which contains the punkt sentence tokenizer model, the model is not "
+                             "downloaded. Default are the nltk data directories", default=None)
+
+    args = parser.parse_args()
+
+    if args.csv and args.parquet:
+        parser.error("ERROR: The input files can't be csv files and parquet datasets at the same time.")
+
+    if args.limit < -1:
+        parser.error("ERROR: The limit is not valid. Have to be greater or equal -1.")
+
+    if args.punkt_path is not None:
+        os.environ[PUNKT_PATH_ENV] = args.punkt_path
+
+    from twitter_bot_type_classification.dataset.db import CsvTweetDB, CsvUserDB, SqliteTweetDB, SqliteUserDB
+    from twitter_bot_type_classification.dataset.parquet import ParquetTweetDB, ParquetUserDB
+
+    if args.csv:
+        tweet_db = CsvTweetDB(args.tweets, skip_header=args.skip_header)
+        user_db = None if args.users is None else CsvUserDB(args.users, skip_header=args.skip_header)
+    elif args.parquet:
+        tweet_db = ParquetTweetDB(args.tweets)
+        user_db = None if args.users is None else ParquetUserDB(args.users)
+    else:
+        tweet_db = SqliteTweetDB(args.tweets)
+        user_db = None if args.users is None else SqliteUserDB(args.users)
+
+    reference = TOKENIZERS["nltk"]()
+    reference.load()
+    candidate = TOKENIZERS[args.tokenizer]()
+    candidate.load()
+
+    texts = iter_texts(tweet_db, user_db)
+    if args.limit != -1:
+        texts = itertools.islice(texts, args.limit)
+
+    result = compare_tokenizers(texts, reference, candidate)
+
+    print("Compared {} texts of the {} tokenizer with the nltk tokenizer".format(result["texts"], args.tokenizer))
+    for name, label in [("sentences", "number of sentences"), ("words", "number of words"),
+                        ("punctuations", "number of punctuations"), ("tokens", "tokens")]:
+        rate = result[name] / result["texts"] if result["texts"] > 0 else 0
+        print("  different {}: {} ({:.2%})".format(label, result[name], rate))
+
+
+if __name__ == "__main__":
+    main()